@@ -1,23 +1,38 @@
+import difflib
+import html
 import json
-import math
 import os
 import sublime
 import sublime_plugin
-import subprocess
-import tempfile
 import threading
 import time
-import urllib
-import uuid
-
-from datetime import datetime
-
-from Magento2Stuff.api import MagentoAPI as api
-from Magento2Stuff.country_codes import ISO_3166
-from Magento2Stuff.urls import Magento2StuffSettings
+import urllib.parse
+
+from Magento2Stuff.core.api import MagentoAPI as api
+from Magento2Stuff.core.cms_mirror import CmsMirror
+from Magento2Stuff.bulk import BulkCmsUpdate
+from Magento2Stuff.cache_warmer import CacheWarmer
+from Magento2Stuff.category_tree import CategoryTree
+from Magento2Stuff.change_feed import ChangeFeed
+from Magento2Stuff.core.dates import RelativeTimeFormatter
+from Magento2Stuff.fanout import show_fanout_lookup_menu
+from Magento2Stuff.payload_weight import PayloadWeightAnalyzer
+from Magento2Stuff.core.lazy import get_startup_report, lazy_import
+from Magento2Stuff.prefetch import DETAIL_CACHE
+from Magento2Stuff.probe import StorefrontProbe
+from Magento2Stuff.core.query import Param, SearchCriteria
+from Magento2Stuff.core.response_cache import ResponseCache
+from Magento2Stuff.core.rows import CategoryRow, CmsBlockRow, CmsPageRow, OrderRow, ProductRow
+from Magento2Stuff.temp_files import TempFileManager
+from Magento2Stuff.core.throttle import PRIORITY_BACKGROUND, RequestGovernor
+from Magento2Stuff.type_ahead import TypeAheadSearch
+from Magento2Stuff.core.urls import M2_URLS
 from Magento2Stuff.utils import Magento2Utils as utils
+from Magento2Stuff.write_queue import WriteQueue, put_or_queue
 
-M2_URLS = Magento2StuffSettings()
+# Rarely used, so only imported on first use
+backups       = lazy_import("Magento2Stuff.lib.backups")
+country_codes = lazy_import("Magento2Stuff.lib.country_codes")
 
 class Magento2StuffCommand(sublime_plugin.TextCommand):
 	# Menu items
@@ -28,6 +43,13 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 		"Products",
 		"Product lookup",
 		"Orders",
+		"Search...",
+		"Search CMS content...",
+		"Lookup everywhere",
+		"Probe performance...",
+		"Analyze payload weight...",
+		"Queued changes",
+		"Response cache",
 		"Change profile",
 	)
 
@@ -40,7 +62,10 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 		"Edit identifier...",
 		"Insert identifier",
 		"{toggle} page",
+		"Warm cache",
+		"Probe performance",
 		"Debug info",
+		"Select multiple...",
 	)
 
 	CMS_BLOCK_MENU_ITEMS = (
@@ -50,19 +75,27 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 		"Edit identifier...",
 		"Insert identifier",
 		"{toggle} block",
+		"Who uses this block",
+		"Probe performance",
 		"Debug info",
+		"Select multiple...",
 	)
 
 	CATEGORY_MENU_ITEMS = (
 		"Insert URL key",
+		"Browse subcategories",
 		"View in browser",
 		"View in Magento",
+		"Warm cache",
+		"Probe performance",
 		"Debug info",
 	)
 
 	PRODUCT_MENU_ITEMS = (
 		"View in browser",
 		"View in Magento",
+		"Warm cache",
+		"Probe performance",
 		"Debug info",
 	)
 
@@ -71,13 +104,113 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 		"By ID",
 	)
 
+	CMS_BULK_MENU_ITEMS = (
+		"Enable",
+		"Disable",
+		"Replace content with current sheet",
+		"Find and replace in titles...",
+		"Find and replace in identifiers...",
+		"Probe performance",
+	)
+
+	PROBE_MENU_ITEMS = (
+		"Current sheet",
+		"Last listed items",
+	)
+
+	WEIGHT_MENU_ITEMS = (
+		"Current sheet",
+		"All pages and blocks",
+	)
+
 	ORDER_MENU_ITEMS = (
 		"View in Magento",
 		"Debug info",
 	)
 
+	RESPONSE_CACHE_MENU_ITEMS = (
+		"Inspect entries",
+		"Purge entries older than a day",
+		"Purge current profile",
+		"Purge all profiles",
+	)
+
+	WRITE_QUEUE_MENU_ITEMS = (
+		"Send now (overwrite Magento)",
+		"Compare with Magento",
+		"Discard",
+	)
+
+	# List menu queries, compiled once
+	CMS_LIST_QUERY = SearchCriteria().sort("update_time", "DESC").page(Param("page_size")).fields({
+		"items": [
+			"id",
+			"title",
+			"identifier",
+			"active",
+			"update_time",
+		]
+	}).compile()
+
+	CATEGORY_LIST_QUERY = SearchCriteria().sort("updated_at", "DESC").page(Param("page_size")).fields({
+		"items": [
+			"id",
+			"name",
+			"is_active",
+			"updated_at",
+			{
+				"custom_attributes": [
+					"url_path",
+				],
+			},
+		]
+	}).compile()
+
+	PRODUCT_LIST_QUERY = SearchCriteria().sort("updated_at", "DESC").page(Param("page_size")).fields({
+		"items": [
+			"id",
+			"name",
+			"sku",
+			"status",
+			"type_id",
+			"created_at",
+			"updated_at",
+			{
+				"custom_attributes": [
+					"url_key",
+				],
+			},
+		]
+	}).compile()
+
+	ORDER_LIST_QUERY = SearchCriteria().sort("created_at", "DESC").page(Param("page_size")).fields({
+		"items": [
+			"entity_id",
+			"increment_id",
+			"created_at",
+			"grand_total",
+			"status",
+			"customer_is_guest",
+			{
+				"billing_address": [
+					"firstname",
+					"lastname",
+					"city",
+					"postcode",
+					"country_id",
+				],
+				"extension_attributes": [
+					"payment_additional_info",
+				],
+			},
+		]
+	}).compile()
+
 	API_RESPONSE_ITEMS = []
 
+	# Rows of the last list menu shown, for "Probe performance..."
+	LISTED_ROWS = []
+
 	SHEET_LIST = {}
 
 	def run(self, edit, **args):
@@ -100,6 +233,39 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 				elif action == "go_to_site_url":
 					go_to_site_url()
 
+				elif action == "show_request_queue":
+					show_request_queue()
+
+				elif action == "startup_report":
+					show_startup_report()
+
+				elif action == "search":
+					self.show_search_menu()
+
+				elif action == "search_cms_content":
+					self.show_cms_content_search()
+
+				elif action == "reload_sheet":
+					reload_current_sheet()
+
+				elif action == "queued_changes":
+					self.show_write_queue_menu()
+
+				elif action == "response_cache":
+					self.show_response_cache_menu()
+
+				elif action == "open_cms_resource":
+					self.open_cms_resource(args["resource_type"], args["id"], args.get("line"))
+
+				elif action == "block_users":
+					self.show_block_users(args["id"] if "id" in args else None)
+
+				elif action == "probe":
+					self.show_probe_menu()
+
+				elif action == "analyze_weight":
+					self.show_weight_menu()
+
 				else:
 					utils.log("unknown action: " + action)
 
@@ -132,206 +298,212 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 		elif action == "Orders":
 			self.show_order_list_menu()
 
+		elif action == "Search...":
+			self.show_search_menu()
+
+		elif action == "Search CMS content...":
+			self.show_cms_content_search()
+
+		elif action == "Lookup everywhere":
+			show_fanout_lookup_menu()
+
+		elif action == "Probe performance...":
+			self.show_probe_menu()
+
+		elif action == "Analyze payload weight...":
+			self.show_weight_menu()
+
+		elif action == "Queued changes":
+			self.show_write_queue_menu()
+
+		elif action == "Response cache":
+			self.show_response_cache_menu()
+
 		elif action == "Change profile":
 			self.show_profile_list_menu()
 
 	def show_cms_resource_list_menu(self, resource_type):
 		page_size = utils.get_setting("page_size_cms")
 
-		search_criteria = {
-			"page_size": page_size,
-			"sort_orders": [
-				{
-					"field": "update_time",
-					"direction": "DESC",
-				}
-			],
-		}
-
-		fields = {
-			"items": [
-				"id",
-				"title",
-				"identifier",
-				"active",
-				"update_time",
-			]
-		}
-
 		url = "{}/search".format(resource_type)
 
-		response = api.request("GET", url, search_criteria = search_criteria, fields = fields)
+		response = api.request("GET", url, search_criteria = self.CMS_LIST_QUERY.bind(page_size = page_size), revalidate = True)
 
-		total_items = len(response["items"])
+		row_type = CmsPageRow if resource_type == "cmsPage" else CmsBlockRow
+		rows     = [row_type(item) for item in response["items"]]
+
+		# Only the rows are kept once the menu is built
+		del response
+
+		total_items = len(rows)
 
 		# Construct CMS resource list menu
 		menu_items = []
 
-		for i in range(total_items):
-			item = response["items"][i]
+		formatter = RelativeTimeFormatter()
 
+		for row in rows:
 			quick_panel_item = sublime.QuickPanelItem(
-				"{title} [{identifier}] | ID: {id}".format(title = item["title"], identifier = item["identifier"], id = item["id"]),
-				"Last updated: " + format_datetime_str(item["update_time"]),
-				"Enabled" if item["active"] else "DISABLED",
+				"{title} [{identifier}] | ID: {id}".format(title = row.title, identifier = row.identifier, id = row.id),
+				"Last updated: " + format_datetime_str(row.update_time, formatter),
+				"Enabled" if row.active else "DISABLED",
 			)
 
 			menu_items.append(quick_panel_item)
 
-			# Add some extra data
-			response["items"][i]["admin_url"] = get_admin_url(resource_type, item["id"])
-
-			if resource_type == "cmsPage":
-				response["items"][i]["site_url"] = get_site_url(item["identifier"])
-
 		# Assign global variable with items for access after making a selection from the menu
-		self.API_RESPONSE_ITEMS = response["items"]
+		self.API_RESPONSE_ITEMS = rows
+
+		Magento2StuffCommand.LISTED_ROWS = rows
 
 		on_done = self.show_cms_page_menu if resource_type == "cmsPage" else self.show_cms_block_menu
 
+		on_highlight = lambda x: DETAIL_CACHE.highlight(rows[x].detail_endpoint)
+
 		sublime.active_window().show_quick_panel(
 			menu_items,
 			on_done,
 			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			0,
+			on_highlight,
 		)
 
 		if total_items >= page_size:
 			utils.log("WARNING: number of API response items is greater than or equal to the page size ({})".format(page_size))
 
 	def show_category_list_menu(self):
+		if utils.get_setting("category_tree_cache"):
+			return self.show_category_tree_menu()
+
 		page_size = utils.get_setting("page_size_categories")
 
-		search_criteria = {
-			"page_size": page_size,
-			"sort_orders": [
-				{
-					"field": "updated_at",
-					"direction": "DESC",
-				}
-			],
-		}
-
-		fields = {
-			"items": [
-				"id",
-				"name",
-				"is_active",
-				"updated_at",
-				{
-					"custom_attributes": [
-						"url_path",
-					],
-				},
-			]
-		}
-
-		response = api.request("GET", "categories/list", search_criteria = search_criteria, fields = fields)
-
-		total_items = len(response["items"])
+		response = api.request("GET", "categories/list", search_criteria = self.CATEGORY_LIST_QUERY.bind(page_size = page_size), revalidate = True)
+
+		rows = [CategoryRow(item) for item in response["items"]]
+
+		del response
+
+		total_items = len(rows)
 
 		menu_items = []
 
-		for i in range(total_items):
-			item = response["items"][i]
+		formatter = RelativeTimeFormatter()
 
+		for row in rows:
 			# Root catalog does not return this field...
-			if "is_active" in item:
-				status = "Enabled" if item["is_active"] else "DISABLED"
+			if row.is_active != None:
+				status = "Enabled" if row.is_active else "DISABLED"
 			else:
 				status = "n/a"
 
 			quick_panel_item = sublime.QuickPanelItem(
-				"{name} | ID: {id}".format(name = item["name"], id = item["id"]),
-				"Last updated: " + format_datetime_str(item["updated_at"]),
+				"{name} | ID: {id}".format(name = row.name, id = row.id),
+				"Last updated: " + format_datetime_str(row.updated_at, formatter),
 				status,
 			)
 
 			menu_items.append(quick_panel_item)
 
-			# Add some extra data
-			response["items"][i]["admin_url"] = get_admin_url("category", item["id"])
+		Magento2StuffCommand.LISTED_ROWS = rows
 
-			for key in item["custom_attributes"]:
-				attr = item["custom_attributes"][key]
+		on_done = lambda x: self.show_category_menu(rows[x]) if x != -1 else None
 
-				if attr["attribute_code"] == "url_path":
-					response["items"][i]["site_url"] = M2_URLS.BASE_URL + attr["value"]
-					response["items"][i]["url_path"] = attr["value"]
-
-			if "site_url" not in response["items"][i]:
-				response["items"][i]["site_url"] = M2_URLS.CATEGORY_ID_URL.format(item["id"])
-
-		on_done = lambda x: self.show_category_menu(response["items"][x]) if x != -1 else None
+		on_highlight = lambda x: DETAIL_CACHE.highlight(rows[x].detail_endpoint)
 
 		sublime.active_window().show_quick_panel(
 			menu_items,
 			on_done,
 			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			0,
+			on_highlight,
 		)
 
 		if total_items >= page_size:
 			utils.log("WARNING: number of API response items is greater than or equal to the page size ({})".format(page_size))
 
+	# Category list served from the cached category tree. If the tree has been
+	# loaded before, the menu is shown straight away and refreshed in the
+	# background for next time.
+	def show_category_tree_menu(self, root_id = None):
+		tree = CategoryTree.for_profile(utils.get_current_profile())
+
+		if tree.is_loaded():
+			thread = threading.Thread(target = refresh_category_tree, args = (tree,))
+			thread.start()
+
+		else:
+			utils.log("loading category tree...")
+			tree.refresh()
+
+		nodes = tree.subtree(root_id) if root_id != None else tree.recently_updated()
+
+		menu_items = []
+
+		formatter = RelativeTimeFormatter()
+
+		for node in nodes:
+			# Root catalog does not return this field...
+			if node.is_active != None:
+				status = "Enabled" if node.is_active else "DISABLED"
+			else:
+				status = "n/a"
+
+			quick_panel_item = sublime.QuickPanelItem(
+				"{name} | ID: {id}".format(name = node.name, id = node.id),
+				[tree.breadcrumb_str(node.id), "Last updated: " + format_datetime_str(node.updated_at, formatter)],
+				status,
+			)
+
+			menu_items.append(quick_panel_item)
+
+		Magento2StuffCommand.LISTED_ROWS = nodes
+
+		on_done = lambda x: self.show_category_menu(nodes[x]) if x != -1 else None
+
+		on_highlight = lambda x: DETAIL_CACHE.highlight(nodes[x].detail_endpoint)
+
+		sublime.active_window().show_quick_panel(
+			menu_items,
+			on_done,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			0,
+			on_highlight,
+		)
+
 	def show_product_list_menu(self):
 		page_size = utils.get_setting("page_size_products")
 
-		search_criteria = {
-			"page_size": page_size,
-			"sort_orders": [
-				{
-					"field": "updated_at",
-					"direction": "DESC",
-				}
-			],
-		}
-
-		fields = {
-			"items": [
-				"id",
-				"name",
-				"sku",
-				"status",
-				"type_id",
-				"created_at",
-				"updated_at",
-				{
-					"custom_attributes": [
-						"url_key",
-					],
-				},
-			]
-		}
-
-		response = api.request("GET", "products", search_criteria = search_criteria, fields = fields)
-
-		total_items = len(response["items"])
+		response = api.request("GET", "products", search_criteria = self.PRODUCT_LIST_QUERY.bind(page_size = page_size), revalidate = True)
+
+		rows = [ProductRow(item) for item in response["items"]]
+
+		del response
+
+		total_items = len(rows)
 
 		menu_items = []
 
-		for i in range(total_items):
-			item = response["items"][i]
+		formatter = RelativeTimeFormatter()
 
+		for row in rows:
 			menu_items.append([
-				"{name} | {sku} | ID: {id}".format(name = item["name"], sku = item["sku"], id = item["id"]),
-				"Type: {type} | {status}".format(type = item["type_id"], status = "Enabled" if item["status"] == 1 else "DISABLED"),
-				"Created: {} | Updated: {}".format(format_datetime_str(item["created_at"]), format_datetime_str(item["updated_at"])),
+				"{name} | {sku} | ID: {id}".format(name = row.name, sku = row.sku, id = row.id),
+				"Type: {type} | {status}".format(type = row.type_id, status = "Enabled" if row.status == 1 else "DISABLED"),
+				"Created: {} | Updated: {}".format(format_datetime_str(row.created_at, formatter), format_datetime_str(row.updated_at, formatter)),
 			])
 
-			# Add some extra data
-			response["items"][i]["admin_url"] = get_admin_url("product", item["id"])
-
-			for key in item["custom_attributes"]:
-				attr = item["custom_attributes"][key]
+		Magento2StuffCommand.LISTED_ROWS = rows
 
-				if attr["attribute_code"] == "url_key":
-					response["items"][i]["site_url"] = M2_URLS.BASE_URL + attr["value"]
+		on_done = lambda x: self.show_product_menu(rows[x]) if x != -1 else None
 
-		on_done = lambda x: self.show_product_menu(response["items"][x]) if x != -1 else None
+		on_highlight = lambda x: DETAIL_CACHE.highlight(rows[x].detail_endpoint)
 
 		sublime.active_window().show_quick_panel(
 			menu_items,
 			on_done,
 			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			0,
+			on_highlight,
 		)
 
 		if total_items >= page_size:
@@ -340,83 +512,46 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 	def show_order_list_menu(self):
 		page_size = utils.get_setting("page_size_orders")
 
-		search_criteria = {
-			"page_size": page_size,
-			"sort_orders": [
-				{
-					"field": "created_at",
-					"direction": "DESC",
-				}
-			],
-		}
-		fields = {
-			"items": [
-				"entity_id",
-				"increment_id",
-				"created_at",
-				"grand_total",
-				"status",
-				"customer_is_guest",
-				{
-					"billing_address": [
-						"firstname",
-						"lastname",
-						"city",
-						"postcode",
-						"country_id",
-					],
-					"extension_attributes": [
-						"payment_additional_info",
-					],
-				},
-			]
-		}
-
-		response = api.request("GET", "orders", search_criteria = search_criteria, fields = fields)
-
-		total_items = len(response["items"])
+		response = api.request("GET", "orders", search_criteria = self.ORDER_LIST_QUERY.bind(page_size = page_size), revalidate = True)
+
+		rows = [OrderRow(item) for item in response["items"]]
+
+		del response
 
 		menu_items = []
 
-		for i in range(total_items):
-			item = response["items"][i]
+		formatter = RelativeTimeFormatter()
 
+		for row in rows:
 			# Top line
 			line_1 = "{} {} | {} | {}".format(
-				item["billing_address"]["firstname"].strip(),
-				item["billing_address"]["lastname"].strip(),
-				item["increment_id"],
-				item["entity_id"],
+				row.firstname.strip(),
+				row.lastname.strip(),
+				row.increment_id,
+				row.entity_id,
 			)
 
 			# Middle
 			address_info = []
 
-			if item["billing_address"]["city"]:
-				address_info.append(item["billing_address"]["city"].strip())
-
-			if item["billing_address"]["country_id"] != "GB":
-				address_info.append(ISO_3166.alpha_2[item["billing_address"]["country_id"]])
+			if row.city:
+				address_info.append(row.city.strip())
 
-			if item["billing_address"]["postcode"]:
-				address_info.append(item["billing_address"]["postcode"])
+			if row.country_id != "GB":
+				address_info.append(country_codes.ISO_3166.alpha_2[row.country_id])
 
-			payment_method = None
-
-			for info in item["extension_attributes"]["payment_additional_info"]:
-				if info["key"] == "method_title":
-					payment_method = info["value"]
-					break
+			if row.postcode:
+				address_info.append(row.postcode)
 
 			line_2 = "Total £{:,.2f} | Guest: {} | Payment method: {} | {}".format(
-				item["grand_total"],
-				"yes" if item["customer_is_guest"] else "no",
-				payment_method,
+				row.grand_total,
+				"yes" if row.customer_is_guest else "no",
+				row.payment_method,
 				", ".join(address_info),
 			)
 
 			# Bottom
-			line_3 = format_datetime_str(item["created_at"])
+			line_3 = format_datetime_str(row.created_at, formatter)
 
 			quick_panel_item = sublime.QuickPanelItem(
 				line_1,
@@ -425,15 +560,16 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 
 			menu_items.append(quick_panel_item)
 
-			# Add some extra data
-			response["items"][i]["admin_url"] = get_admin_url("order", item["entity_id"])
+		on_done = lambda x: self.show_order_menu(rows[x]) if x != -1 else None
 
-		on_done = lambda x: self.show_order_menu(response["items"][x]) if x != -1 else None
+		on_highlight = lambda x: DETAIL_CACHE.highlight(rows[x].detail_endpoint)
 
 		sublime.active_window().show_quick_panel(
 			menu_items,
 			on_done,
 			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			0,
+			on_highlight,
 		)
 
 	def show_profile_list_menu(self):
@@ -455,7 +591,7 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 
 				menu_items.append([name, prof["base_url"]])
 
-			on_done = lambda x: utils.set_setting("current_profile", x) if x != -1 else None
+			on_done = lambda x: change_profile(x) if x != -1 else None
 
 			sublime.active_window().show_quick_panel(
 				menu_items,
@@ -473,6 +609,286 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 			sublime.KEEP_OPEN_ON_FOCUS_LOST,
 		)
 
+	def show_write_queue_menu(self):
+		queue = WriteQueue.for_profile()
+
+		with queue.lock:
+			entries = list(queue.entries)
+
+		if not entries:
+			return utils.log("no queued changes")
+
+		menu_items = []
+
+		for entry in entries:
+			menu_items.append([
+				"{} ({})".format(entry["endpoint"], ", ".join(sorted(key for properties in entry["request_body"].values() for key in properties))),
+				"Queued at " + time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["queued_at"])),
+				"NOT SENT: " + entry["conflict"] if entry["conflict"] != None else "Waiting to send",
+			])
+
+		sublime.active_window().show_quick_panel(
+			menu_items,
+			lambda x: self.show_write_queue_entry_menu(queue, entries[x]) if x != -1 else None,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+		)
+
+	def show_write_queue_entry_menu(self, queue, entry):
+		sublime.active_window().show_quick_panel(
+			self.WRITE_QUEUE_MENU_ITEMS,
+			lambda x: self.process_write_queue_menu(self.WRITE_QUEUE_MENU_ITEMS[x], queue, entry) if x != -1 else None,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+		)
+
+	def process_write_queue_menu(self, action, queue, entry):
+		if action == "Send now (overwrite Magento)":
+			queue.force_send(entry)
+
+		elif action == "Compare with Magento":
+			show_write_queue_diff(entry)
+
+		elif action == "Discard":
+			if sublime.ok_cancel_dialog("Discard the queued update to {}?".format(entry["endpoint"]), "Discard"):
+				queue.discard(entry)
+
+	def show_response_cache_menu(self):
+		stats = ResponseCache.for_profile(utils.get_current_profile()).stats()
+
+		sublime.active_window().show_quick_panel(
+			self.RESPONSE_CACHE_MENU_ITEMS,
+			lambda x: self.process_response_cache_menu(self.RESPONSE_CACHE_MENU_ITEMS[x]) if x != -1 else None,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			0,
+			None,
+			"{} entries, {:.1f} MB".format(stats["entries"], stats["size"] / 1024 / 1024),
+		)
+
+	def process_response_cache_menu(self, action):
+		response_cache = ResponseCache.for_profile(utils.get_current_profile())
+
+		if action == "Inspect entries":
+			self.show_response_cache_entries_menu(response_cache)
+
+		elif action == "Purge entries older than a day":
+			utils.log("deleted {} cached responses".format(response_cache.purge(86400)))
+
+		elif action == "Purge current profile":
+			utils.log("deleted {} cached responses".format(response_cache.purge()))
+
+		elif action == "Purge all profiles":
+			deleted = sum(ResponseCache.for_profile(profile).purge() for profile in utils.get_setting("profiles"))
+
+			utils.log("deleted {} cached responses".format(deleted))
+
+	def show_response_cache_entries_menu(self, response_cache):
+		entries = response_cache.list_entries()
+
+		if not entries:
+			return utils.log("response cache is empty")
+
+		menu_items = []
+
+		for key, saved_at, size, file_path in entries:
+			menu_items.append([
+				key.replace(M2_URLS.API_URL, "", 1),
+				"Saved {} | {:.1f} KB".format(time.strftime("%Y-%m-%d %H:%M", time.localtime(saved_at)), size / 1024),
+			])
+
+		def on_done(index):
+			if index == -1:
+				return
+
+			entry = response_cache.get(entries[index][0])
+
+			if entry != None:
+				utils.dump_as_json(entry, "response_cache_" + os.path.basename(entries[index][3]).split(".")[0])
+
+		sublime.active_window().show_quick_panel(menu_items, on_done, sublime.KEEP_OPEN_ON_FOCUS_LOST)
+
+	# Searches the local CMS mirror, which is built on first use then kept up to
+	# date in the background
+	def show_cms_content_search(self):
+		mirror = CmsMirror.for_profile()
+
+		def search(text):
+			if not mirror.is_complete():
+				utils.log("downloading CMS content for searching, this may take a while...")
+
+			mirror.sync_if_incomplete()
+
+			results = mirror.search(text)
+
+			sublime.set_timeout(lambda: self.show_cms_content_results(text, results), 0)
+
+			mirror.sync()
+
+		sublime.active_window().show_input_panel(
+			"Search CMS content:",
+			"",
+			lambda text: threading.Thread(target = search, args = (text,)).start() if text else None,
+			None,
+			None,
+		)
+
+	def show_cms_content_results(self, text, results):
+		if not results:
+			return utils.log('no CMS content matching "{}"'.format(text))
+
+		menu_items = []
+
+		for result in results:
+			menu_items.append(sublime.QuickPanelItem(
+				"{} [{}]".format(result["title"], result["identifier"]),
+				"Line {}: {}".format(result["line"], html.escape(result["snippet"])) if result["line"] else "Matched title/identifier",
+				"{} ID: {}{}".format("Page" if result["type"] == "cmsPage" else "Block", result["id"], "" if result["active"] else " (DISABLED)"),
+			))
+
+		def on_done(index):
+			if index == -1:
+				return
+
+			result   = results[index]
+			row_type = CmsPageRow if result["type"] == "cmsPage" else CmsBlockRow
+
+			self.insert_cms_resource(result["type"], row_type(result), result["line"])
+
+		sublime.active_window().show_quick_panel(
+			menu_items,
+			on_done,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			0,
+			None,
+			'{} matching "{}"'.format(len(results), text),
+		)
+
+	# Pages and blocks referencing a block (the current sheet's block if no ID is
+	# given), from the CMS mirror's reference index
+	def show_block_users(self, block_id = None):
+		if block_id == None:
+			sheet_info = get_current_sheet_info()
+
+			if sheet_info == None or sheet_info["type"] != "cmsBlock":
+				return utils.log("the current sheet isn't a CMS block")
+
+			block_id = sheet_info["id"]
+
+		mirror = CmsMirror.for_profile()
+
+		def find_users():
+			mirror.sync_if_incomplete()
+
+			blocks = mirror.find_blocks(str(block_id))
+
+			if not blocks:
+				return utils.log("CMS block {} not found".format(block_id))
+
+			users = mirror.get_block_users(blocks[0])
+
+			sublime.set_timeout(lambda: self.show_block_users_menu(blocks[0], users), 0)
+
+		threading.Thread(target = find_users).start()
+
+	def show_block_users_menu(self, block, users):
+		if not users:
+			return utils.log("CMS block {} [{}] isn't used in any page or block".format(block["id"], block["identifier"]))
+
+		menu_items = []
+
+		for user in users:
+			menu_items.append(sublime.QuickPanelItem(
+				"{} [{}]".format(user["title"], user["identifier"]),
+				"Line {}".format(user["line"]),
+				"{} ID: {}{}".format("Page" if user["type"] == "cmsPage" else "Block", user["id"], "" if user["active"] else " (DISABLED)"),
+			))
+
+		def on_done(index):
+			if index == -1:
+				return
+
+			user     = users[index]
+			row_type = CmsPageRow if user["type"] == "cmsPage" else CmsBlockRow
+
+			self.insert_cms_resource(user["type"], row_type(user), user["line"])
+
+		sublime.active_window().show_quick_panel(
+			menu_items,
+			on_done,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			0,
+			None,
+			"Used by {}: {} [{}]".format(len(users), block["title"], block["identifier"]),
+		)
+
+	def open_cms_resource(self, resource_type, resource_id, line = None):
+		row_type = CmsPageRow if resource_type == "cmsPage" else CmsBlockRow
+		response = DETAIL_CACHE.get("{}/{}".format(resource_type, resource_id))
+
+		self.insert_cms_resource(resource_type, row_type(response), line)
+
+	def show_probe_menu(self):
+		sublime.active_window().show_quick_panel(
+			self.PROBE_MENU_ITEMS,
+			lambda x: self.process_probe_menu(self.PROBE_MENU_ITEMS[x]) if x != -1 else None,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+		)
+
+	def process_probe_menu(self, action):
+		if action == "Current sheet":
+			sheet_info = get_current_sheet_info()
+
+			if sheet_info:
+				urls = CacheWarmer.get_urls(sheet_info["type"], {"id": sheet_info["id"], "identifier": sheet_info["identifier"]})
+				StorefrontProbe(urls, sheet_info["identifier"]).start()
+
+		elif action == "Last listed items":
+			if self.LISTED_ROWS:
+				StorefrontProbe.for_rows(self.LISTED_ROWS, "{} listed items".format(len(self.LISTED_ROWS))).start()
+			else:
+				utils.log("no items listed yet")
+
+	def show_weight_menu(self):
+		sublime.active_window().show_quick_panel(
+			self.WEIGHT_MENU_ITEMS,
+			lambda x: self.process_weight_menu(self.WEIGHT_MENU_ITEMS[x]) if x != -1 else None,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+		)
+
+	def process_weight_menu(self, action):
+		if action == "Current sheet":
+			sheet_info = get_current_sheet_info()
+
+			# The sheet's content as edited, saved or not
+			if sheet_info:
+				PayloadWeightAnalyzer().analyze_sheet(sheet_info, get_current_sheet_content())
+
+		elif action == "All pages and blocks":
+			PayloadWeightAnalyzer().analyze_all()
+
+	def show_search_menu(self):
+		entity_names = TypeAheadSearch.ENTITY_NAMES
+
+		sublime.active_window().show_quick_panel(
+			entity_names,
+			lambda x: TypeAheadSearch(entity_names[x], lambda rows, index: self.process_search_result(entity_names[x], rows, index)).start() if x != -1 else None,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+		)
+
+	def process_search_result(self, entity_name, rows, index):
+		if entity_name == "Products":
+			self.show_product_menu(rows[index])
+
+		elif entity_name == "Categories":
+			self.show_category_menu(rows[index])
+
+		else:
+			# The CMS menus look up the selected row by index
+			self.API_RESPONSE_ITEMS = rows
+
+			if entity_name == "CMS pages":
+				self.show_cms_page_menu(index)
+			else:
+				self.show_cms_block_menu(index)
+
 	def show_cms_page_menu(self, index):
 		if index == -1:
 			return False
@@ -481,7 +897,7 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 
 		for item in self.CMS_PAGE_MENU_ITEMS:
 			if item == "{toggle} page":
-				item = item.format(toggle = check_active(self.API_RESPONSE_ITEMS[index]["active"]))
+				item = item.format(toggle = check_active(self.API_RESPONSE_ITEMS[index].active))
 
 			menu_items.append(item)
 
@@ -499,7 +915,7 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 
 		for item in self.CMS_BLOCK_MENU_ITEMS:
 			if item == "{toggle} block":
-				item = item.format(toggle = check_active(self.API_RESPONSE_ITEMS[index]["active"]))
+				item = item.format(toggle = check_active(self.API_RESPONSE_ITEMS[index].active))
 
 			menu_items.append(item)
 
@@ -547,29 +963,37 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 			self.insert_cms_resource("cmsPage", page)
 
 		elif action == "View in browser":
-			utils.open_url(page["site_url"])
+			utils.open_url(page.site_url)
 
 		elif action == "View in Magento":
-			utils.open_url(page["admin_url"])
+			utils.open_url(page.admin_url)
 
 		elif action == "Edit title...":
-			on_done = lambda title: update_cms_resource("cmsPage", page["id"], {"title": title}) if title.strip() != "" else None
-			sublime.active_window().show_input_panel("Title:", page["title"], on_done, None, None).run_command("select_all")
+			on_done = lambda title: update_cms_resource("cmsPage", page.id, {"title": title}) if title.strip() != "" else None
+			sublime.active_window().show_input_panel("Title:", page.title, on_done, None, None).run_command("select_all")
 
 		elif action == "Edit identifier...":
-			on_done = lambda identifier: update_cms_resource("cmsPage", page["id"], {"identifier": identifier}) if identifier.strip() != "" else None
-			sublime.active_window().show_input_panel("Identifier:", page["identifier"], on_done, None, None).run_command("select_all")
+			on_done = lambda identifier: update_cms_resource("cmsPage", page.id, {"identifier": identifier}) if identifier.strip() != "" else None
+			sublime.active_window().show_input_panel("Identifier:", page.identifier, on_done, None, None).run_command("select_all")
 
 		elif action == "Insert identifier":
-			insert_text(page["identifier"])
+			insert_text(page.identifier)
 
 		elif action == "{toggle} page":
-			update_cms_resource("cmsPage", page["id"], {"active": (not page["active"])})
+			update_cms_resource("cmsPage", page.id, {"active": (not page.active)})
+
+		elif action == "Warm cache":
+			warm_cache("cmsPage", page.detail_endpoint)
+
+		elif action == "Probe performance":
+			StorefrontProbe.for_rows([page], page.identifier).start()
 
 		elif action == "Debug info":
-			url = "cmsPage/{}".format(page["id"])
-			response = api.request("GET", url)
-			utils.dump_as_json(response)
+			response = DETAIL_CACHE.get(page.detail_endpoint)
+			utils.dump_as_json(response, "cmsPage_{}".format(page.id))
+
+		elif action == "Select multiple...":
+			self.show_cms_multi_select_menu("cmsPage", {page_index})
 
 	def process_cms_block_menu(self, index, block_index):
 		if index == -1:
@@ -582,53 +1006,175 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 			self.insert_cms_resource("cmsBlock", block)
 
 		elif action == "View in Magento":
-			utils.open_url(block["admin_url"])
+			utils.open_url(block.admin_url)
 
 		elif action == "Edit title...":
-			on_done = lambda title: update_cms_resource("cmsBlock", block["id"], {"title": title}) if title.strip() != "" else None
-			sublime.active_window().show_input_panel("Title:", block["title"], on_done, None, None).run_command("select_all")
+			on_done = lambda title: update_cms_resource("cmsBlock", block.id, {"title": title}) if title.strip() != "" else None
+			sublime.active_window().show_input_panel("Title:", block.title, on_done, None, None).run_command("select_all")
 
 		elif action == "Edit identifier...":
-			on_done = lambda identifier: update_cms_resource("cmsBlock", block["id"], {"identifier": identifier}) if identifier.strip() != "" else None
-			sublime.active_window().show_input_panel("Identifier:", block["identifier"], on_done, None, None).run_command("select_all")
+			on_done = lambda identifier: update_cms_resource("cmsBlock", block.id, {"identifier": identifier}) if identifier.strip() != "" else None
+			sublime.active_window().show_input_panel("Identifier:", block.identifier, on_done, None, None).run_command("select_all")
 
 		elif action == "Insert identifier":
-			insert_text(block["identifier"])
+			insert_text(block.identifier)
 
 		elif action == "{toggle} block":
-			update_cms_resource("cmsBlock", block["id"], {"active": (not block["active"])})
+			update_cms_resource("cmsBlock", block.id, {"active": (not block.active)})
+
+		elif action == "Who uses this block":
+			self.show_block_users(block.id)
+
+		elif action == "Probe performance":
+			StorefrontProbe.for_rows([block], "pages using " + block.identifier).start()
 
 		elif action == "Debug info":
-			url = "cmsBlock/{}".format(block["id"])
-			response = api.request("GET", url)
-			utils.dump_as_json(response)
+			response = DETAIL_CACHE.get(block.detail_endpoint)
+			utils.dump_as_json(response, "cmsBlock_{}".format(block.id))
+
+		elif action == "Select multiple...":
+			self.show_cms_multi_select_menu("cmsBlock", {block_index})
+
+	# Quick panels can't select multiple items, so the list is re-shown with
+	# each selection toggled until "Done" is chosen
+	def show_cms_multi_select_menu(self, resource_type, selected, selected_index = 0):
+		rows = self.API_RESPONSE_ITEMS
+
+		menu_items = [["Done: {} selected".format(len(selected)), "Choose an action for the selected items"]]
+
+		for i, row in enumerate(rows):
+			menu_items.append([
+				"{} {title} [{identifier}] | ID: {id}".format("[x]" if i in selected else "[ ]", title = row.title, identifier = row.identifier, id = row.id),
+				"Enabled" if row.active else "DISABLED",
+			])
+
+		def on_done(x):
+			if x == -1:
+				return
+
+			if x == 0:
+				if selected:
+					sublime.set_timeout(lambda: self.show_cms_bulk_menu(resource_type, [rows[i] for i in sorted(selected)]), 0)
+				return
+
+			selected.symmetric_difference_update({x - 1})
+
+			sublime.set_timeout(lambda: self.show_cms_multi_select_menu(resource_type, selected, x), 0)
+
+		sublime.active_window().show_quick_panel(
+			menu_items,
+			on_done,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			selected_index,
+		)
+
+	def show_cms_bulk_menu(self, resource_type, resources):
+		sublime.active_window().show_quick_panel(
+			self.CMS_BULK_MENU_ITEMS,
+			lambda x: self.process_cms_bulk_menu(self.CMS_BULK_MENU_ITEMS[x], resource_type, resources) if x != -1 else None,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+		)
+
+	def process_cms_bulk_menu(self, action, resource_type, resources):
+		if action == "Enable":
+			update_cms_resources(resource_type, [(resource.id, {"active": True}) for resource in resources])
+
+		elif action == "Disable":
+			update_cms_resources(resource_type, [(resource.id, {"active": False}) for resource in resources])
+
+		elif action == "Replace content with current sheet":
+			# Only CMS content opened by the plugin, as this overwrites every selected item
+			sheet_info = get_current_sheet_info(warn = False)
+
+			if sheet_info == None or sheet_info["type"] not in ("cmsPage", "cmsBlock"):
+				return utils.log("open a CMS page or block to copy its content")
+
+			content = get_current_sheet_content()
+
+			if content.strip() == "":
+				return utils.log("{} is empty, not replacing any content".format(sheet_info["identifier"]))
+
+			message = 'Replace the content of {} {} with that of {} "{}"?'.format(
+				len(resources),
+				("page" if resource_type == "cmsPage" else "block") + ("s" if len(resources) != 1 else ""),
+				"page" if sheet_info["type"] == "cmsPage" else "block",
+				sheet_info["identifier"],
+			)
+
+			if sublime.ok_cancel_dialog(message, "Replace"):
+				update_cms_resources(resource_type, [(resource.id, {"content": content}) for resource in resources])
+
+		elif action in ("Find and replace in titles...", "Find and replace in identifiers..."):
+			key = "title" if action == "Find and replace in titles..." else "identifier"
+
+			def on_replace(find, replace):
+				updates = []
+
+				for resource in resources:
+					value = getattr(resource, key)
+
+					if find in value:
+						updates.append((resource.id, {key: value.replace(find, replace)}))
+
+				if updates:
+					update_cms_resources(resource_type, updates)
+				else:
+					utils.log('no {}s contain "{}"'.format(key, find))
+
+			on_find = lambda find: sublime.active_window().show_input_panel("Replace with:", "", lambda replace: on_replace(find, replace), None, None) if find != "" else None
+
+			sublime.active_window().show_input_panel("Find in {}s:".format(key), "", on_find, None, None)
+
+		elif action == "Probe performance":
+			StorefrontProbe.for_rows(resources, "{} selected {} items".format(len(resources), resource_type)).start()
 
 	def process_category_menu(self, action, category):
 		if action == "Insert URL key":
-			if "url_path" in category:
-				insert_text(category["url_path"])
+			if category.url_path != None:
+				insert_text(category.url_path)
 			else:
 				utils.log('category has no "url_path" property')
 
+		elif action == "Browse subcategories":
+			if utils.get_setting("category_tree_cache"):
+				self.show_category_tree_menu(category.id)
+			else:
+				utils.log('settings value "category_tree_cache" required')
+
 		elif action == "View in browser":
-			utils.open_url(category["site_url"])
+			utils.open_url(category.site_url)
 
 		elif action == "View in Magento":
-			utils.open_url(category["admin_url"])
+			utils.open_url(category.admin_url)
+
+		elif action == "Warm cache":
+			warm_cache("categories", category.detail_endpoint)
+
+		elif action == "Probe performance":
+			StorefrontProbe.for_rows([category], category.name).start()
 
 		elif action == "Debug info":
-			response = api.request("GET", "categories/{}".format(category["id"]))
-			utils.dump_as_json(response)
+			response = DETAIL_CACHE.get(category.detail_endpoint)
+			utils.dump_as_json(response, "category_{}".format(category.id))
 
 	def process_product_menu(self, action, product):
 		if action == "View in browser":
-			utils.open_url(product["site_url"])
+			if product.site_url != None:
+				utils.open_url(product.site_url)
+			else:
+				utils.log('product has no "url_key" attribute')
 
 		elif action == "View in Magento":
-			utils.open_url(product["admin_url"])
+			utils.open_url(product.admin_url)
+
+		elif action == "Warm cache":
+			warm_cache("products", product.detail_endpoint)
+
+		elif action == "Probe performance":
+			StorefrontProbe.for_rows([product], product.sku).start()
 
 		elif action == "Debug info":
-			get_product_by_sku(product["sku"])
+			get_product_by_sku(product.sku)
 
 	def process_product_lookup_menu(self, action):
 		if action == "By SKU":
@@ -643,39 +1189,46 @@ class Magento2StuffCommand(sublime_plugin.TextCommand):
 
 	def process_order_menu(self, action, order):
 		if action == "View in Magento":
-			utils.open_url(order["admin_url"])
+			utils.open_url(order.admin_url)
 
 		elif action == "Debug info":
-			response = api.request("GET", "orders/{}".format(order["entity_id"]))
-			utils.dump_as_json(response)
+			response = DETAIL_CACHE.get(order.detail_endpoint)
+			utils.dump_as_json(response, "order_{}".format(order.entity_id))
 
-	def insert_cms_resource(self, resource_type, resource):
-		response = api.request("GET", "{}/{}".format(resource_type, resource["id"]))
+	# Content is fetched live rather than from DETAIL_CACHE, as a prefetched copy
+	# could be a minute old and saving it would overwrite newer changes
+	def insert_cms_resource(self, resource_type, resource, line = None):
+		response = api.request("GET", resource.detail_endpoint, cache = False)
 
 		if "content" in response:
-			temp_folder = get_temp_folder()
-
-			if not os.path.exists(temp_folder):
-				os.makedirs(temp_folder)
+			temp_file_path = TempFileManager.get_resource_path(resource_type, resource.id, resource.identifier)
 
-			file_name = generate_file_name(resource_type, resource)
+			written = TempFileManager.write_text(temp_file_path, response["content"])
 
-			temp_file_path = os.path.join(temp_folder, file_name + ".html")
-
-			with open(temp_file_path, "w", encoding = "utf-8", newline = "\n") as f:
-				f.write(response["content"])
+			if line != None:
+				sublime.active_window().open_file("{}:{}".format(temp_file_path, line), sublime.ENCODED_POSITION)
+			else:
+				sublime.active_window().open_file(temp_file_path)
 
-			sublime.active_window().open_file(temp_file_path)
+			# The sheet is already open with unsaved changes, which are still based on
+			# the content (and update_time) it was opened with
+			if not written:
+				return utils.log("{} is already open with unsaved changes, save or revert them to load the latest version".format(resource.identifier))
 
 			# Update sheet list
 			sheet_id = sublime.active_window().active_sheet().id()
 
 			self.SHEET_LIST[sheet_id] = {
-				"type"       : resource_type,
-				"id"         : resource["id"],
-				"identifier" : resource["identifier"],
+				"type"        : resource_type,
+				"id"          : resource.id,
+				"identifier"  : resource.identifier,
+				"base_url"    : utils.get_current_profile()["base_url"],
+				"update_time" : response.get("update_time"),
 			}
 
+			# Watch for the resource being edited elsewhere
+			ChangeFeed.start_for_profile()
+
 		else:
 			raise Exception("Error fetching content")
 
@@ -707,11 +1260,28 @@ class Magento2StuffEventListener(sublime_plugin.EventListener):
 				"content": sheet_content
 			}
 
-			api.request("PUT", url, request_body = request_body)
+			response = put_or_queue(url, request_body, sheet_info.get("update_time"))
+
+			DETAIL_CACHE.invalidate(url)
+
+			# Offline, so sent later by the write queue
+			if response == None:
+				return
+
+			# Our own save isn't a remote change
+			sheet_info["update_time"] = response.get("update_time")
+
+			CacheWarmer.warm_resource(sheet_info["type"], response)
+
+			view.erase_status("magento2stuff_stale")
 
-	# To-do: implement deleting files on close, if desired
 	def on_pre_close(self, view):
-		sheet_id = sublime.active_window().active_sheet().id()
+		sheet = view.sheet()
+
+		if sheet == None:
+			return
+
+		sheet_id = sheet.id()
 
 		if sheet_id in Magento2StuffCommand.SHEET_LIST:
 			# If a sheet is closed then re-opened (e.g. via ctrl+shift+t), it is NOT
@@ -721,6 +1291,14 @@ class Magento2StuffEventListener(sublime_plugin.EventListener):
 			# removing "old" IDs, but doing so makes it easier to debug.
 			del Magento2StuffCommand.SHEET_LIST[sheet_id]
 
+	def on_close(self, view):
+		file_name = view.file_name()
+
+		if utils.get_setting("delete_temp_files_on_close") and TempFileManager.is_temp_file(file_name):
+			# The same file may still be open in another view/window
+			if not TempFileManager.is_open(file_name) and os.path.isfile(file_name):
+				TempFileManager.delete(file_name)
+
 
 # Misc. functions
 def update_cms_resource(endpoint, resource_id, properties):
@@ -735,17 +1313,129 @@ def update_cms_resource(endpoint, resource_id, properties):
 	for key in properties:
 		request_body[resource_type][key] = properties[key]
 
-	api.request("PUT", url, request_body = request_body)
+	response = put_or_queue(url, request_body)
+
+	DETAIL_CACHE.invalidate(url)
+
+	if response != None:
+		set_sheet_update_time(url, response.get("update_time"))
+
+		CacheWarmer.warm_resource(endpoint, response)
+
+# Keep open sheets for a resource from being marked as stale by our own changes
+def set_sheet_update_time(url, update_time):
+	for sheet_info in Magento2StuffCommand.SHEET_LIST.values():
+		if "{}/{}".format(sheet_info["type"], sheet_info["id"]) == url:
+			sheet_info["update_time"] = update_time
+
+# Write queue listener
+def on_queued_write_sent(profile, entry, response):
+	if profile["base_url"] == utils.get_current_profile()["base_url"]:
+		DETAIL_CACHE.invalidate(entry["endpoint"])
+
+	set_sheet_update_time(entry["endpoint"], response.get("update_time"))
+
+	CacheWarmer.warm_resource(entry["endpoint"].split("/")[0], response, profile)
+
+def show_write_queue_diff(entry):
+	current = api.request("GET", entry["endpoint"], cache = False)
+
+	lines = []
+
+	for properties in entry["request_body"].values():
+		for key, value in properties.items():
+			before = str(current.get(key, "")).splitlines()
+			after  = str(value).splitlines()
+
+			lines.extend(difflib.unified_diff(before, after, "Magento: " + key, "Queued: " + key, lineterm = ""))
+
+	view = sublime.active_window().new_file()
+	view.set_scratch(True)
+	view.set_name("Diff: {}".format(entry["endpoint"]))
+	view.assign_syntax("Packages/Diff/Diff.sublime-syntax")
+	view.run_command("append", {"characters": "\n".join(lines) or "No differences"})
+
+def warm_cache(resource_type, endpoint):
+	urls = CacheWarmer.get_urls(resource_type, DETAIL_CACHE.get(endpoint))
+
+	if not urls:
+		return utils.log("no storefront URL for " + endpoint)
+
+	CacheWarmer.enqueue(urls)
+
+def update_cms_resources(endpoint, updates):
+	utils.log("updating {} {} items...".format(len(updates), endpoint))
+
+	BulkCmsUpdate(endpoint, updates).start()
+
+def change_profile(index):
+	utils.set_setting("current_profile", index)
+
+	ChangeFeed.start_for_profile()
+
+# Change feed listener
+def mark_stale_sheets(base_url, resource_type, items):
+	if resource_type not in ("cmsPage", "cmsBlock"):
+		return
+
+	changed = {item["id"]: item["update_time"] for item in items}
+
+	for window in sublime.windows():
+		for sheet in window.sheets():
+			sheet_info = Magento2StuffCommand.SHEET_LIST.get(sheet.id())
+
+			if sheet_info == None or sheet_info["type"] != resource_type or sheet_info.get("base_url") != base_url:
+				continue
+
+			update_time = changed.get(sheet_info["id"])
+
+			if update_time == None or update_time <= (sheet_info.get("update_time") or ""):
+				continue
+
+			view = sheet.view()
+
+			if view != None:
+				view.set_status("magento2stuff_stale", "M2: changed in Magento at {} (ctrl+alt+r to reload)".format(update_time))
+
+def reload_current_sheet():
+	sheet_info = get_current_sheet_info()
+
+	if not sheet_info:
+		return
+
+	view = sublime.active_window().active_view()
+
+	if view.is_dirty():
+		if not sublime.ok_cancel_dialog("Discard unsaved changes and reload from Magento?", "Reload"):
+			return
+
+		view.run_command("revert")
+
+	endpoint = "{}/{}".format(sheet_info["type"], sheet_info["id"])
+
+	DETAIL_CACHE.invalidate(endpoint)
+
+	response = api.request("GET", endpoint, cache = False)
+
+	if not TempFileManager.write_text(view.file_name(), response["content"]):
+		return utils.log("unable to reload {}, it has unsaved changes".format(sheet_info["identifier"]))
+
+	view.run_command("revert")
+	view.erase_status("magento2stuff_stale")
+
+	sheet_info["update_time"] = response.get("update_time")
+
+	utils.log("reloaded {} from Magento".format(endpoint))
 
 def get_product_by_sku(sku, dump = True):
-	response = api.request("GET", "products/{}".format(sku))
+	response = DETAIL_CACHE.get("products/{}".format(sku))
 
 	response["admin_url"] = get_admin_url("product", response["id"])
 
 	if not dump:
 		return response
 
-	utils.dump_as_json(response)
+	utils.dump_as_json(response, "product_{}".format(urllib.parse.quote_plus(sku)))
 
 def get_product_by_id(entity_id):
 	pass
@@ -769,106 +1459,50 @@ def go_to_site_url():
 		elif sheet_info["type"] == "cmsBlock":
 			go_to_admin_url()
 
-def backup_current_sheet():
-	sheet_info = get_current_sheet_info()
+def refresh_category_tree(tree):
+	try:
+		changed = tree.refresh(PRIORITY_BACKGROUND)
 
-	if sheet_info:
-		backup_dir = create_backup_folder_name(sheet_info["identifier"])
+	except Exception as e:
+		return utils.log("category tree refresh failed: {}".format(e))
 
-		if backup_dir:
-			if not os.path.exists(backup_dir):
-				utils.log("creating folder: " + backup_dir)
-				os.makedirs(backup_dir)
+	if changed:
+		utils.log("category tree: {} categories updated".format(changed))
 
-			file_name = time.strftime("%Y-%m-%d %H.%M.%S") + ".html"
-			file_path = os.path.join(backup_dir, file_name)
+def show_request_queue():
+	all_stats = RequestGovernor.all_stats()
 
-			sheet_content = get_current_sheet_content()
-
-			with open(file_path, "w", encoding = "utf-8", newline = "\n") as f:
-				utils.log("creating file: " + file_path)
-				f.write(sheet_content)
+	if not all_stats:
+		return utils.log("no requests made yet")
 
-			if utils.get_setting("open_folder_after_backup"):
-				sublime.active_window().run_command("open_dir", {
-					"dir": backup_dir
-				})
+	for base_url, stats in all_stats.items():
+		utils.log("{}: {} active, {} queued ({} interactive, {} background)".format(
+			base_url,
+			stats["active"],
+			stats["queued"],
+			stats["queued_interactive"],
+			stats["queued_background"],
+		))
 
-def show_backup_files_list_menu():
+def backup_current_sheet():
 	sheet_info = get_current_sheet_info()
 
 	if sheet_info:
-		backup_dir = create_backup_folder_name(sheet_info["identifier"])
-
-		if not os.path.exists(backup_dir):
-			return utils.log("backup folder not found: " + backup_dir)
-
-		backup_list_menu_items = []
-		file_paths = []
-
-		for file_name in os.listdir(backup_dir):
-			file_path = os.path.join(backup_dir, file_name)
-
-			# Backup dir may contain directories
-			if os.path.isfile(file_path):
-				mtime = os.path.getmtime(file_path)
-				mtime_str = datetime.utcfromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S")
-
-				backup_list_menu_items.append([file_name, format_datetime_str(mtime_str)])
-				file_paths.append(file_path)
-
-		if not file_paths:
-			return utils.log("backup directory is empty for current file")
-
-		backup_list_menu_items.sort(key = lambda item: item[0], reverse = True)
-		file_paths.sort(reverse = True)
-
-		sublime.active_window().show_quick_panel(
-			backup_list_menu_items,
-			lambda index: diff_file(index, file_paths),
-			sublime.KEEP_OPEN_ON_FOCUS_LOST,
-		)
-
-def diff_file(index, file_paths):
-	if index == -1:
-		return False
+		backups.backup_current_sheet(sheet_info, get_current_sheet_content())
 
-	# Ensure WinMerge binary exists before continuing
-	winmerge_path = utils.get_setting("winmerge_path")
-
-	if not winmerge_path:
-		return utils.log('settings value "winmerge_path" required')
-
-	if not os.path.isfile(winmerge_path):
-		return utils.log("WinMerge path not found: " + winmerge_path)
-
-	this_file = get_current_file_name()
-
-	if this_file == None:
-		return utils.log("current sheet is not a saved file")
-
-	target = lambda: subprocess.check_output([
-		winmerge_path,
-		this_file,
-		file_paths[index],
-	])
-
-	thread = threading.Thread(target = target)
-	thread.start()
-
-def create_backup_folder_name(identifier):
-	base_backup_dir = utils.get_setting("backup_folder_path")
-
-	if not base_backup_dir:
-		utils.log('settings value "backup_folder_path" required')
-		return False
+def show_backup_files_list_menu():
+	sheet_info = get_current_sheet_info()
 
-	# CMS resource identifier is used as folder name
-	subfolder_name = urllib.parse.quote_plus(identifier)
+	if sheet_info:
+		backups.show_backup_files_list_menu(sheet_info, get_current_file_name())
 
-	backup_dir = os.path.join(base_backup_dir, subfolder_name)
+def show_startup_report():
+	report = get_startup_report(__package__)
 
-	return backup_dir
+	view = sublime.active_window().new_file()
+	view.set_scratch(True)
+	view.set_name("Magento2Stuff startup report")
+	view.run_command("append", {"characters": report})
 
 def get_admin_url(resource_type, resource_id):
 	if resource_type == "cmsPage":
@@ -891,9 +1525,6 @@ def get_admin_url(resource_type, resource_id):
 def get_site_url(identifier):
 	return M2_URLS.BASE_URL + identifier
 
-def get_temp_folder():
-	return os.path.join(tempfile.gettempdir(), utils.get_setting("temp_folder_name"))
-
 def get_current_file_name():
 	return sublime.active_window().active_view().file_name()
 
@@ -912,54 +1543,16 @@ def get_current_sheet_content():
 	current_sheet = sublime.active_window().active_sheet().view()
 	return current_sheet.substr(sublime.Region(0, current_sheet.size()))
 
-def generate_file_name(resource_type, resource):
-	return "{}_{}_{}_{}_{}".format(
-		resource_type,
-		resource["id"],
-		urllib.parse.quote_plus(resource["identifier"]),
-		str(time.time()).replace(".", ""),
-		uuid.uuid4(),
-	)
-
 def insert_text(text):
 	sublime.active_window().run_command("insert_snippet", {
 		"contents": text
 	})
 
-def format_datetime_str(datetime_str):
-	now     = datetime.now(timezone.utc)
-	updated = datetime.strptime("{ts}+0000".format(ts = datetime_str), "%Y-%m-%d %H:%M:%S%z")
-	delta   = now - updated
-
-	# Less than a day, e.g. "18 hours, 24 minutes, 36 seconds"
-	if delta.days < 1:
-		hours   = math.floor(delta.seconds / 60 / 60)
-		minutes = math.floor(delta.seconds / 60) % 60
-		seconds = delta.seconds % 60
-
-		return "{} {}, {} {}, {} {}".format(
-			hours,
-			check_plural(hours, "hour"),
-			minutes,
-			check_plural(minutes, "minute"),
-			seconds,
-			check_plural(seconds, "second"),
-		)
-
-	# Less than a year, e.g. "1 day ago"
-	if delta.days < 365:
-		return "{} {} ago".format(
-			delta.days,
-			check_plural(delta.days, "day"),
-		)
-
-	# "More than a year ago"
-	years = delta.days // 365
+def format_datetime_str(datetime_str, formatter = None):
+	if formatter == None:
+		formatter = RelativeTimeFormatter()
 
-	return "More than {} {} ago".format(
-		years,
-		check_plural(years, "year"),
-	)
+	return formatter.format(datetime_str)
 
 def check_active(active):
 	if active:
@@ -967,8 +1560,17 @@ def check_active(active):
 
 	return "Enable"
 
-def check_plural(num, text):
-	if num == 1:
-		return text
+# Change feed listener
+def sync_cms_mirror(base_url, resource_type, items):
+	mirror = CmsMirror.MIRRORS.get(base_url)
+
+	if mirror != None and resource_type in CmsMirror.RESOURCE_TYPES:
+		threading.Thread(target = mirror.sync).start()
+
+def plugin_loaded():
+	ChangeFeed.add_listener(mark_stale_sheets)
+	ChangeFeed.add_listener(sync_cms_mirror)
+	WriteQueue.add_listener(on_queued_write_sent)
 
-	return text + "s"
+	if utils.get_setting("profiles"):
+		ChangeFeed.start_for_profile()
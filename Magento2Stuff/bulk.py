@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+import urllib.error
+
+from Magento2Stuff.core.api import MagentoAPI as api
+from Magento2Stuff.core.lazy import lazy_import
+from Magento2Stuff.prefetch import DETAIL_CACHE
+from Magento2Stuff.core.throttle import PRIORITY_BACKGROUND
+from Magento2Stuff.core.urls import Magento2StuffSettings
+from Magento2Stuff.utils import Magento2Utils as utils
+
+concurrent_futures = lazy_import("concurrent.futures")
+
+# Magento bulk operation status codes
+OPERATION_COMPLETE             = 1
+OPERATION_RETRIABLY_FAILED     = 2
+OPERATION_NOT_RETRIABLY_FAILED = 3
+OPERATION_OPEN                 = 4
+OPERATION_REJECTED             = 5
+
+# Updates many CMS pages/blocks at once.
+#
+# The whole batch is sent to Magento's async bulk endpoint in one request and
+# the returned bulk UUID is polled in the background. Stores without async bulk
+# (the message queue consumers are optional) get a bounded pool of ordinary
+# PUT requests instead.
+class BulkCmsUpdate():
+	# Whether each profile supports async bulk; None until the first attempt
+	ASYNC_BULK_SUPPORTED = {}
+
+	POLL_INTERVAL = 2
+
+	POLL_TIMEOUT = 600
+
+	def __init__(self, resource_type, updates):
+		self.resource_type = resource_type
+		self.key           = "page" if resource_type == "cmsPage" else "block"
+		self.updates       = updates # List of (resource ID, properties) tuples
+		self.profile       = utils.get_current_profile()
+		self.urls          = Magento2StuffSettings(self.profile)
+
+	def start(self):
+		thread = threading.Thread(target = self.run)
+		thread.start()
+
+	def run(self):
+		try:
+			base_url = self.profile["base_url"]
+
+			if BulkCmsUpdate.ASYNC_BULK_SUPPORTED.get(base_url) != False:
+				bulk_uuid = self.submit_async()
+
+				if bulk_uuid != None:
+					BulkCmsUpdate.ASYNC_BULK_SUPPORTED[base_url] = True
+					return self.poll(bulk_uuid)
+
+				BulkCmsUpdate.ASYNC_BULK_SUPPORTED[base_url] = False
+
+			self.run_parallel()
+
+		except Exception as e:
+			utils.log("bulk update failed: {}".format(e))
+
+		finally:
+			for resource_id, properties in self.updates:
+				DETAIL_CACHE.invalidate("{}/{}".format(self.resource_type, resource_id))
+
+			utils.set_status("magento2stuff_bulk", None)
+
+	# Returns the bulk UUID, or None if async bulk isn't available
+	def submit_async(self):
+		request_body = []
+
+		for resource_id, properties in self.updates:
+			request_body.append({
+				"id": resource_id,
+				self.key: properties,
+			})
+
+		endpoint = "{}/byId".format(self.resource_type)
+
+		try:
+			response = api.request("PUT", endpoint, request_body = request_body, priority = PRIORITY_BACKGROUND, api_url = self.urls.ASYNC_BULK_API_URL, profile = self.profile)
+
+		except urllib.error.HTTPError as e:
+			# "Request does not match any route": the bulk API module is disabled
+			if e.code == 404:
+				utils.log("async bulk not available ({}), falling back to individual requests".format(e.code))
+				return None
+
+			# The batch itself was rejected, and would be as individual requests
+			if e.code == 400:
+				utils.log("async bulk request rejected: {}".format(get_error_message(e)))
+
+			raise
+
+		if response.get("errors"):
+			utils.log("async bulk request had errors: {}".format(response["request_items"]))
+
+		utils.log("bulk update of {} items queued: {}".format(len(self.updates), response["bulk_uuid"]))
+
+		return response["bulk_uuid"]
+
+	def poll(self, bulk_uuid):
+		deadline = time.monotonic() + BulkCmsUpdate.POLL_TIMEOUT
+
+		while time.monotonic() < deadline:
+			time.sleep(BulkCmsUpdate.POLL_INTERVAL)
+
+			response   = api.request("GET", "bulk/{}/status".format(bulk_uuid), priority = PRIORITY_BACKGROUND, profile = self.profile, cache = False)
+			operations = response.get("operations_list") or []
+
+			counts = {}
+
+			for operation in operations:
+				counts[operation["status"]] = counts.get(operation["status"], 0) + 1
+
+			complete = counts.get(OPERATION_COMPLETE, 0)
+			failed   = len(operations) - complete - counts.get(OPERATION_OPEN, 0)
+
+			utils.set_status("magento2stuff_bulk", "M2 bulk: {}/{} done, {} failed".format(complete, len(self.updates), failed))
+
+			if operations and not counts.get(OPERATION_OPEN):
+				for operation in operations:
+					if operation["status"] != OPERATION_COMPLETE:
+						utils.log("bulk operation {} failed: {}".format(operation["id"], operation.get("result_message")))
+
+				return utils.log("bulk update {} finished: {} complete, {} failed".format(bulk_uuid, complete, failed))
+
+		utils.log("gave up waiting for bulk update {}".format(bulk_uuid))
+
+	def run_parallel(self):
+		max_workers = utils.get_setting("bulk_max_workers") or 4
+
+		with concurrent_futures.ThreadPoolExecutor(max_workers = max_workers) as executor:
+			futures = {}
+
+			for resource_id, properties in self.updates:
+				url    = "{}/{}".format(self.resource_type, resource_id)
+				future = executor.submit(api.request, "PUT", url, request_body = {self.key: properties}, priority = PRIORITY_BACKGROUND, profile = self.profile)
+
+				futures[future] = resource_id
+
+			done   = 0
+			failed = 0
+
+			for future in concurrent_futures.as_completed(futures):
+				try:
+					future.result()
+					done += 1
+
+				except Exception as e:
+					failed += 1
+					utils.log("update of {} {} failed: {}".format(self.resource_type, futures[future], e))
+
+				utils.set_status("magento2stuff_bulk", "M2 bulk: {}/{} done, {} failed".format(done, len(self.updates), failed))
+
+		utils.log("bulk update finished: {} complete, {} failed".format(done, failed))
+
+# Magento's error message from an HTTP error response, with its %1 (or %name)
+# placeholders filled in
+def get_error_message(e):
+	try:
+		body = json.loads(e.read().decode())
+
+	except Exception:
+		return str(e)
+
+	message    = body.get("message") or str(e)
+	parameters = body.get("parameters") or {}
+
+	if isinstance(parameters, list):
+		parameters = {str(i + 1): value for i, value in enumerate(parameters)}
+
+	# Longest first, so %1 doesn't replace the start of %10
+	for name, value in sorted(parameters.items(), key = lambda item: len(item[0]), reverse = True):
+		message = message.replace("%" + name, str(value))
+
+	return message
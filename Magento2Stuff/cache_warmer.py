@@ -0,0 +1,145 @@
+import collections
+import sublime
+import threading
+
+from Magento2Stuff.core.cms_mirror import CmsMirror
+from Magento2Stuff.core.rows import get_custom_attribute
+from Magento2Stuff.core.storefront import fetch_timed, get_store_urls
+from Magento2Stuff.utils import Magento2Utils as utils
+
+# Warms Magento's full-page cache for storefront pages affected by a write, so
+# the first customer after a save doesn't get the slow uncached render.
+#
+# URLs are queued (once each) after a successful write, for each of the
+# profile's store views ("store_urls") and "cache_warm_user_agents", and
+# fetched by at most "cache_warm_concurrency" workers. Each result is logged
+# with its TTFB and cache status; with "cache_warm_verify" the URL is fetched
+# again to check it's now served from the cache.
+class CacheWarmer():
+	QUEUE = collections.deque()
+
+	QUEUED = set()
+
+	LOCK = threading.Lock()
+
+	# Workers running. Only changed with LOCK held, and a worker stops in the
+	# same critical section that finds the queue empty, so URLs queued at that
+	# moment always get a worker.
+	ACTIVE_WORKERS = 0
+
+	# Storefront URLs for a resource as returned by the API. Blocks have no URL
+	# of their own, so the pages using them (from the CMS mirror) are warmed.
+	@staticmethod
+	def get_urls(resource_type, item, profile = None):
+		if profile == None:
+			profile = utils.get_current_profile()
+
+		base_url = profile["base_url"]
+		urls     = []
+
+		if resource_type == "cmsPage":
+			if item.get("active") == False:
+				return []
+
+			urls.append(base_url + item["identifier"])
+
+			if item["identifier"] == (utils.get_setting("cms_home_page") or "home"):
+				urls.append(base_url)
+
+		elif resource_type == "cmsBlock":
+			mirror = CmsMirror.MIRRORS.get(base_url)
+
+			if mirror != None and mirror.is_complete():
+				for user in mirror.get_block_users(item):
+					if user["type"] == "cmsPage" and user["active"]:
+						urls.extend(CacheWarmer.get_urls("cmsPage", user, profile))
+
+		elif resource_type == "categories":
+			url_path = get_custom_attribute(item, "url_path")
+
+			if url_path != None:
+				urls.append(base_url + url_path + (utils.get_setting("category_url_suffix") or ""))
+
+		elif resource_type == "products":
+			url_key = get_custom_attribute(item, "url_key")
+
+			if url_key != None:
+				urls.append(base_url + url_key + (utils.get_setting("product_url_suffix") or ""))
+
+		store_urls = profile.get("store_urls")
+
+		return [store_url for url in urls for store_url in get_store_urls(url, base_url, store_urls)]
+
+	@staticmethod
+	def warm_resource(resource_type, item, profile = None):
+		if not utils.get_setting("cache_warm_after_save"):
+			return
+
+		urls = CacheWarmer.get_urls(resource_type, item, profile)
+
+		if urls:
+			# Give Magento a moment to finish invalidating the cache
+			sublime.set_timeout_async(lambda: CacheWarmer.enqueue(urls), int((utils.get_setting("cache_warm_delay") or 0) * 1000))
+
+	@staticmethod
+	def enqueue(urls):
+		user_agents = utils.get_setting("cache_warm_user_agents") or [None]
+
+		with CacheWarmer.LOCK:
+			for url in urls:
+				for user_agent in user_agents:
+					if (url, user_agent) not in CacheWarmer.QUEUED:
+						CacheWarmer.QUEUED.add((url, user_agent))
+						CacheWarmer.QUEUE.append((url, user_agent))
+
+			while CacheWarmer.ACTIVE_WORKERS < min(utils.get_setting("cache_warm_concurrency") or 2, len(CacheWarmer.QUEUE)):
+				worker = threading.Thread(target = CacheWarmer.run)
+				worker.daemon = True
+				worker.start()
+
+				CacheWarmer.ACTIVE_WORKERS += 1
+
+		CacheWarmer.show_status()
+
+	@staticmethod
+	def run():
+		while True:
+			with CacheWarmer.LOCK:
+				if not CacheWarmer.QUEUE:
+					CacheWarmer.ACTIVE_WORKERS -= 1
+					break
+
+				url, user_agent = CacheWarmer.QUEUE.popleft()
+
+			CacheWarmer.warm(url, user_agent)
+
+			with CacheWarmer.LOCK:
+				CacheWarmer.QUEUED.discard((url, user_agent))
+
+			CacheWarmer.show_status()
+
+	@staticmethod
+	def warm(url, user_agent):
+		timeout = utils.get_setting("cache_warm_timeout") or 30
+
+		try:
+			result = fetch_timed(url, user_agent, timeout)
+
+			message = "warmed {}{}: {} in {:.0f}ms TTFB ({})".format(url, " [{}]".format(user_agent) if user_agent else "", result["status"], result["ttfb"] * 1000, result["cache"] or "cache status unknown")
+
+			if utils.get_setting("cache_warm_verify") and result["status"] == 200:
+				check = fetch_timed(url, user_agent, timeout)
+
+				message += ", then {:.0f}ms ({})".format(check["ttfb"] * 1000, check["cache"] or "cache status unknown")
+
+		except Exception as e:
+			message = "unable to warm {}: {}".format(url, e)
+
+		utils.log(message)
+
+	@staticmethod
+	def show_status():
+		with CacheWarmer.LOCK:
+			remaining = len(CacheWarmer.QUEUED)
+
+		utils.set_status("magento2stuff_cache_warm", "M2: warming {} URL{}".format(remaining, "" if remaining == 1 else "s") if remaining else None)
@@ -0,0 +1,274 @@
+import json
+import os
+import threading
+
+from Magento2Stuff.core.api import MagentoAPI as api
+from Magento2Stuff.core.query import Param, SearchCriteria
+from Magento2Stuff.core.rows import CategoryRow
+from Magento2Stuff.core.throttle import PRIORITY_INTERACTIVE
+from Magento2Stuff.utils import Magento2Utils as utils
+
+class CategoryNode(CategoryRow):
+	__slots__ = ("parent_id", "path", "level", "position", "children")
+
+	# Order of values when serialised to the cache file
+	FIELDS = ("id", "parent_id", "name", "is_active", "updated_at", "path", "level", "position", "url_path")
+
+	def __init__(self, item):
+		CategoryRow.__init__(self, item)
+
+		self.parent_id = item.get("parent_id")
+		self.path      = item.get("path", "")
+		self.level     = item.get("level", 0)
+		self.position  = item.get("position", 0)
+		self.children  = []
+
+	@staticmethod
+	def from_values(values):
+		node = CategoryNode.__new__(CategoryNode)
+
+		for field, value in zip(CategoryNode.FIELDS, values):
+			setattr(node, field, value)
+
+		node.children = []
+
+		return node
+
+	def to_values(self):
+		return [getattr(self, field) for field in CategoryNode.FIELDS]
+
+# Per-profile cache of the whole category tree.
+#
+# Only categories updated since the last refresh are requested; a full rebuild
+# is done if the number of categories on the store no longer matches (i.e.
+# something was deleted). Lookups by ID and url_path are dictionary lookups.
+class CategoryTree():
+	CACHE_FILE_NAME = "category_tree.json"
+
+	CACHE_VERSION = 1
+
+	PAGE_SIZE = 500
+
+	FIELDS = [
+		{
+			"items": [
+				"id",
+				"parent_id",
+				"name",
+				"is_active",
+				"updated_at",
+				"path",
+				"level",
+				"position",
+				{
+					"custom_attributes": [
+						"url_path",
+					],
+				},
+			]
+		},
+		"total_count",
+	]
+
+	# Sorted on the ID, so pages don't shift while categories are updated
+	ALL_QUERY = SearchCriteria().sort("entity_id", "ASC").page(PAGE_SIZE, Param("current_page")).fields(FIELDS).compile()
+
+	CHANGED_QUERY = SearchCriteria().filter("updated_at", Param("since"), "gteq").sort("entity_id", "ASC").page(PAGE_SIZE, Param("current_page")).fields(FIELDS).compile()
+
+	COUNT_QUERY = SearchCriteria().page(1).fields("total_count").compile()
+
+	TREES = {}
+
+	TREES_LOCK = threading.Lock()
+
+	def __init__(self, cache_path):
+		self.cache_path  = cache_path
+		self.nodes       = {}
+		self.by_url_path = {}
+		self.watermark   = None
+		self.lock        = threading.RLock()
+		self.refreshing  = threading.Lock()
+
+	@staticmethod
+	def for_profile(profile):
+		key = profile["base_url"]
+
+		with CategoryTree.TREES_LOCK:
+			if key not in CategoryTree.TREES:
+				tree = CategoryTree(utils.get_profile_cache_path(profile, CategoryTree.CACHE_FILE_NAME))
+				tree.load()
+
+				CategoryTree.TREES[key] = tree
+
+			return CategoryTree.TREES[key]
+
+	def is_loaded(self):
+		return bool(self.nodes)
+
+	def load(self):
+		if not os.path.isfile(self.cache_path):
+			return
+
+		try:
+			with open(self.cache_path, "r", encoding = "utf-8") as f:
+				data = json.load(f)
+
+		except ValueError:
+			return utils.log("ignoring unreadable category cache: " + self.cache_path)
+
+		if data.get("version") != CategoryTree.CACHE_VERSION:
+			return
+
+		with self.lock:
+			self.nodes     = {values[0]: CategoryNode.from_values(values) for values in data["nodes"]}
+			self.watermark = data["watermark"]
+			self.reindex()
+
+	def save(self):
+		with self.lock:
+			data = {
+				"version": CategoryTree.CACHE_VERSION,
+				"watermark": self.watermark,
+				"nodes": [node.to_values() for node in self.nodes.values()],
+			}
+
+		temp_path = self.cache_path + ".tmp"
+
+		with open(temp_path, "w", encoding = "utf-8") as f:
+			json.dump(data, f, separators = (",", ":"))
+
+		os.replace(temp_path, self.cache_path)
+
+	# Returns the number of categories added or updated
+	def refresh(self, priority = PRIORITY_INTERACTIVE):
+		# Concurrent refreshes would only fetch the same changes twice
+		if not self.refreshing.acquire(False):
+			return 0
+
+		try:
+			if self.watermark != None and self.fetch_total_count(priority) != len(self.nodes):
+				utils.log("category count changed, rebuilding category tree")
+				self.watermark = None
+
+			items   = self.fetch_changed(self.watermark, priority)
+			changed = 0
+
+			with self.lock:
+				if self.watermark == None:
+					self.nodes = {}
+
+				for item in items:
+					node     = CategoryNode(item)
+					existing = self.nodes.get(node.id)
+
+					# Categories updated at the watermark come back every time
+					if existing == None or existing.to_values() != node.to_values():
+						self.nodes[node.id] = node
+						changed += 1
+
+					if self.watermark == None or item["updated_at"] > self.watermark:
+						self.watermark = item["updated_at"]
+
+				if changed:
+					self.reindex()
+
+			if changed:
+				self.save()
+
+			return changed
+
+		finally:
+			self.refreshing.release()
+
+	def fetch_changed(self, since, priority):
+		items = []
+		page  = 1
+
+		while True:
+			# Same-second updates are re-fetched rather than missed
+			if since != None:
+				query = CategoryTree.CHANGED_QUERY.bind(current_page = page, since = since)
+			else:
+				query = CategoryTree.ALL_QUERY.bind(current_page = page)
+
+			response = api.request("GET", "categories/list", search_criteria = query, priority = priority, cache = False)
+
+			items.extend(response["items"])
+
+			if not response["items"] or len(items) >= response["total_count"]:
+				return items
+
+			page += 1
+
+	def fetch_total_count(self, priority):
+		response = api.request("GET", "categories/list", search_criteria = CategoryTree.COUNT_QUERY.bind(), priority = priority, cache = False)
+
+		return response["total_count"]
+
+	# Rebuild parent/child links and the url_path index
+	def reindex(self):
+		self.by_url_path = {}
+
+		for node in self.nodes.values():
+			node.children = []
+
+			if node.url_path != None:
+				self.by_url_path[node.url_path] = node
+
+		for node in self.nodes.values():
+			parent = self.nodes.get(node.parent_id)
+
+			if parent != None:
+				parent.children.append(node.id)
+
+		for node in self.nodes.values():
+			node.children.sort(key = lambda child_id: self.nodes[child_id].position)
+
+	def get(self, category_id):
+		return self.nodes.get(int(category_id))
+
+	def find_by_url_path(self, url_path):
+		return self.by_url_path.get(url_path.strip("/"))
+
+	# Ancestors from the top-most category down to (and including) the given one;
+	# the root catalog (level 0) is omitted
+	def breadcrumb(self, category_id):
+		trail = []
+
+		with self.lock:
+			node = self.nodes.get(category_id)
+
+			while node != None and node.level > 0:
+				trail.append(node)
+				node = self.nodes.get(node.parent_id)
+
+		trail.reverse()
+
+		return trail
+
+	def breadcrumb_str(self, category_id, separator = " > "):
+		return separator.join(node.name for node in self.breadcrumb(category_id))
+
+	# Depth-first list of a category and all of its descendants
+	def subtree(self, category_id):
+		nodes = []
+
+		with self.lock:
+			stack = [category_id]
+
+			while stack:
+				node = self.nodes.get(stack.pop())
+
+				if node != None:
+					nodes.append(node)
+					stack.extend(reversed(node.children))
+
+		return nodes
+
+	def recently_updated(self):
+		with self.lock:
+			nodes = list(self.nodes.values())
+
+		nodes.sort(key = lambda node: node.updated_at, reverse = True)
+
+		return nodes
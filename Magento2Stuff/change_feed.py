@@ -0,0 +1,224 @@
+import sublime
+import threading
+import urllib.parse
+
+from Magento2Stuff.core.api import MagentoAPI as api
+from Magento2Stuff.category_tree import CategoryTree
+from Magento2Stuff.prefetch import DETAIL_CACHE
+from Magento2Stuff.core.query import Param, SearchCriteria
+from Magento2Stuff.core.throttle import PRIORITY_BACKGROUND
+from Magento2Stuff.utils import Magento2Utils as utils
+
+# Polls each profile in use for resources changed since the last poll.
+#
+# Each poll is one small request per resource type, projected to just the ID
+# and update timestamp and filtered on timestamp > watermark, so an unchanged
+# store returns an empty list. The interval doubles while nothing changes (up
+# to "change_feed_max_interval") and drops back to the minimum when something
+# does. Changes invalidate cached details and are passed to listeners, e.g. to
+# mark open CMS sheets as stale.
+class ChangeFeed():
+	# Resource type -> (endpoint, timestamp field, extra fields)
+	RESOURCES = {
+		"cmsPage": ("cmsPage/search", "update_time", ()),
+		"cmsBlock": ("cmsBlock/search", "update_time", ()),
+		"categories": ("categories/list", "updated_at", ()),
+		"products": ("products", "updated_at", ("sku",)),
+	}
+
+	PAGE_SIZE = 100
+
+	FEEDS = {}
+
+	FEEDS_LOCK = threading.Lock()
+
+	# Called on the main thread with (base_url, resource_type, items)
+	LISTENERS = []
+
+	# Compiled on first use, per resource type
+	QUERIES = {}
+
+	def __init__(self, profile):
+		self.profile    = profile
+		self.watermarks = {}
+		self.interval   = None
+		self.wake       = threading.Event()
+		self.stopped    = False
+		self.thread     = None
+
+	@staticmethod
+	def for_profile(profile):
+		key = profile["base_url"]
+
+		with ChangeFeed.FEEDS_LOCK:
+			if key not in ChangeFeed.FEEDS:
+				ChangeFeed.FEEDS[key] = ChangeFeed(profile)
+
+			return ChangeFeed.FEEDS[key]
+
+	@staticmethod
+	def start_for_profile(profile = None):
+		if not utils.get_setting("change_feed"):
+			return
+
+		if profile == None:
+			profile = utils.get_current_profile()
+
+		ChangeFeed.for_profile(profile).start()
+
+	@staticmethod
+	def stop_all():
+		with ChangeFeed.FEEDS_LOCK:
+			feeds = list(ChangeFeed.FEEDS.values())
+
+		for feed in feeds:
+			feed.stop()
+
+	@staticmethod
+	def add_listener(listener):
+		if listener not in ChangeFeed.LISTENERS:
+			ChangeFeed.LISTENERS.append(listener)
+
+	# Returns (changed query, latest timestamp query)
+	@staticmethod
+	def get_queries(resource_type):
+		if resource_type not in ChangeFeed.QUERIES:
+			endpoint, timestamp_field, extra_fields = ChangeFeed.RESOURCES[resource_type]
+
+			fields = [{"items": ["id", timestamp_field] + list(extra_fields)}, "total_count"]
+
+			ChangeFeed.QUERIES[resource_type] = (
+				SearchCriteria().filter(timestamp_field, Param("since"), "gt").sort(timestamp_field, "ASC").page(ChangeFeed.PAGE_SIZE, Param("current_page")).fields(fields).compile(),
+				SearchCriteria().sort(timestamp_field, "DESC").page(1).fields([{"items": [timestamp_field]}]).compile(),
+			)
+
+		return ChangeFeed.QUERIES[resource_type]
+
+	def start(self):
+		if self.thread != None and self.thread.is_alive():
+			return
+
+		self.stopped = False
+
+		self.thread = threading.Thread(target = self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def stop(self):
+		self.stopped = True
+		self.wake.set()
+
+	# Poll on the next iteration rather than waiting out the interval
+	def poke(self):
+		self.interval = None
+		self.wake.set()
+
+	def run(self):
+		while not self.stopped:
+			min_interval = utils.get_setting("change_feed_min_interval") or 30
+			max_interval = utils.get_setting("change_feed_max_interval") or 600
+
+			try:
+				changed = self.poll()
+
+			except Exception as e:
+				utils.log("change feed for {} failed: {}".format(self.profile["base_url"], e))
+
+				# Probably unreachable, so don't keep trying at the minimum interval
+				self.interval = max_interval
+
+			else:
+				if changed or self.interval == None:
+					self.interval = min_interval
+				else:
+					self.interval = min(self.interval * 2, max_interval)
+
+			self.wake.wait(self.interval)
+			self.wake.clear()
+
+	# Returns the number of changed resources
+	def poll(self):
+		resource_types = utils.get_setting("change_feed_resources")
+
+		if resource_types == None:
+			resource_types = list(ChangeFeed.RESOURCES)
+
+		changed = 0
+
+		for resource_type in resource_types:
+			if self.stopped:
+				break
+
+			if resource_type not in ChangeFeed.RESOURCES:
+				continue
+
+			# The first poll only finds the starting point
+			if resource_type not in self.watermarks:
+				self.watermarks[resource_type] = self.fetch_latest(resource_type)
+				continue
+
+			items = self.fetch_changed(resource_type, self.watermarks[resource_type])
+
+			if items:
+				changed += len(items)
+
+				self.handle_changes(resource_type, items)
+
+		return changed
+
+	def fetch_latest(self, resource_type):
+		endpoint, timestamp_field, extra_fields = ChangeFeed.RESOURCES[resource_type]
+
+		response = api.request("GET", endpoint, search_criteria = ChangeFeed.get_queries(resource_type)[1].bind(), priority = PRIORITY_BACKGROUND, profile = self.profile, cache = False)
+
+		if response["items"]:
+			return response["items"][0][timestamp_field]
+
+		return ""
+
+	def fetch_changed(self, resource_type, since):
+		endpoint, timestamp_field, extra_fields = ChangeFeed.RESOURCES[resource_type]
+
+		items = []
+		page  = 1
+
+		while True:
+			query    = ChangeFeed.get_queries(resource_type)[0].bind(since = since, current_page = page)
+			response = api.request("GET", endpoint, search_criteria = query, priority = PRIORITY_BACKGROUND, profile = self.profile, cache = False)
+
+			items.extend(response["items"] or [])
+
+			if not response["items"] or len(items) >= response["total_count"]:
+				return items
+
+			page += 1
+
+	def handle_changes(self, resource_type, items):
+		endpoint, timestamp_field, extra_fields = ChangeFeed.RESOURCES[resource_type]
+
+		self.watermarks[resource_type] = max(item[timestamp_field] for item in items)
+
+		utils.log("{} {} changed on {}".format(len(items), resource_type, self.profile["base_url"]))
+
+		# Cached details and the category tree refresh use the current profile
+		if self.profile["base_url"] == utils.get_current_profile()["base_url"]:
+			for item in items:
+				if resource_type == "products":
+					DETAIL_CACHE.invalidate("products/{}".format(item["sku"]))
+					DETAIL_CACHE.invalidate("products/{}".format(urllib.parse.quote(item["sku"], safe = "")))
+				else:
+					DETAIL_CACHE.invalidate("{}/{}".format(resource_type, item["id"]))
+
+			if resource_type == "categories":
+				tree = CategoryTree.for_profile(self.profile)
+
+				if tree.is_loaded():
+					tree.refresh(PRIORITY_BACKGROUND)
+
+		base_url = self.profile["base_url"]
+
+		for listener in ChangeFeed.LISTENERS:
+			sublime.set_timeout(lambda listener = listener: listener(base_url, resource_type, items), 0)
+
+def plugin_unloaded():
+	ChangeFeed.stop_all()
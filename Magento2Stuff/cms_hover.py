@@ -0,0 +1,178 @@
+import html
+import os
+import sublime
+
+from Magento2Stuff.core.cms_mirror import CmsMirror
+from Magento2Stuff.core.cms_references import PAGE_REFERENCE_ATTRIBUTES, REFERENCE_ATTRIBUTES, find_references
+from Magento2Stuff.core.urls import M2_URLS
+from Magento2Stuff.hover import HOVER, HoverResolver
+from Magento2Stuff.temp_files import TempFileManager
+
+# Hover resolvers for block and page references in CMS sheets:
+# block_id="..." (widgets), {{block id="..."}}, page_id="..." (page link
+# widgets) and {{store url="..."}}.
+#
+# Everything shown comes from the local CMS mirror and its reference index
+# rather than the API, so these don't use the shared cache or batching; if the
+# mirror hasn't been built yet it's built on a hover worker and the popup
+# filled in after.
+class CmsBlockHover(HoverResolver):
+	NAME = "cms_block"
+
+	SETTING = "cms_block_hover"
+
+	RESOURCE_TYPE = "cmsBlock"
+
+	ATTRIBUTES = REFERENCE_ATTRIBUTES
+
+	# Directives are short, so only this much text either side of the point is
+	# scanned
+	CONTEXT_CHARS = 1000
+
+	MAX_USERS = 10
+
+	def get_key(self, view, point):
+		if not self.is_cms_sheet(view):
+			return None
+
+		start = max(point - CmsBlockHover.CONTEXT_CHARS, 0)
+		text  = view.substr(sublime.Region(start, point + CmsBlockHover.CONTEXT_CHARS))
+
+		for value, value_start, value_end in find_references(text, self.ATTRIBUTES):
+			if start + value_start <= point <= start + value_end:
+				return value
+
+		return None
+
+	# CMS sheets are the temp files written by "Insert page/block contents"
+	def is_cms_sheet(self, view):
+		file_name = view.file_name()
+
+		if not TempFileManager.is_temp_file(file_name):
+			return False
+
+		return os.path.basename(file_name).startswith(("cmsPage_", "cmsBlock_"))
+
+	def show(self, view, point, key):
+		mirror      = CmsMirror.for_profile()
+		on_navigate = lambda href: self.on_navigate(view, href, None)
+
+		if mirror.is_complete():
+			return HOVER.show_popup(view, point, self.render_resources(mirror, key), on_navigate)
+
+		HOVER.show_popup(view, point, "<em>indexing CMS content...</em>", on_navigate)
+
+		hover_id = HOVER.hover_id
+
+		def build():
+			mirror.sync_if_incomplete()
+
+			HOVER.update_popup(view, hover_id, self.render_resources(mirror, key))
+
+		HOVER.submit(build)
+
+	def render_resources(self, mirror, key):
+		resources = mirror.find_resources(self.RESOURCE_TYPE, key)
+
+		if not resources:
+			return "<h3>{}</h3><div>No CMS {} with this ID or identifier.</div>".format(html.escape(key), "block" if self.RESOURCE_TYPE == "cmsBlock" else "page")
+
+		return "".join(self.render_resource(mirror, resource) for resource in resources)
+
+	def render_resource(self, mirror, block):
+		users = mirror.get_block_users(block)
+
+		user_links = "".join(
+			'<div><a href="cms:{type}:{id}:{line}">{kind} {title} [{identifier}]</a></div>'.format(
+				type       = user["type"],
+				id         = user["id"],
+				line       = user["line"],
+				kind       = "Page" if user["type"] == "cmsPage" else "Block",
+				title      = html.escape(user["title"]),
+				identifier = html.escape(user["identifier"]),
+			)
+			for user in users[:CmsBlockHover.MAX_USERS]
+		)
+
+		if len(users) > CmsBlockHover.MAX_USERS:
+			user_links += '<div><a href="users:{}">all {}...</a></div>'.format(block["id"], len(users))
+
+		return """
+			{summary}
+			<div class="section">
+				Used by {count}:
+				{user_links}
+			</div>
+		""".format(
+			summary    = self.render_summary(block, M2_URLS.ADMIN_URL_CMS_BLOCK.format(block["id"])),
+			count      = len(users),
+			user_links = user_links or "<div><em>no pages or blocks</em></div>",
+		)
+
+	def render_summary(self, resource, admin_url):
+		return """
+			<h3>{title}</h3>
+			<div>
+				ID: {id} | Identifier: {identifier} | {active}
+			</div>
+			<div>
+				Updated: {update_time}
+			</div>
+			<div>
+				<a href="cms:{type}:{id}:">Open</a> | <a href="open:{admin_url}">View in Magento</a>
+			</div>
+		""".format(
+			title       = html.escape(resource["title"]),
+			type        = resource["type"],
+			id          = resource["id"],
+			identifier  = html.escape(resource["identifier"]),
+			active      = "Enabled" if resource["active"] else "DISABLED",
+			update_time = resource["update_time"],
+			admin_url   = admin_url,
+		)
+
+	def handle_link(self, view, command, value, item):
+		if command == "cms":
+			resource_type, resource_id, line = value.split(":")
+
+			view.run_command("magento2_stuff", {"action": "open_cms_resource", "resource_type": resource_type, "id": int(resource_id), "line": int(line) if line else None})
+
+		elif command == "users":
+			view.run_command("magento2_stuff", {"action": "block_users", "id": int(value)})
+
+		else:
+			HoverResolver.handle_link(self, view, command, value, item)
+
+class CmsPageHover(CmsBlockHover):
+	NAME = "cms_page"
+
+	SETTING = "cms_page_hover"
+
+	RESOURCE_TYPE = "cmsPage"
+
+	ATTRIBUTES = PAGE_REFERENCE_ATTRIBUTES
+
+	# Store URLs are often other routes, which aren't worth a popup
+	def get_key(self, view, point):
+		key = CmsBlockHover.get_key(self, view, point)
+
+		if key == None:
+			return None
+
+		key = key.strip("/")
+
+		return key if CmsMirror.for_profile().find_resources("cmsPage", key) else None
+
+	def render_resource(self, mirror, page):
+		return """
+			{summary}
+			<div>
+				Site URL: <a href="open:{site_url}">open</a> | <a href="copy:{site_url}">copy</a>
+			</div>
+		""".format(
+			summary  = self.render_summary(page, M2_URLS.ADMIN_URL_CMS_PAGE.format(page["id"])),
+			site_url = M2_URLS.BASE_URL + page["identifier"],
+		)
+
+HOVER.register(CmsBlockHover())
+HOVER.register(CmsPageHover())
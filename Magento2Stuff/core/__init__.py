@@ -0,0 +1,4 @@
+# Sublime-free core: the REST API client, query building, rate limiting,
+# caches and row types. Settings, logging and paths come from
+# environment.ENV, which the plugin (utils.py) or the command line tool
+# (cli.py) configures.
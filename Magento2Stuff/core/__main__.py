@@ -0,0 +1,5 @@
+import sys
+
+from Magento2Stuff.core.cli import main
+
+sys.exit(main())
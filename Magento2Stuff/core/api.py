@@ -0,0 +1,251 @@
+import base64
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import uuid
+
+from Magento2Stuff.core.environment import ENV as env
+from Magento2Stuff.core.lazy import lazy_import
+from Magento2Stuff.core.offline import OfflineState
+from Magento2Stuff.core.query import BoundQuery, encode_fields, flatten_pairs
+from Magento2Stuff.core.response_cache import ResponseCache
+from Magento2Stuff.core.throttle import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, RequestGovernor
+from Magento2Stuff.core.urls import M2_URLS, Magento2StuffSettings
+
+# Pulls in http.client, ssl etc., so deferred until the first request
+urllib_request = lazy_import("urllib.request")
+
+class MagentoAPI():
+	@staticmethod
+	def request(request_type, endpoint, search_criteria = None, fields = None, request_body = None, priority = PRIORITY_INTERACTIVE, api_url = None, profile = None, timeout = None, cache = True, revalidate = False, cancel = None):
+		# Requests go to the current profile unless one is given
+		if profile == None:
+			profile = env.get_current_profile()
+			urls    = M2_URLS
+		else:
+			urls    = Magento2StuffSettings(profile)
+
+		api_key = profile.get("api_key") or env.get_setting("api_key")
+
+		url = (api_url or urls.API_URL) + endpoint
+
+		# GET responses are kept in the profile's response cache, unless `cache` is
+		# False (for requests which must reach the store, e.g. conflict checks)
+		response_cache = None
+		cache_key      = None
+		cached         = None
+
+		if request_type == "GET" and isinstance(search_criteria, BoundQuery):
+			# Pre-compiled search criteria (see query.py), which includes any fields
+			url += "?" + search_criteria.encode()
+
+			cache_key = url
+
+			url += "&" + urllib.parse.urlencode({str(uuid.uuid4()): 1})
+
+			req = urllib_request.Request(url = url, method = request_type)
+
+		elif request_type == "GET":
+			# Convert any search/field parameters to a URL query string
+			params = {}
+
+			if search_criteria != None:
+				if search_criteria == 0:
+					params["search_criteria"] = 0
+
+				else:
+					params = MagentoAPI.flatten({"search_criteria": search_criteria})
+
+			if fields:
+				params["fields"] = MagentoAPI.flatten_fields(fields)
+
+			cache_key = url + "?" + urllib.parse.urlencode(params)
+
+			# Always include cache breaker
+			params[str(uuid.uuid4())] = 1
+
+			url += "?" + urllib.parse.urlencode(params)
+
+			req = urllib_request.Request(url = url, method = request_type)
+
+		elif request_type in ("PUT", "POST"):
+			data = json.dumps(request_body).encode()
+
+			req = urllib_request.Request(url = url, data = data, method = request_type)
+
+		if cache_key != None and cache and ResponseCache.is_enabled() and ResponseCache.is_cacheable(endpoint):
+			response_cache = ResponseCache.for_profile(profile)
+			cached         = response_cache.get(cache_key)
+
+		if cached != None:
+			# Don't wait on the network for data we already have
+			if OfflineState.is_offline(profile) and env.get_setting("offline_cache") and not OfflineState.should_retry(profile):
+				OfflineState.show_stale_marker(cached["saved_at"])
+				return cached["data"]
+
+			# Stale-while-revalidate: callers that can tolerate stale data get the
+			# cached entry now, and the next call gets the refreshed one
+			if revalidate and env.get_setting("response_cache") and time.time() - cached["saved_at"] < (env.get_setting("response_cache_max_stale_hours") or 24) * 3600:
+				if response_cache.start_revalidating(cache_key):
+					thread = threading.Thread(target = MagentoAPI.revalidate, args = (response_cache, cache_key, request_type, endpoint, search_criteria, fields, api_url, profile, timeout))
+					thread.daemon = True
+					thread.start()
+
+				return cached["data"]
+
+			if cached["etag"]:
+				req.add_header("If-None-Match", cached["etag"])
+
+			if cached["last_modified"]:
+				req.add_header("If-Modified-Since", cached["last_modified"])
+
+		req.add_header("Accept",        "application/json")
+		req.add_header("Authorization", "Bearer " + api_key)
+		req.add_header("Content-Type",  "application/json;charset=\"utf-8\"")
+
+		# Every request goes through the profile's rate limiter/concurrency limit
+		governor = RequestGovernor.for_profile(profile, env.get_setting("rate_limit"))
+
+		# Raises RequestCancelled if `cancel` is set while the request is queued
+		governor.acquire(priority, cancel)
+
+		try:
+			MagentoAPI.show_queue_depth(governor)
+			if timeout != None:
+				http_response = urllib_request.urlopen(req, timeout = timeout)
+			else:
+				http_response = urllib_request.urlopen(req)
+
+			with http_response:
+				response = http_response.read().decode()
+				headers  = http_response.headers
+
+		except Exception as e:
+			if not OfflineState.is_network_error(e):
+				# An HTTP error response still means the store is reachable
+				if isinstance(e, urllib.error.HTTPError):
+					OfflineState.mark_online(profile)
+
+					if e.code == 304 and cached != None:
+						response_cache.touch(cache_key)
+						return cached["data"]
+
+				raise
+
+			OfflineState.mark_offline(profile, e)
+
+			if cached == None or not env.get_setting("offline_cache"):
+				raise
+
+			OfflineState.show_stale_marker(cached["saved_at"])
+
+			return cached["data"]
+
+		finally:
+			governor.release()
+			MagentoAPI.show_queue_depth(governor)
+
+		OfflineState.mark_online(profile)
+
+		data = json.loads(response)
+
+		if request_type != "GET" and ResponseCache.is_enabled():
+			ResponseCache.for_profile(profile).invalidate_resource(urls.API_URL, endpoint)
+
+		if response_cache != None:
+			response_cache.put(cache_key, data, headers.get("ETag"), headers.get("Last-Modified"))
+
+		return data
+
+	# Images etc. from the store's media server, which (unlike the REST API) is
+	# usually served with validators, so repeat fetches are conditional.
+	# Returns the body as bytes.
+	@staticmethod
+	def request_media(url, timeout = None, profile = None):
+		if profile == None:
+			profile = env.get_current_profile()
+
+		response_cache = ResponseCache.for_profile(profile) if ResponseCache.is_enabled() else None
+		cached         = response_cache.get(url) if response_cache != None else None
+
+		req = urllib_request.Request(url = url, method = "GET")
+
+		if cached != None:
+			if cached["etag"]:
+				req.add_header("If-None-Match", cached["etag"])
+
+			if cached["last_modified"]:
+				req.add_header("If-Modified-Since", cached["last_modified"])
+
+		try:
+			if timeout != None:
+				http_response = urllib_request.urlopen(req, timeout = timeout)
+			else:
+				http_response = urllib_request.urlopen(req)
+
+			with http_response:
+				body    = http_response.read()
+				headers = http_response.headers
+
+		except urllib.error.HTTPError as e:
+			if e.code == 304 and cached != None:
+				response_cache.touch(url)
+				return base64.b64decode(cached["data"])
+
+			raise
+
+		except Exception as e:
+			if cached != None and OfflineState.is_network_error(e):
+				return base64.b64decode(cached["data"])
+
+			raise
+
+		# Only worth keeping if it can be revalidated
+		if response_cache != None and (headers.get("ETag") or headers.get("Last-Modified")):
+			response_cache.put(url, base64.b64encode(body).decode(), headers.get("ETag"), headers.get("Last-Modified"))
+
+		return body
+
+	@staticmethod
+	def revalidate(response_cache, cache_key, request_type, endpoint, search_criteria, fields, api_url, profile, timeout):
+		try:
+			MagentoAPI.request(request_type, endpoint, search_criteria, fields, None, PRIORITY_BACKGROUND, api_url, profile, timeout)
+
+		except Exception as e:
+			env.log("unable to refresh cached {}: {}".format(endpoint, e))
+
+		finally:
+			response_cache.done_revalidating(cache_key)
+
+	@staticmethod
+	def show_queue_depth(governor):
+		stats = governor.stats()
+
+		if stats["queued"]:
+			status = "M2 requests: {} active, {} queued ({} background)".format(stats["active"], stats["queued"], stats["queued_background"])
+		else:
+			status = None
+
+		env.set_status("magento2stuff_queue", status)
+
+	# Python implementation of PHP's http_build_query function - https://stackoverflow.com/a/65617512/7290573
+	@staticmethod
+	def flatten(dictionary, parent_key = False, separator = "[", separator_suffix = "]"):
+		if separator != "[" or separator_suffix != "]":
+			raise ValueError("only PHP-style separators are supported")
+
+		if parent_key:
+			return dict(flatten_pairs(dictionary, str(parent_key)))
+
+		items = []
+
+		for key, value in dictionary.items():
+			items.extend(flatten_pairs(value, key))
+
+		return dict(items)
+
+	@staticmethod
+	def flatten_fields(fields):
+		return encode_fields(fields)
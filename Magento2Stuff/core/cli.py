@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import sys
+
+# Allow running as a script as well as with -m from the folder containing the package
+if __package__ in (None, ""):
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Magento2Stuff.core import jobs
+from Magento2Stuff.core.cms_mirror import CmsMirror
+from Magento2Stuff.core.environment import ENV as env
+
+# Command line tool for bulk jobs, using the same profiles and settings as the
+# plugin.
+#
+# Usage (from the folder containing the Magento2Stuff package):
+#   python -m Magento2Stuff.core export-cms pages out/
+#   python -m Magento2Stuff.core dump-products products.jsonl
+#   python -m Magento2Stuff.core audit-skus skus.txt > report.csv
+#   python -m Magento2Stuff.core grep-cms 'block_id="footer"'
+#
+# Settings are the package defaults overlaid with the user's settings file
+# (Packages/User/Magento2Stuff.sublime-settings unless --settings is given).
+# The API key may also be given with the M2_API_KEY environment variable.
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS_NAME = "Magento2Stuff.sublime-settings"
+
+# Sublime settings files are JSON with comments and trailing commas
+def strip_json_extensions(text):
+	result    = []
+	i         = 0
+	in_string = False
+
+	while i < len(text):
+		char = text[i]
+
+		if in_string:
+			result.append(char)
+
+			if char == "\\":
+				result.append(text[i + 1])
+				i += 1
+
+			elif char == '"':
+				in_string = False
+
+		elif char == '"':
+			in_string = True
+			result.append(char)
+
+		elif text.startswith("//", i):
+			end = text.find("\n", i)
+			i   = len(text) if end == -1 else end
+			continue
+
+		elif text.startswith("/*", i):
+			end = text.find("*/", i + 2)
+			i   = len(text) if end == -1 else end + 2
+			continue
+
+		elif char in "}]":
+			# Drop a trailing comma before the closing bracket
+			j = len(result) - 1
+
+			while j >= 0 and result[j].isspace():
+				j -= 1
+
+			if j >= 0 and result[j] == ",":
+				del result[j]
+
+			result.append(char)
+
+		else:
+			result.append(char)
+
+		i += 1
+
+	return "".join(result)
+
+def load_settings_file(file_path):
+	with open(file_path, "r", encoding = "utf-8") as f:
+		return json.loads(strip_json_extensions(f.read()))
+
+def load_settings(user_settings_path = None):
+	settings = load_settings_file(os.path.join(PACKAGE_DIR, SETTINGS_NAME))
+
+	if user_settings_path == None:
+		user_settings_path = os.path.join(os.path.dirname(PACKAGE_DIR), "User", SETTINGS_NAME)
+
+		if not os.path.isfile(user_settings_path):
+			return settings
+
+	settings.update(load_settings_file(user_settings_path))
+
+	return settings
+
+def select_profile(settings, name):
+	profiles = settings.get("profiles") or []
+
+	for i, profile in enumerate(profiles):
+		if profile["name"] == name or str(i) == name:
+			settings["current_profile"] = i
+			return
+
+	raise SystemExit("unknown profile: {} (profiles: {})".format(name, ", ".join(profile["name"] for profile in profiles)))
+
+def get_parser():
+	parser = argparse.ArgumentParser(prog = "python -m Magento2Stuff.core", description = "Bulk jobs against a Magento 2 store.")
+
+	parser.add_argument("--settings", help = "settings file (default: Packages/User/{})".format(SETTINGS_NAME))
+	parser.add_argument("--profile", help = "profile name or index (default: the current profile)")
+	parser.add_argument("--workers", type = int, default = 4, help = "number of workers (default: 4)")
+	parser.add_argument("--processes", action = "store_true", help = "use a process pool rather than threads")
+	parser.add_argument("--cache", action = "store_true", help = "keep responses in the response cache")
+
+	commands = parser.add_subparsers(dest = "command")
+	commands.required = True
+
+	export_cms = commands.add_parser("export-cms", help = "export CMS pages and/or blocks")
+	export_cms.add_argument("resources", choices = ("pages", "blocks", "all"))
+	export_cms.add_argument("out_dir")
+
+	dump_products = commands.add_parser("dump-products", help = "dump all products as JSON lines")
+	dump_products.add_argument("out_path")
+
+	audit_skus = commands.add_parser("audit-skus", help = "check SKUs exist, are enabled, visible and in stock (CSV report)")
+	audit_skus.add_argument("skus_path", help = "file with one SKU per line, or - for stdin")
+	audit_skus.add_argument("--out", help = "report file (default: stdout)")
+
+	grep_cms = commands.add_parser("grep-cms", help = "search all CMS content (via the local CMS mirror)")
+	grep_cms.add_argument("text")
+	grep_cms.add_argument("--limit", type = int, default = 200)
+
+	return parser
+
+def main(argv = None):
+	args = get_parser().parse_args(argv)
+
+	settings = load_settings(args.settings)
+
+	if args.profile != None:
+		select_profile(settings, args.profile)
+
+	if os.environ.get("M2_API_KEY"):
+		settings["api_key"] = os.environ["M2_API_KEY"]
+
+	if not args.cache:
+		settings["response_cache"] = False
+		settings["offline_cache"]  = False
+
+	env.configure(settings = settings)
+
+	if not (env.get_current_profile().get("api_key") or settings.get("api_key")):
+		raise SystemExit("no API key: set \"api_key\" in the settings or profile, or M2_API_KEY")
+
+	env.log("using " + env.get_current_profile()["base_url"])
+
+	options = {"workers": args.workers, "processes": args.processes}
+
+	if args.command == "export-cms":
+		resource_types = {"pages": ["cmsPage"], "blocks": ["cmsBlock"], "all": ["cmsPage", "cmsBlock"]}[args.resources]
+
+		ok = all([jobs.export_cms(resource_type, args.out_dir, **options) for resource_type in resource_types])
+
+	elif args.command == "dump-products":
+		ok = jobs.dump_products(args.out_path, **options)
+
+	elif args.command == "audit-skus":
+		if args.skus_path == "-":
+			skus = sys.stdin.read().splitlines()
+		else:
+			with open(args.skus_path, "r", encoding = "utf-8") as f:
+				skus = f.read().splitlines()
+
+		if args.out:
+			with open(args.out, "w", encoding = "utf-8", newline = "") as out:
+				ok = jobs.audit_skus(skus, out, **options)
+		else:
+			ok = jobs.audit_skus(skus, sys.stdout, **options)
+
+	elif args.command == "grep-cms":
+		mirror = CmsMirror.for_profile()
+		mirror.sync()
+
+		results = mirror.search(args.text, args.limit)
+
+		for result in results:
+			print("{}\t{}\t{}\t{}\t{}".format(result["type"], result["id"], result["identifier"], result["line"] or "", result["snippet"]))
+
+		ok = bool(results)
+
+	return 0 if ok else 1
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,504 @@
+import json
+import os
+import threading
+
+from Magento2Stuff.core.api import MagentoAPI as api
+from Magento2Stuff.core.cms_references import get_reference_lines, is_reference_to
+from Magento2Stuff.core.environment import ENV as env
+from Magento2Stuff.core.lazy import lazy_import
+from Magento2Stuff.core.query import Param, SearchCriteria
+from Magento2Stuff.core.throttle import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+sqlite3 = lazy_import("sqlite3")
+
+# Local mirror of the content of every CMS page and block, per profile, for
+# searching across all CMS content.
+#
+# Synced incrementally by update_time (plus a full ID check when the count
+# doesn't match, to catch deletions and anything the incremental sync missed). Stored in SQLite with a full-text index
+# where available: the index narrows the search down to resources containing
+# all the words in the query, which are then checked for the exact text.
+# Without SQLite/FTS (some Sublime Text builds), a JSON file is kept instead
+# and searched with a linear scan.
+#
+# The mirror also indexes references to CMS blocks from widget/block
+# directives (see cms_references.py), kept up to date as resources are stored,
+# so block hovers and "who uses this block" don't need the API.
+class CmsMirror():
+	RESOURCE_TYPES = ("cmsPage", "cmsBlock")
+
+	PAGE_SIZE = 50
+
+	FIELDS = ("id", "title", "identifier", "active", "update_time", "content")
+
+	MIRRORS = {}
+
+	MIRRORS_LOCK = threading.Lock()
+
+	# Search criteria field names of the IDs
+	ID_FIELDS = {
+		"cmsPage": "page_id",
+		"cmsBlock": "block_id",
+	}
+
+	# Resource type -> queries (see get_queries)
+	QUERIES = {}
+
+	COUNT_QUERY = SearchCriteria().page(1).fields("total_count").compile()
+
+	# Bumped when reference extraction changes, so the index is rebuilt
+	REFERENCES_VERSION = "1"
+
+	def __init__(self, profile):
+		self.profile  = profile
+		self.lock     = threading.RLock()
+		self.syncing  = threading.Lock()
+		self.db       = None
+		self.fts      = None
+		self.data     = None # Fallback store: {"watermarks": {}, "resources": {"cmsPage:1": {...}}}
+
+		self.open()
+
+	@staticmethod
+	def for_profile(profile = None):
+		if profile == None:
+			profile = env.get_current_profile()
+
+		key = profile["base_url"]
+
+		with CmsMirror.MIRRORS_LOCK:
+			if key not in CmsMirror.MIRRORS:
+				CmsMirror.MIRRORS[key] = CmsMirror(profile)
+
+			return CmsMirror.MIRRORS[key]
+
+	def open(self):
+		try:
+			self.db = sqlite3.connect(env.get_profile_cache_path(self.profile, "cms_mirror.sqlite3"), check_same_thread = False)
+
+			self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+			self.db.execute("CREATE TABLE IF NOT EXISTS resources (rowid INTEGER PRIMARY KEY, type TEXT, id INTEGER, identifier TEXT, title TEXT, active INTEGER, update_time TEXT, content TEXT, UNIQUE (type, id))")
+
+			self.db.execute("CREATE TABLE IF NOT EXISTS block_references (source_rowid INTEGER, target TEXT, line INTEGER)")
+			self.db.execute("CREATE INDEX IF NOT EXISTS block_references_target ON block_references (target)")
+			self.db.execute("CREATE INDEX IF NOT EXISTS block_references_source ON block_references (source_rowid)")
+
+			for module in ("fts5", "fts4"):
+				try:
+					self.db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS resources_fts USING {} (title, identifier, content)".format(module))
+					self.fts = module
+					break
+
+				except sqlite3.OperationalError:
+					pass
+
+			self.rebuild_references_if_outdated()
+
+			self.db.commit()
+
+		except ImportError:
+			self.db = None
+
+		if self.db == None:
+			env.log("SQLite not available, CMS content search will use a linear scan")
+
+			self.load_fallback()
+
+	def get_fallback_path(self):
+		return env.get_profile_cache_path(self.profile, "cms_mirror.json")
+
+	def load_fallback(self):
+		self.data = {"watermarks": {}, "resources": {}}
+
+		try:
+			with open(self.get_fallback_path(), "r", encoding = "utf-8") as f:
+				self.data = json.load(f)
+
+		except (OSError, ValueError):
+			pass
+
+	def save_fallback(self):
+		file_path = self.get_fallback_path()
+
+		with open(file_path + ".tmp", "w", encoding = "utf-8") as f:
+			json.dump(self.data, f, separators = (",", ":"))
+
+		os.replace(file_path + ".tmp", file_path)
+
+	def get_watermark(self, resource_type):
+		with self.lock:
+			if self.db == None:
+				return self.data["watermarks"].get(resource_type)
+
+			row = self.db.execute("SELECT value FROM meta WHERE key = ?", ("watermark_" + resource_type,)).fetchone()
+
+			return row[0] if row else None
+
+	def set_watermark(self, resource_type, watermark):
+		if self.db == None:
+			self.data["watermarks"][resource_type] = watermark
+		else:
+			self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", ("watermark_" + resource_type, watermark))
+
+	def count(self, resource_type = None):
+		with self.lock:
+			if self.db == None:
+				return sum(1 for resource in self.data["resources"].values() if resource_type in (None, resource["type"]))
+
+			if resource_type == None:
+				return self.db.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
+
+			return self.db.execute("SELECT COUNT(*) FROM resources WHERE type = ?", (resource_type,)).fetchone()[0]
+
+	# Whether a sync has ever finished. Resources are stored as they arrive, so
+	# until then the mirror may be partly filled.
+	def is_complete(self):
+		with self.lock:
+			if self.db == None:
+				return bool(self.data.get("complete"))
+
+			return self.db.execute("SELECT value FROM meta WHERE key = 'complete'").fetchone() != None
+
+	# Returns the number of resources added, updated or removed
+	def sync(self, priority = PRIORITY_BACKGROUND):
+		# Concurrent syncs would only fetch the same changes twice
+		if not self.syncing.acquire(False):
+			return 0
+
+		try:
+			return self.run_sync(priority)
+
+		finally:
+			self.syncing.release()
+
+	# Must be called with self.syncing held
+	def run_sync(self, priority):
+		changed = 0
+
+		for resource_type in CmsMirror.RESOURCE_TYPES:
+			changed += self.sync_resource_type(resource_type, priority)
+
+		with self.lock:
+			if not self.is_complete():
+				if self.db == None:
+					self.data["complete"] = True
+				else:
+					self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('complete', '1')")
+
+				self.commit()
+
+		return changed
+
+	# Returns a dict of compiled queries: "changed" (since a watermark), "all",
+	# "ids" (IDs only) and "by_ids". Pages are sorted on the ID, so they don't
+	# shift when content is saved during a sync.
+	@staticmethod
+	def get_queries(resource_type):
+		if resource_type not in CmsMirror.QUERIES:
+			id_field = CmsMirror.ID_FIELDS[resource_type]
+			fields   = [{"items": list(CmsMirror.FIELDS)}, "total_count"]
+
+			CmsMirror.QUERIES[resource_type] = {
+				"changed": SearchCriteria().filter("update_time", Param("since"), "gteq").sort(id_field, "ASC").page(CmsMirror.PAGE_SIZE, Param("current_page")).fields(fields).compile(),
+				"all": SearchCriteria().sort(id_field, "ASC").page(CmsMirror.PAGE_SIZE, Param("current_page")).fields(fields).compile(),
+				"ids": SearchCriteria().sort(id_field, "ASC").page(1000, Param("current_page")).fields([{"items": ["id"]}, "total_count"]).compile(),
+				"by_ids": SearchCriteria().filter(id_field, Param("ids"), "in").page(CmsMirror.PAGE_SIZE).fields(fields).compile(),
+			}
+
+		return CmsMirror.QUERIES[resource_type]
+
+	def sync_resource_type(self, resource_type, priority):
+		endpoint  = resource_type + "/search"
+		queries   = CmsMirror.get_queries(resource_type)
+		watermark = self.get_watermark(resource_type)
+		changed   = 0
+		page      = 1
+
+		while True:
+			# Same-second updates are re-fetched rather than missed
+			if watermark != None:
+				query = queries["changed"].bind(since = watermark, current_page = page)
+			else:
+				query = queries["all"].bind(current_page = page)
+
+			response = api.request("GET", endpoint, search_criteria = query, priority = priority, profile = self.profile, cache = False)
+			items    = response["items"] or []
+
+			with self.lock:
+				for item in items:
+					self.store(resource_type, item)
+
+					# Items from the watermark's own second were already stored
+					if watermark == None or item["update_time"] > watermark:
+						changed += 1
+
+			if not items or page * CmsMirror.PAGE_SIZE >= response["total_count"]:
+				break
+
+			page += 1
+
+		with self.lock:
+			latest = self.get_latest_update_time(resource_type)
+
+			if latest:
+				self.set_watermark(resource_type, latest)
+
+			self.commit()
+
+		# Deleted resources don't show up as changes
+		total = api.request("GET", endpoint, search_criteria = CmsMirror.COUNT_QUERY.bind(), priority = priority, profile = self.profile, cache = False)["total_count"]
+
+		if total != self.count(resource_type):
+			changed += self.reconcile_ids(resource_type, priority)
+
+		return changed
+
+	def get_latest_update_time(self, resource_type):
+		with self.lock:
+			if self.db == None:
+				times = [resource["update_time"] for resource in self.data["resources"].values() if resource["type"] == resource_type]
+
+				return max(times) if times else None
+
+			return self.db.execute("SELECT MAX(update_time) FROM resources WHERE type = ?", (resource_type,)).fetchone()[0]
+
+	# Removes resources which no longer exist on the store, and fetches any which
+	# are missing from the mirror. Returns the number removed or added.
+	def reconcile_ids(self, resource_type, priority):
+		endpoint = resource_type + "/search"
+		queries  = CmsMirror.get_queries(resource_type)
+		ids      = set()
+		page     = 1
+
+		while True:
+			response = api.request("GET", endpoint, search_criteria = queries["ids"].bind(current_page = page), priority = priority, profile = self.profile, cache = False)
+
+			ids.update(item["id"] for item in response["items"] or [])
+
+			if not response["items"] or len(ids) >= response["total_count"]:
+				break
+
+			page += 1
+
+		with self.lock:
+			if self.db == None:
+				deleted = [key for key, resource in self.data["resources"].items() if resource["type"] == resource_type and resource["id"] not in ids]
+				missing = ids - {resource["id"] for resource in self.data["resources"].values() if resource["type"] == resource_type}
+
+				for key in deleted:
+					del self.data["resources"][key]
+
+			else:
+				rows    = self.db.execute("SELECT rowid, id FROM resources WHERE type = ?", (resource_type,)).fetchall()
+				deleted = [rowid for rowid, resource_id in rows if resource_id not in ids]
+				missing = ids - {resource_id for rowid, resource_id in rows}
+
+				for rowid in deleted:
+					self.db.execute("DELETE FROM resources WHERE rowid = ?", (rowid,))
+					self.db.execute("DELETE FROM block_references WHERE source_rowid = ?", (rowid,))
+
+					if self.fts:
+						self.db.execute("DELETE FROM resources_fts WHERE rowid = ?", (rowid,))
+
+			self.commit()
+
+		# e.g. saved during a previous sync, between two pages
+		missing = sorted(missing)
+		added   = 0
+
+		for start in range(0, len(missing), CmsMirror.PAGE_SIZE):
+			query    = queries["by_ids"].bind(ids = ",".join(str(resource_id) for resource_id in missing[start:start + CmsMirror.PAGE_SIZE]))
+			response = api.request("GET", endpoint, search_criteria = query, priority = priority, profile = self.profile, cache = False)
+
+			with self.lock:
+				for item in response["items"] or []:
+					self.store(resource_type, item)
+					added += 1
+
+				self.commit()
+
+		return len(deleted) + added
+
+	# Must be called with the lock held
+	def store(self, resource_type, item):
+		values = (resource_type, item["id"], item.get("identifier") or "", item.get("title") or "", 1 if item.get("active") else 0, item.get("update_time") or "", item.get("content") or "")
+
+		if self.db == None:
+			self.data["resources"]["{}:{}".format(resource_type, item["id"])] = dict(zip(("type", "id", "identifier", "title", "active", "update_time", "content"), values))
+			return
+
+		self.db.execute("INSERT OR REPLACE INTO resources (rowid, type, id, identifier, title, active, update_time, content) VALUES ((SELECT rowid FROM resources WHERE type = ? AND id = ?), ?, ?, ?, ?, ?, ?, ?)", (resource_type, item["id"]) + values)
+
+		rowid = self.db.execute("SELECT rowid FROM resources WHERE type = ? AND id = ?", (resource_type, item["id"])).fetchone()[0]
+
+		self.store_references(rowid, values[6])
+
+		if self.fts:
+			self.db.execute("DELETE FROM resources_fts WHERE rowid = ?", (rowid,))
+			self.db.execute("INSERT INTO resources_fts (rowid, title, identifier, content) VALUES (?, ?, ?, ?)", (rowid, values[3], values[2], values[6]))
+
+	# Must be called with the lock held
+	def store_references(self, rowid, content):
+		self.db.execute("DELETE FROM block_references WHERE source_rowid = ?", (rowid,))
+		self.db.executemany("INSERT INTO block_references (source_rowid, target, line) VALUES (?, ?, ?)", [(rowid, target, line) for target, line in get_reference_lines(content)])
+
+	def rebuild_references_if_outdated(self):
+		row = self.db.execute("SELECT value FROM meta WHERE key = 'references_version'").fetchone()
+
+		if row and row[0] == CmsMirror.REFERENCES_VERSION:
+			return
+
+		self.db.execute("DELETE FROM block_references")
+
+		for rowid, content in self.db.execute("SELECT rowid, content FROM resources").fetchall():
+			self.store_references(rowid, content)
+
+		self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('references_version', ?)", (CmsMirror.REFERENCES_VERSION,))
+
+	def commit(self):
+		if self.db == None:
+			self.save_fallback()
+		else:
+			self.db.commit()
+
+	# Case-insensitive search for `text` in content, titles and identifiers.
+	# Returns a list of dicts with the resource's fields (except content), plus
+	# "line" (1-based) and "snippet" for the first match in content.
+	def search(self, text, limit = 200):
+		needle = text.lower()
+
+		if not needle:
+			return []
+
+		results = []
+
+		for resource in self.get_candidates(text):
+			content = resource["content"]
+			index   = content.lower().find(needle)
+
+			if index == -1 and needle not in resource["title"].lower() and needle not in resource["identifier"].lower():
+				continue
+
+			result = {key: value for key, value in resource.items() if key != "content"}
+
+			if index != -1:
+				line_start = content.rfind("\n", 0, index) + 1
+				line_end   = content.find("\n", index)
+
+				result["line"]    = content.count("\n", 0, index) + 1
+				result["snippet"] = content[line_start:line_end if line_end != -1 else len(content)].strip()[:200]
+
+			else:
+				result["line"]    = None
+				result["snippet"] = ""
+
+			results.append(result)
+
+			if len(results) >= limit:
+				break
+
+		return results
+
+	def get_candidates(self, text):
+		columns = ("type", "id", "identifier", "title", "active", "update_time", "content")
+
+		with self.lock:
+			if self.db == None:
+				return list(self.data["resources"].values())
+
+			match = self.get_match_expression(text) if self.fts else None
+
+			if match:
+				rows  = self.db.execute("SELECT r.type, r.id, r.identifier, r.title, r.active, r.update_time, r.content FROM resources_fts f JOIN resources r ON r.rowid = f.rowid WHERE resources_fts MATCH ? ORDER BY r.type DESC, r.id", (match,)).fetchall()
+
+			else:
+				pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+				rows    = self.db.execute("SELECT type, id, identifier, title, active, update_time, content FROM resources WHERE content LIKE ? ESCAPE '\\' OR title LIKE ? ESCAPE '\\' OR identifier LIKE ? ESCAPE '\\' ORDER BY type DESC, id", (pattern, pattern, pattern)).fetchall()
+
+		return [dict(zip(columns, row)) for row in rows]
+
+	# The full-text index only matches whole words (or word prefixes), but the
+	# text may start or end part way through a word. Words with text on both
+	# sides are matched exactly, the last word as a prefix, and a word at the
+	# start of the text can't be used. Returns None if no words are usable.
+	def get_match_expression(self, text):
+		terms = []
+		words = "".join(char if char.isalnum() else " " for char in text).split(" ")
+
+		for i, word in enumerate(words):
+			if not word or i == 0:
+				continue
+
+			if i == len(words) - 1:
+				terms.append('"{}"*'.format(word) if self.fts == "fts5" else "{}*".format(word))
+			else:
+				terms.append('"{}"'.format(word))
+
+		return " ".join(terms) or None
+
+	# Every resource (of a type, if given) with its content
+	def get_resources(self, resource_type = None):
+		columns = ("type", "id", "identifier", "title", "active", "update_time", "content")
+
+		with self.lock:
+			if self.db == None:
+				return [dict(resource) for resource in self.data["resources"].values() if resource_type in (None, resource["type"])]
+
+			if resource_type == None:
+				rows = self.db.execute("SELECT type, id, identifier, title, active, update_time, content FROM resources ORDER BY type DESC, id").fetchall()
+			else:
+				rows = self.db.execute("SELECT type, id, identifier, title, active, update_time, content FROM resources WHERE type = ? ORDER BY id", (resource_type,)).fetchall()
+
+		return [dict(zip(columns, row)) for row in rows]
+
+	# Resources matching a reference (an ID or identifier). Identifiers are only
+	# unique per store view, so there may be more than one.
+	def find_resources(self, resource_type, reference):
+		columns = ("type", "id", "identifier", "title", "active", "update_time")
+
+		with self.lock:
+			if self.db == None:
+				resources = [resource for resource in self.data["resources"].values() if resource["type"] == resource_type and is_reference_to(reference, resource)]
+
+				return [{key: resource[key] for key in columns} for resource in resources]
+
+			resource_id = int(reference) if reference.isdigit() else None
+
+			rows = self.db.execute("SELECT type, id, identifier, title, active, update_time FROM resources WHERE type = ? AND (id = ? OR identifier = ?) ORDER BY id", (resource_type, resource_id, reference)).fetchall()
+
+		return [dict(zip(columns, row)) for row in rows]
+
+	def find_blocks(self, reference):
+		return self.find_resources("cmsBlock", reference)
+
+	# "Who uses this block": pages and blocks referencing the block by ID or
+	# identifier, with "line" set to the first reference
+	def get_block_users(self, block):
+		columns = ("type", "id", "identifier", "title", "active", "update_time", "line")
+
+		with self.lock:
+			if self.db == None:
+				users = []
+
+				for resource in self.data["resources"].values():
+					lines = [line for target, line in get_reference_lines(resource["content"]) if is_reference_to(target, block)]
+
+					if lines:
+						user = {key: resource[key] for key in columns if key != "line"}
+						user["line"] = lines[0]
+
+						users.append(user)
+
+				return sorted(users, key = lambda user: (user["type"] != "cmsPage", user["id"]))
+
+			rows = self.db.execute("SELECT r.type, r.id, r.identifier, r.title, r.active, r.update_time, MIN(b.line) FROM block_references b JOIN resources r ON r.rowid = b.source_rowid WHERE b.target IN (?, ?) GROUP BY r.rowid ORDER BY r.type DESC, r.id", (str(block["id"]), block["identifier"])).fetchall()
+
+		return [dict(zip(columns, row)) for row in rows]
+
+	# Interactive callers wait for the first full sync, including one another
+	# thread already started, so they never search a partly filled mirror
+	def sync_if_incomplete(self):
+		while not self.is_complete():
+			with self.syncing:
+				if not self.is_complete():
+					self.run_sync(PRIORITY_INTERACTIVE)
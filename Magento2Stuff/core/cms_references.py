@@ -0,0 +1,63 @@
+import re
+
+# References to CMS blocks from CMS content, i.e. the block widget and block
+# directives:
+#
+#   {{widget type="Magento\Cms\Block\Widget\Block" template="..." block_id="12"}}
+#   {{block id="footer_links"}}
+#   {{block class="Magento\Cms\Block\Block" block_id="footer_links"}}
+#
+# The referenced value is either a block ID or an identifier. References to
+# pages are found the same way, but aren't indexed.
+
+ATTRIBUTE_PATTERN = re.compile(r"""([a-z_]+)\s*=\s*(["'])(.*?)\2""", re.DOTALL | re.IGNORECASE)
+
+# Attributes holding a block reference, per directive
+REFERENCE_ATTRIBUTES = {
+	"widget": ("block_id",),
+	"block": ("id", "block_id"),
+}
+
+# Attributes holding a page ID (the CMS page link widget) or identifier (store
+# URLs, which may also be other routes)
+PAGE_REFERENCE_ATTRIBUTES = {
+	"widget": ("page_id",),
+	"store": ("url", "direct_url"),
+}
+
+DIRECTIVE_PATTERNS = {}
+
+# Returns a list of (value, start, end) for each block reference in `content`,
+# where start and end are the offsets of the value itself. Other references
+# are found by passing the directives and attributes to look for.
+def find_references(content, directive_attributes = REFERENCE_ATTRIBUTES):
+	references = []
+
+	if "{{" not in content:
+		return references
+
+	directives = tuple(sorted(directive_attributes))
+
+	if directives not in DIRECTIVE_PATTERNS:
+		DIRECTIVE_PATTERNS[directives] = re.compile(r"\{\{(" + "|".join(directives) + r")\b(.*?)\}\}", re.DOTALL | re.IGNORECASE)
+
+	for directive in DIRECTIVE_PATTERNS[directives].finditer(content):
+		names = directive_attributes[directive.group(1).lower()]
+
+		for attribute in ATTRIBUTE_PATTERN.finditer(directive.group(2)):
+			value = attribute.group(3).strip()
+
+			if attribute.group(1).lower() in names and value:
+				start = directive.start(2) + attribute.start(3)
+
+				references.append((value, start, start + len(attribute.group(3))))
+
+	return references
+
+# As find_references, but returns (value, line) with 1-based line numbers
+def get_reference_lines(content):
+	return [(value, content.count("\n", 0, start) + 1) for value, start, end in find_references(content)]
+
+# Whether a reference (an ID or identifier) refers to the given block
+def is_reference_to(value, block):
+	return value == str(block["id"]) or value == block["identifier"]
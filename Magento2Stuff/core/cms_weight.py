@@ -0,0 +1,141 @@
+import re
+import urllib.parse
+
+from Magento2Stuff.core.cms_references import find_references
+
+# Where the bytes in CMS content go: base64 images, inline CSS (<style> and
+# style attributes), inline JS, widget/block directives and everything else.
+#
+# Images inside CSS (url(data:...)) count as images, not CSS, so each byte is
+# only counted once. Media files the content references are listed so their
+# sizes can be looked up separately.
+
+CATEGORIES = ("inline images", "inline CSS", "inline JS", "widgets", "markup")
+
+DATA_URI_PATTERN = re.compile(r"data:(image/[a-z0-9.+-]+);base64,[a-z0-9+/=\s]+", re.IGNORECASE)
+
+STYLE_PATTERN = re.compile(r"""<style\b[^>]*>.*?</style\s*>|\sstyle\s*=\s*(?:"[^"]*"|'[^']*')""", re.DOTALL | re.IGNORECASE)
+
+# Scripts with a src are external, so only their tag is markup
+SCRIPT_PATTERN = re.compile(r"<script\b(?![^>]*\bsrc\s*=)[^>]*>.*?</script\s*>", re.DOTALL | re.IGNORECASE)
+
+WIDGET_PATTERN = re.compile(r"\{\{(?:widget|block)\b.*?\}\}", re.DOTALL | re.IGNORECASE)
+
+# {{media url="..."}}, which the editor may have escaped as &quot;
+MEDIA_DIRECTIVE_PATTERN = re.compile(r"""\{\{media\s+url\s*=\s*(?:&quot;|["'])?([^"'}\s&]+)""", re.IGNORECASE)
+
+# src="..." and CSS url(...) with a URL or absolute path
+MEDIA_URL_PATTERN = re.compile(r"""(?:\ssrc\s*=\s*["']|url\(\s*["']?)((?:https?:)?//[^"')\s]+|/[^"')\s]+)""", re.IGNORECASE)
+
+MEDIA_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".svg", ".mp4", ".webm")
+
+CSS_COMMENT_PATTERN = re.compile(r"/\*.*?\*/", re.DOTALL)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+PUNCTUATION_SPACE_PATTERN = re.compile(r"\s*([{}:;,()=<>+])\s*")
+
+# Returns a dict with:
+#
+#   bytes       - UTF-8 size of the content
+#   categories  - bytes per category (see CATEGORIES)
+#   items       - inline images, styles and scripts, each a dict with
+#                 category, line, bytes, detail and savings (the estimated
+#                 bytes minification would save, for CSS/JS)
+#   widgets     - number of widget/block directives
+#   blocks      - block references (IDs or identifiers), in order
+#   media       - referenced media URLs, resolved against base_url
+def analyze(content, base_url):
+	categories = dict.fromkeys(CATEGORIES, 0)
+	items      = []
+	claimed    = []
+
+	for category, pattern in (("inline images", DATA_URI_PATTERN), ("inline JS", SCRIPT_PATTERN), ("inline CSS", STYLE_PATTERN), ("widgets", WIDGET_PATTERN)):
+		for match in pattern.finditer(content):
+			text = "".join(content[start:end] for start, end in subtract_spans(match.start(), match.end(), claimed))
+			size = len(text.encode("utf-8"))
+
+			claimed.append((match.start(), match.end()))
+
+			categories[category] += size
+
+			if category == "widgets":
+				continue
+
+			item = {
+				"category": category,
+				"line": content.count("\n", 0, match.start()) + 1,
+				"bytes": size,
+				"detail": get_detail(category, match),
+				"savings": 0,
+			}
+
+			if category != "inline images":
+				item["savings"] = max(size - estimate_minified_size(text), 0)
+
+			items.append(item)
+
+	total = len(content.encode("utf-8"))
+
+	categories["markup"] = total - sum(categories.values())
+
+	return {
+		"bytes": total,
+		"categories": categories,
+		"items": items,
+		"widgets": len(WIDGET_PATTERN.findall(content)),
+		"blocks": [value for value, start, end in find_references(content)],
+		"media": get_media_urls(content, base_url),
+	}
+
+def get_detail(category, match):
+	if category == "inline images":
+		return "base64 " + match.group(1).lower()
+
+	if category == "inline JS":
+		return "<script>"
+
+	return "<style>" if match.group(0).lstrip().startswith("<") else "style attribute"
+
+# Parts of start-end not already covered by `spans`
+def subtract_spans(start, end, spans):
+	parts = [(start, end)]
+
+	for span_start, span_end in spans:
+		if span_end <= start or span_start >= end:
+			continue
+
+		remaining = []
+
+		for part_start, part_end in parts:
+			if span_start > part_start:
+				remaining.append((part_start, min(span_start, part_end)))
+
+			if span_end < part_end:
+				remaining.append((max(span_end, part_start), part_end))
+
+		parts = [(part_start, part_end) for part_start, part_end in remaining if part_end > part_start]
+
+	return parts
+
+# A rough minifier: comments and whitespace around punctuation are dropped and
+# other whitespace collapsed. Good enough to tell pasted, formatted code from
+# already minified code.
+def estimate_minified_size(code):
+	code = CSS_COMMENT_PATTERN.sub("", code)
+	code = "\n".join(line for line in code.split("\n") if not line.strip().startswith("//"))
+	code = WHITESPACE_PATTERN.sub(" ", code)
+	code = PUNCTUATION_SPACE_PATTERN.sub(r"\1", code)
+
+	return len(code.strip().encode("utf-8"))
+
+def get_media_urls(content, base_url):
+	urls = []
+
+	for path in MEDIA_DIRECTIVE_PATTERN.findall(content):
+		urls.append(base_url + "media/" + path.lstrip("/"))
+
+	for url in MEDIA_URL_PATTERN.findall(content):
+		urls.append(urllib.parse.urljoin(base_url, url))
+
+	return [url for url in dict.fromkeys(urls) if urllib.parse.urlsplit(url).path.lower().endswith(MEDIA_EXTENSIONS)]
@@ -0,0 +1,102 @@
+import time
+
+# Parsed timestamps are shared between menu renders; relative strings are not,
+# as they depend on "now".
+PARSE_CACHE = {}
+
+PARSE_CACHE_MAX_SIZE = 50000
+
+# Convert a Magento timestamp ("YYYY-MM-DD HH:MM:SS", always UTC) to a Unix
+# timestamp without going through datetime.strptime.
+def parse_timestamp(datetime_str):
+	timestamp = PARSE_CACHE.get(datetime_str)
+
+	if timestamp != None:
+		return timestamp
+
+	year   = int(datetime_str[0:4])
+	month  = int(datetime_str[5:7])
+	day    = int(datetime_str[8:10])
+	hour   = int(datetime_str[11:13])
+	minute = int(datetime_str[14:16])
+	second = int(datetime_str[17:19])
+
+	timestamp = days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60 + second
+
+	if len(PARSE_CACHE) >= PARSE_CACHE_MAX_SIZE:
+		PARSE_CACHE.clear()
+
+	PARSE_CACHE[datetime_str] = timestamp
+
+	return timestamp
+
+# Days since 1970-01-01 for a proleptic Gregorian date - http://howardhinnant.github.io/date_algorithms.html#days_from_civil
+def days_from_civil(year, month, day):
+	if month <= 2:
+		year -= 1
+
+	era = year // 400
+	yoe = year - era * 400
+	doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+	doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+
+	return era * 146097 + doe - 719468
+
+# Formats timestamps relative to a single "now", so one instance should be
+# created per menu render. Results are cached per timestamp string.
+class RelativeTimeFormatter():
+	def __init__(self, now = None):
+		self.now   = int(now if now != None else time.time())
+		self.cache = {}
+
+	def format(self, datetime_str):
+		formatted = self.cache.get(datetime_str)
+
+		if formatted == None:
+			formatted = format_delta(self.now - parse_timestamp(datetime_str))
+			self.cache[datetime_str] = formatted
+
+		return formatted
+
+	def format_many(self, datetime_strs):
+		return [self.format(datetime_str) for datetime_str in datetime_strs]
+
+def format_delta(delta):
+	days    = delta // 86400
+	seconds = delta - days * 86400
+
+	# Less than a day, e.g. "18 hours, 24 minutes, 36 seconds"
+	if days < 1:
+		hours   = seconds // 3600
+		minutes = (seconds // 60) % 60
+		seconds = seconds % 60
+
+		return "{} {}, {} {}, {} {}".format(
+			hours,
+			check_plural(hours, "hour"),
+			minutes,
+			check_plural(minutes, "minute"),
+			seconds,
+			check_plural(seconds, "second"),
+		)
+
+	# Less than a year, e.g. "1 day ago"
+	if days < 365:
+		return "{} {} ago".format(
+			days,
+			check_plural(days, "day"),
+		)
+
+	# "More than a year ago"
+	years = days // 365
+
+	return "More than {} {} ago".format(
+		years,
+		check_plural(years, "year"),
+	)
+
+def check_plural(num, text):
+	if num == 1:
+		return text
+
+	return text + "s"
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import sys
+import time
+
+# Settings, logging and paths used by the core package, supplied by whatever
+# is running it: the Sublime Text plugin (see utils.py) or the command line
+# tool (see cli.py). Nothing in the core package imports sublime.
+class Environment():
+	def __init__(self):
+		self.settings     = {}
+		self.logger       = None
+		self.status       = None
+		self.cache_folder = None
+
+	# `settings` is a dict or a callable taking the setting name, `logger` and
+	# `status` are callables taking (message) and (key, value)
+	def configure(self, settings = None, logger = None, status = None, cache_folder = None):
+		if settings != None:
+			self.settings = settings
+
+		if logger != None:
+			self.logger = logger
+
+		if status != None:
+			self.status = status
+
+		if cache_folder != None:
+			self.cache_folder = cache_folder
+
+	def get_setting(self, name):
+		if callable(self.settings):
+			return self.settings(name)
+
+		return self.settings.get(name)
+
+	def log(self, message):
+		if self.logger != None:
+			return self.logger(message)
+
+		print("[{}] Magento2Stuff: {}".format(time.strftime("%Y-%m-%d %H:%M:%S"), message.strip()), file = sys.stderr)
+
+	# Status bar in Sublime Text, ignored elsewhere
+	def set_status(self, key, value):
+		if self.status != None:
+			self.status(key, value)
+
+	def get_current_profile(self):
+		profiles = self.get_setting("profiles")
+
+		if not profiles:
+			raise Exception("No profiles found")
+
+		index = self.get_setting("current_profile")
+
+		if index == None:
+			index = 0
+
+		return profiles[index]
+
+	# `cache_folder` may be a callable, as Sublime's cache path isn't known
+	# until the plugin API is ready
+	def get_cache_folder(self):
+		cache_folder = self.cache_folder() if callable(self.cache_folder) else self.cache_folder
+
+		if cache_folder == None:
+			cache_folder = os.path.join(os.path.expanduser("~"), ".cache", "Magento2Stuff")
+
+		return cache_folder
+
+	def get_profile_cache_path(self, profile, name):
+		profile_key = hashlib.md5(profile["base_url"].encode()).hexdigest()[:12]
+		folder      = os.path.join(self.get_cache_folder(), profile_key)
+
+		if not os.path.exists(folder):
+			os.makedirs(folder)
+
+		return os.path.join(folder, name)
+
+ENV = Environment()
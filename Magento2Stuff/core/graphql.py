@@ -0,0 +1,180 @@
+import json
+
+from Magento2Stuff.core.environment import ENV as env
+from Magento2Stuff.core.lazy import lazy_import
+from Magento2Stuff.core.offline import OfflineState
+from Magento2Stuff.core.throttle import PRIORITY_INTERACTIVE, RequestGovernor
+from Magento2Stuff.core.urls import Magento2StuffSettings
+
+urllib_request = lazy_import("urllib.request")
+
+# Optional GraphQL transport for product and category lookups, which asks for
+# exactly the fields shown rather than every attribute REST returns.
+#
+# Results are converted to the shape REST returns (see to_rest_product and
+# to_rest_category), so callers and row types don't care which transport was
+# used. GraphQL only sees what the storefront sees: disabled products and
+# categories, and products not visible individually, aren't returned, so the
+# hovers look up anything missing over REST. Catalog queries are anonymous;
+# the profile's API key is never sent to the storefront endpoint.
+
+# Fields for the SKU hover and highlighting
+PRODUCTS_BY_SKU_QUERY = """
+query ($skus: [String], $page_size: Int) {
+	products(filter: {sku: {in: $skus}}, pageSize: $page_size) {
+		items {
+			id
+			sku
+			name
+			type_id
+			url_key
+			updated_at
+			stock_status
+			small_image {
+				url
+			}
+			price_range {
+				minimum_price {
+					regular_price {
+						value
+					}
+				}
+			}
+		}
+	}
+}
+"""
+
+# Fields for the category hover and list menus
+CATEGORIES_BY_ID_QUERY = """
+query ($ids: [String], $page_size: Int) {
+	categories(filters: {ids: {in: $ids}}, pageSize: $page_size) {
+		items {
+			id
+			name
+			url_path
+			updated_at
+		}
+	}
+}
+"""
+
+class GraphQLError(Exception):
+	pass
+
+class GraphQLAPI():
+	@staticmethod
+	def is_enabled(profile = None):
+		if profile == None:
+			profile = env.get_current_profile()
+
+		enabled = profile.get("graphql_lookups")
+
+		return env.get_setting("graphql_lookups") if enabled == None else enabled
+
+	# Returns the query's "data"
+	@staticmethod
+	def request(query, variables = None, priority = PRIORITY_INTERACTIVE, profile = None, timeout = None):
+		if profile == None:
+			profile = env.get_current_profile()
+
+		req = urllib_request.Request(url = Magento2StuffSettings(profile).GRAPHQL_URL, data = encode_request(query, variables), method = "POST")
+
+		req.add_header("Accept",       "application/json")
+		req.add_header("Content-Type", "application/json")
+
+		# Store view code, for stores where the default isn't the one wanted
+		if profile.get("graphql_store"):
+			req.add_header("Store", profile["graphql_store"])
+
+		governor = RequestGovernor.for_profile(profile, env.get_setting("rate_limit"))
+
+		governor.acquire(priority)
+
+		try:
+			if timeout != None:
+				http_response = urllib_request.urlopen(req, timeout = timeout)
+			else:
+				http_response = urllib_request.urlopen(req)
+
+			with http_response:
+				response = json.loads(http_response.read().decode())
+
+		except Exception as e:
+			if OfflineState.is_network_error(e):
+				OfflineState.mark_offline(profile, e)
+
+			raise
+
+		finally:
+			governor.release()
+
+		OfflineState.mark_online(profile)
+
+		# Partial results come with errors for the fields which failed, which
+		# would leave gaps in what's shown
+		if response.get("errors"):
+			raise GraphQLError("; ".join(error.get("message", "") for error in response["errors"]))
+
+		return response["data"]
+
+	# Products keyed by (case-sensitive) SKU, in REST's shape
+	@staticmethod
+	def get_products_by_sku(skus, profile = None, timeout = None, priority = PRIORITY_INTERACTIVE):
+		data = GraphQLAPI.request(PRODUCTS_BY_SKU_QUERY, {"skus": list(skus), "page_size": len(skus)}, priority, profile, timeout)
+
+		return {item["sku"]: to_rest_product(item) for item in data["products"]["items"] or []}
+
+	@staticmethod
+	def get_categories_by_id(ids, profile = None, timeout = None, priority = PRIORITY_INTERACTIVE):
+		data = GraphQLAPI.request(CATEGORIES_BY_ID_QUERY, {"ids": [str(category_id) for category_id in ids], "page_size": len(ids)}, priority, profile, timeout)
+
+		return {str(item["id"]): to_rest_category(item) for item in data["categories"]["items"] or []}
+
+def encode_request(query, variables = None):
+	return json.dumps({"query": query, "variables": variables or {}}, separators = (",", ":")).encode()
+
+# Only enabled products are returned, so status is always 1. The image is
+# given as a full (possibly resized) URL; REST gives the path below
+# media/catalog/product, which the hover adds the catalog URL to.
+def to_rest_product(item):
+	custom_attributes = [{"attribute_code": "url_key", "value": item.get("url_key")}]
+
+	image_url = (item.get("small_image") or {}).get("url") or ""
+
+	if "/media/catalog/product/" in image_url and "/placeholder/" not in image_url:
+		image = image_url.split("/media/catalog/product", 1)[1]
+
+		# Resized images are under cache/<hash>/
+		if image.startswith("/cache/"):
+			image = "/" + image.split("/", 3)[3]
+
+		custom_attributes.append({"attribute_code": "image", "value": image})
+
+	price = ((item.get("price_range") or {}).get("minimum_price") or {}).get("regular_price") or {}
+
+	return {
+		"id": item["id"],
+		"sku": item["sku"],
+		"name": item["name"],
+		"type_id": item["type_id"],
+		"status": 1,
+		"price": price.get("value"),
+		"updated_at": item.get("updated_at"),
+		"custom_attributes": custom_attributes,
+		"extension_attributes": {
+			"stock_item": {
+				"is_in_stock": item.get("stock_status") == "IN_STOCK",
+			},
+		},
+	}
+
+# Likewise only active categories are returned
+def to_rest_category(item):
+	return {
+		"id": item["id"],
+		"name": item["name"],
+		"is_active": True,
+		"updated_at": item.get("updated_at"),
+		"custom_attributes": [{"attribute_code": "url_path", "value": item.get("url_path")}],
+	}
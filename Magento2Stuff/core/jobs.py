@@ -0,0 +1,253 @@
+import concurrent.futures
+import csv
+import json
+import math
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+
+from Magento2Stuff.core.api import MagentoAPI as api
+from Magento2Stuff.core.environment import ENV as env
+from Magento2Stuff.core.query import Param, SearchCriteria
+from Magento2Stuff.core.rows import get_custom_attribute
+from Magento2Stuff.core.throttle import PRIORITY_BACKGROUND
+
+# Bulk jobs for the command line tool (see cli.py).
+#
+# Each job is split into independent tasks (a page of search results, or one
+# lookup) which run_tasks spreads across a thread or process pool. Task
+# functions are module-level so they can be sent to worker processes.
+
+COUNT_QUERY = SearchCriteria().page(1).fields("total_count").compile()
+
+# Pages are sorted on the primary key so they don't overlap
+PAGE_QUERIES = {
+	endpoint: SearchCriteria().sort(field, "ASC").page(Param("page_size"), Param("current_page")).compile()
+	for endpoint, field in (("cmsPage/search", "page_id"), ("cmsBlock/search", "block_id"), ("products", "entity_id"))
+}
+
+class Progress():
+	def __init__(self, label, total, stream = None):
+		self.label   = label
+		self.total   = total
+		self.done    = 0
+		self.start   = time.perf_counter()
+		self.stream  = stream if stream != None else sys.stderr
+		self.is_tty  = hasattr(self.stream, "isatty") and self.stream.isatty()
+		self.printed = 0
+
+	def update(self, count = 1):
+		self.done += count
+
+		# Redrawn in place on a terminal, otherwise a line every 10%
+		if self.is_tty:
+			self.stream.write("\r" + self.format() + " " * 4)
+			self.stream.flush()
+
+		elif self.total and self.done * 10 // self.total > self.printed:
+			self.printed = self.done * 10 // self.total
+			self.stream.write(self.format() + "\n")
+
+	def format(self):
+		elapsed = time.perf_counter() - self.start
+		rate    = self.done / elapsed if elapsed > 0 else 0
+
+		if self.total:
+			remaining = (self.total - self.done) / rate if rate > 0 else 0
+
+			return "{}: {}/{} ({:.0f}%) {:.1f}/s, {:.0f}s left".format(self.label, self.done, self.total, self.done * 100 / self.total, rate, remaining)
+
+		return "{}: {} {:.1f}/s".format(self.label, self.done, rate)
+
+	def finish(self):
+		elapsed = time.perf_counter() - self.start
+
+		if self.is_tty:
+			self.stream.write("\n")
+
+		self.stream.write("{}: {} done in {:.1f}s\n".format(self.label, self.done, elapsed))
+
+# Worker processes get their own copy of the settings, with the profile's rate
+# limit split between them
+def configure_worker(settings, processes):
+	settings = dict(settings)
+
+	rate_limit = dict(settings.get("rate_limit") or {})
+
+	if "requests_per_second" in rate_limit:
+		rate_limit["requests_per_second"] = rate_limit["requests_per_second"] / processes
+
+	settings["rate_limit"] = rate_limit
+
+	env.configure(settings = settings)
+
+# Yields (task, result or exception) as tasks complete
+def run_tasks(function, tasks, workers = 4, processes = False):
+	if processes:
+		executor = concurrent.futures.ProcessPoolExecutor(workers, initializer = configure_worker, initargs = (env.settings, workers))
+	else:
+		executor = concurrent.futures.ThreadPoolExecutor(workers)
+
+	with executor:
+		futures = {executor.submit(function, task): task for task in tasks}
+
+		for future in concurrent.futures.as_completed(futures):
+			try:
+				yield futures[future], future.result()
+
+			except Exception as e:
+				yield futures[future], e
+
+def get_page_tasks(endpoint, page_size):
+	total = api.request("GET", endpoint, search_criteria = COUNT_QUERY.bind(), cache = False)["total_count"]
+
+	return total, [(endpoint, page, page_size) for page in range(1, math.ceil(total / page_size) + 1)]
+
+def fetch_page(task):
+	endpoint, page, page_size = task
+
+	response = api.request("GET", endpoint, search_criteria = PAGE_QUERIES[endpoint].bind(page_size = page_size, current_page = page), priority = PRIORITY_BACKGROUND, cache = False)
+
+	return response["items"] or []
+
+# CMS pages or blocks, written as <type>/<id>_<identifier>.html with the other
+# fields alongside in a .json file
+def export_cms(resource_type, out_dir, workers = 4, processes = False, page_size = 50):
+	total, tasks = get_page_tasks(resource_type + "/search", page_size)
+
+	folder = os.path.join(out_dir, resource_type)
+
+	if not os.path.exists(folder):
+		os.makedirs(folder)
+
+	progress = Progress("export " + resource_type, total)
+	failed   = 0
+
+	for task, result in run_tasks(fetch_page, tasks, workers, processes):
+		if isinstance(result, Exception):
+			env.log("page {} failed: {}".format(task[1], result))
+			failed += 1
+			continue
+
+		for item in result:
+			file_name = "{}_{}".format(item["id"], urllib.parse.quote_plus(item.get("identifier") or ""))
+			content   = item.pop("content", "") or ""
+
+			with open(os.path.join(folder, file_name + ".html"), "w", encoding = "utf-8", newline = "\n") as f:
+				f.write(content)
+
+			with open(os.path.join(folder, file_name + ".json"), "w", encoding = "utf-8", newline = "\n") as f:
+				json.dump(item, f, indent = "\t")
+
+		progress.update(len(result))
+
+	progress.finish()
+
+	return failed == 0
+
+# All products as JSON lines, in the order pages complete
+def dump_products(out_path, workers = 4, processes = False, page_size = 100):
+	total, tasks = get_page_tasks("products", page_size)
+
+	progress = Progress("dump products", total)
+	failed   = 0
+
+	with open(out_path, "w", encoding = "utf-8", newline = "\n") as f:
+		for task, result in run_tasks(fetch_page, tasks, workers, processes):
+			if isinstance(result, Exception):
+				env.log("page {} failed: {}".format(task[1], result))
+				failed += 1
+				continue
+
+			for item in result:
+				f.write(json.dumps(item, separators = (",", ":")) + "\n")
+
+			progress.update(len(result))
+
+	progress.finish()
+
+	return failed == 0
+
+AUDIT_COLUMNS = ("sku", "found", "id", "name", "type_id", "status", "visibility", "price", "url_key", "qty", "is_in_stock", "problems")
+
+def audit_sku(sku):
+	row = {column: "" for column in AUDIT_COLUMNS}
+	row["sku"] = sku
+
+	quoted = urllib.parse.quote(sku, safe = "")
+
+	try:
+		product = api.request("GET", "products/" + quoted, priority = PRIORITY_BACKGROUND, cache = False)
+
+	except urllib.error.HTTPError as e:
+		if e.code != 404:
+			raise
+
+		row["found"]    = "no"
+		row["problems"] = "not found"
+
+		return row
+
+	problems = []
+
+	row.update({
+		"found": "yes",
+		"id": product["id"],
+		"name": product.get("name"),
+		"type_id": product.get("type_id"),
+		"status": product.get("status"),
+		"visibility": product.get("visibility"),
+		"price": product.get("price"),
+		"url_key": get_custom_attribute(product, "url_key"),
+	})
+
+	if product.get("status") != 1:
+		problems.append("disabled")
+
+	if product.get("visibility") == 1:
+		problems.append("not visible individually")
+
+	if not row["url_key"]:
+		problems.append("no url_key")
+
+	try:
+		stock = api.request("GET", "stockItems/" + quoted, priority = PRIORITY_BACKGROUND, cache = False)
+
+		row["qty"]         = stock.get("qty")
+		row["is_in_stock"] = stock.get("is_in_stock")
+
+		if not stock.get("is_in_stock"):
+			problems.append("out of stock")
+
+	except urllib.error.HTTPError as e:
+		problems.append("no stock item ({})".format(e.code))
+
+	row["problems"] = "; ".join(problems)
+
+	return row
+
+# Writes a CSV report, one row per SKU in the order given
+def audit_skus(skus, out, workers = 4, processes = False):
+	skus     = list(dict.fromkeys(sku.strip() for sku in skus if sku.strip()))
+	progress = Progress("audit SKUs", len(skus))
+	rows     = {}
+
+	for sku, result in run_tasks(audit_sku, skus, workers, processes):
+		if isinstance(result, Exception):
+			result = {"sku": sku, "found": "error", "problems": str(result)}
+
+		rows[sku] = result
+
+		progress.update()
+
+	progress.finish()
+
+	writer = csv.DictWriter(out, AUDIT_COLUMNS, restval = "", lineterminator = "\n")
+	writer.writeheader()
+
+	for sku in skus:
+		writer.writerow(rows[sku])
+
+	return all(rows[sku]["found"] == "yes" and not rows[sku]["problems"] for sku in skus)
@@ -0,0 +1,191 @@
+import importlib
+import os
+import sys
+import threading
+import time
+
+# Lazy imports and startup profiling.
+#
+# Sublime Text imports every top-level module of the package when the plugin
+# host starts, so anything not needed until a menu action is used (the country
+# table, backup/diff machinery, urllib.request and the SSL stack behind it,
+# subprocess, webbrowser...) is imported through lazy_import() instead.
+
+LAZY_MODULES = {}
+
+LAZY_LOCK = threading.RLock()
+
+# Time taken to import each lazy module the first time it was used
+LAZY_IMPORT_TIMES = {}
+
+class LazyModule():
+	def __init__(self, name):
+		self.__dict__["_name"]   = name
+		self.__dict__["_module"] = None
+
+	def _load(self):
+		module = self.__dict__["_module"]
+
+		if module == None:
+			with LAZY_LOCK:
+				module = self.__dict__["_module"]
+
+				if module == None:
+					start  = time.perf_counter()
+					module = importlib.import_module(self._name)
+
+					LAZY_IMPORT_TIMES[self._name] = time.perf_counter() - start
+
+					self.__dict__["_module"] = module
+
+		return module
+
+	def __getattr__(self, name):
+		return getattr(self._load(), name)
+
+	def __repr__(self):
+		state = "loaded" if self.__dict__["_module"] != None else "not loaded"
+
+		return "<lazy module {!r} ({})>".format(self._name, state)
+
+def lazy_import(name):
+	with LAZY_LOCK:
+		if name not in LAZY_MODULES:
+			LAZY_MODULES[name] = LazyModule(name)
+
+		return LAZY_MODULES[name]
+
+# Import time of each of the package's modules, recorded as they're loaded:
+# name -> (seconds including the package modules it imported, own seconds).
+# Anything imported before this module isn't covered.
+#
+# Only recorded when the MAGENTO2STUFF_TIME_IMPORTS environment variable is set
+# (e.g. when starting Sublime Text from a terminal), as the import hook sits in
+# front of every import in the plugin host, other plugins' included.
+MODULE_LOAD_TIMES = {}
+
+TIME_IMPORTS_VARIABLE = "MAGENTO2STUFF_TIME_IMPORTS"
+
+class ModuleLoadTimer():
+	def __init__(self, prefix):
+		self.prefix = prefix
+		self.local  = threading.local()
+
+	# Finds the module with the other finders and wraps its loader
+	def find_spec(self, fullname, path, target = None):
+		if not fullname.startswith(self.prefix):
+			return None
+
+		for finder in sys.meta_path:
+			if finder is self or not hasattr(finder, "find_spec"):
+				continue
+
+			spec = finder.find_spec(fullname, path, target)
+
+			if spec != None:
+				break
+		else:
+			return None
+
+		if spec.loader == None or not hasattr(spec.loader, "exec_module"):
+			return spec
+
+		spec.loader = TimedLoader(spec.loader, self)
+
+		return spec
+
+	# Time spent loading the children of each module being loaded, innermost last
+	def get_stack(self):
+		if not hasattr(self.local, "stack"):
+			self.local.stack = []
+
+		return self.local.stack
+
+class TimedLoader():
+	def __init__(self, loader, timer):
+		self.loader = loader
+		self.timer  = timer
+
+	def create_module(self, spec):
+		return self.loader.create_module(spec)
+
+	def exec_module(self, module):
+		# The real loader is put back for anything which looks at it later (e.g.
+		# Sublime Text reloading plugins)
+		module.__loader__ = self.loader
+		module.__spec__.loader = self.loader
+
+		stack = self.timer.get_stack()
+		stack.append(0)
+		start = time.perf_counter()
+
+		try:
+			self.loader.exec_module(module)
+
+		finally:
+			duration = time.perf_counter() - start
+			children = stack.pop()
+
+			if stack:
+				stack[-1] += duration
+
+			MODULE_LOAD_TIMES[module.__name__] = (duration, duration - children)
+
+	def __getattr__(self, name):
+		return getattr(self.loader, name)
+
+def time_module_loads(prefix):
+	# A reloaded copy of this module replaces the old timer
+	sys.meta_path[:] = [finder for finder in sys.meta_path if type(finder).__name__ != "ModuleLoadTimer"]
+	sys.meta_path.insert(0, ModuleLoadTimer(prefix))
+
+if os.environ.get(TIME_IMPORTS_VARIABLE):
+	time_module_loads(__name__.split(".")[0] + ".")
+
+def get_startup_report(package_name):
+	if not os.environ.get(TIME_IMPORTS_VARIABLE):
+		return "\n".join([
+			"Package module load times aren't recorded. Start Sublime Text with the",
+			"{} environment variable set to record them, or run".format(TIME_IMPORTS_VARIABLE),
+			"benchmarks/bench_startup.py.",
+			"",
+		] + get_lazy_report())
+
+	lines = ["Package modules (as loaded, own cost):", ""]
+	total = 0
+
+	for module_name in sorted(MODULE_LOAD_TIMES):
+		duration = MODULE_LOAD_TIMES[module_name][1]
+		total   += duration
+
+		lines.append("  {:8.2f} ms  {}".format(duration * 1000, module_name))
+
+	lines.append("  {:8.2f} ms  total".format(total * 1000))
+
+	for module_name in sorted(sys.modules):
+		if module_name.startswith(package_name + ".") and module_name not in MODULE_LOAD_TIMES:
+			lines.append("  {:>8}     {} (loaded before timing started)".format("-", module_name))
+
+	lines.append("")
+
+	return "\n".join(lines + get_lazy_report())
+
+# Lazy modules and which heavy modules are loaded, as report lines
+def get_lazy_report():
+	lines = ["Lazy modules:", ""]
+
+	with LAZY_LOCK:
+		for name in sorted(LAZY_MODULES):
+			if name in LAZY_IMPORT_TIMES:
+				lines.append("  {:8.2f} ms  {} (first use)".format(LAZY_IMPORT_TIMES[name] * 1000, name))
+			else:
+				lines.append("  {:>8}     {} (not loaded)".format("-", name))
+
+	lines.append("")
+	lines.append("Heavy standard library modules currently imported by any plugin:")
+	lines.append("")
+
+	for name in ("concurrent.futures", "http.client", "sqlite3", "ssl", "subprocess", "urllib.request", "webbrowser"):
+		lines.append("  {:<20} {}".format(name, "yes" if name in sys.modules else "no"))
+
+	return lines
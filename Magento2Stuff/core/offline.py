@@ -0,0 +1,95 @@
+import socket
+import threading
+import time
+import urllib.error
+
+from Magento2Stuff.core.environment import ENV as env
+
+# Offline mode.
+#
+# A profile is marked offline when a request fails with a network error (as
+# opposed to an HTTP error response) and back online when a request succeeds.
+# Responses kept by ResponseCache are served in place of the network while the
+# profile is offline, with a marker in the status bar.
+# Saves made while offline go through WriteQueue (see write_queue.py).
+class OfflineState():
+	# Base URL -> time of the last request that was attempted while offline
+	OFFLINE = {}
+
+	LOCK = threading.Lock()
+
+	# Called with (profile, offline) when a profile goes offline or comes back
+	LISTENERS = []
+
+	@staticmethod
+	def is_network_error(e):
+		if isinstance(e, urllib.error.HTTPError):
+			return False
+
+		return isinstance(e, (urllib.error.URLError, socket.timeout, ConnectionError))
+
+	@staticmethod
+	def is_offline(profile):
+		return profile["base_url"] in OfflineState.OFFLINE
+
+	# While offline, cached responses are served without trying the network, but
+	# a request is let through every "offline_retry_interval" seconds to find
+	# out whether the profile is reachable again
+	@staticmethod
+	def should_retry(profile):
+		interval = env.get_setting("offline_retry_interval") or 30
+
+		with OfflineState.LOCK:
+			last_attempt = OfflineState.OFFLINE.get(profile["base_url"])
+
+			if last_attempt == None:
+				return True
+
+			if time.time() - last_attempt >= interval:
+				OfflineState.OFFLINE[profile["base_url"]] = time.time()
+				return True
+
+			return False
+
+	@staticmethod
+	def mark_offline(profile, error):
+		with OfflineState.LOCK:
+			if profile["base_url"] in OfflineState.OFFLINE:
+				return
+
+			OfflineState.OFFLINE[profile["base_url"]] = time.time()
+
+		env.log("{} is unreachable, working offline: {}".format(profile["base_url"], error))
+		env.set_status("magento2stuff_offline", "M2: offline")
+
+		OfflineState.notify(profile, True)
+
+	@staticmethod
+	def mark_online(profile):
+		with OfflineState.LOCK:
+			if OfflineState.OFFLINE.pop(profile["base_url"], None) == None:
+				return
+
+		env.log("{} is reachable again".format(profile["base_url"]))
+		env.set_status("magento2stuff_offline", None)
+
+		OfflineState.notify(profile, False)
+
+	# Marks data served from the response cache, so it's clear it may be out of date
+	@staticmethod
+	def show_stale_marker(saved_at):
+		env.set_status("magento2stuff_offline", "M2: offline, showing data from {}".format(time.strftime("%Y-%m-%d %H:%M", time.localtime(saved_at))))
+
+	@staticmethod
+	def add_listener(listener):
+		if listener not in OfflineState.LISTENERS:
+			OfflineState.LISTENERS.append(listener)
+
+	@staticmethod
+	def notify(profile, offline):
+		for listener in OfflineState.LISTENERS:
+			try:
+				listener(profile, offline)
+
+			except Exception as e:
+				env.log("offline listener failed: {}".format(e))
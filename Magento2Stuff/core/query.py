@@ -0,0 +1,270 @@
+import re
+import urllib.parse
+
+from collections.abc import Mapping
+
+# Search criteria query builder.
+#
+# Magento expects search criteria as PHP-style nested query parameters, e.g.
+# search_criteria[filter_groups][0][filters][0][field]=sku. Building that string
+# for every request is wasteful when only a couple of values (page number,
+# filter value) ever change, so criteria are compiled once into pre-encoded
+# fragments with Param placeholders, and only the placeholders are encoded per
+# request.
+
+FIELD_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+CONDITION_TYPES = (
+	"eq",
+	"finset",
+	"from",
+	"gt",
+	"gteq",
+	"in",
+	"like",
+	"lt",
+	"lteq",
+	"moreq",
+	"neq",
+	"nfinset",
+	"nin",
+	"notnull",
+	"null",
+	"to",
+)
+
+SORT_DIRECTIONS = ("ASC", "DESC")
+
+def validate_field_name(field):
+	if not isinstance(field, str) or not FIELD_NAME_PATTERN.match(field):
+		raise ValueError("invalid field name: {!r}".format(field))
+
+	return field
+
+# Escapes the wildcards in a value for a "like" filter (Magento passes it
+# straight to SQL LIKE), so "50%" or "t_shirt" match literally
+def escape_like(value):
+	return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# Placeholder for a value supplied when the query is bound
+class Param():
+	__slots__ = ("name", "default")
+
+	def __init__(self, name, default = None):
+		self.name    = name
+		self.default = default
+
+	def __repr__(self):
+		return "Param({!r})".format(self.name)
+
+# Iterative equivalent of MagentoAPI.flatten, yielding (key, value) pairs without
+# building intermediate dicts
+def flatten_pairs(value, parent_key):
+	stack = [(parent_key, value)]
+
+	while stack:
+		key, value = stack.pop()
+
+		if isinstance(value, Mapping):
+			children = [(key + "[" + str(k) + "]", v) for k, v in value.items()]
+
+		elif isinstance(value, (list, tuple)):
+			children = [(key + "[" + str(k) + "]", v) for k, v in enumerate(value)]
+
+		else:
+			yield (key, value)
+			continue
+
+		stack.extend(reversed(children))
+
+# Field projection, e.g. {"items": ["id", "sku"]} -> "items[id,sku]"
+def encode_fields(fields, validate = False):
+	if isinstance(fields, (str, Mapping)):
+		fields = [fields]
+
+	items = []
+
+	for field in fields:
+		if isinstance(field, Mapping):
+			for key in field:
+				if validate:
+					validate_field_name(key)
+
+				items.append(key + "[" + encode_fields(field[key], validate) + "]")
+
+		else:
+			if validate:
+				validate_field_name(field)
+
+			items.append(field)
+
+	return ",".join(items)
+
+class SearchCriteria():
+	def __init__(self):
+		self.filter_groups = []
+		self.sort_orders   = []
+		self.page_size     = None
+		self.current_page  = None
+		self.projection    = None
+
+	# Filters within a group are OR'd together, groups are AND'd. A new group
+	# is started unless `group` gives the index of an existing one.
+	def filter(self, field, value, condition_type = "eq", group = None):
+		validate_field_name(field)
+
+		if condition_type not in CONDITION_TYPES:
+			raise ValueError("invalid condition type: {!r}".format(condition_type))
+
+		new_filter = {
+			"field": field,
+			"value": value,
+			"condition_type": condition_type,
+		}
+
+		if group == None:
+			self.filter_groups.append({"filters": [new_filter]})
+
+		else:
+			self.filter_groups[group]["filters"].append(new_filter)
+
+		return self
+
+	def sort(self, field, direction = "ASC"):
+		validate_field_name(field)
+
+		if direction not in SORT_DIRECTIONS:
+			raise ValueError("invalid sort direction: {!r}".format(direction))
+
+		self.sort_orders.append({
+			"field": field,
+			"direction": direction,
+		})
+
+		return self
+
+	def page(self, page_size, current_page = None):
+		self.page_size    = page_size
+		self.current_page = current_page
+
+		return self
+
+	def fields(self, projection):
+		encode_fields(projection, validate = True)
+
+		self.projection = projection
+
+		return self
+
+	def to_dict(self):
+		search_criteria = {}
+
+		if self.filter_groups:
+			search_criteria["filter_groups"] = self.filter_groups
+
+		if self.sort_orders:
+			search_criteria["sort_orders"] = self.sort_orders
+
+		if self.page_size != None:
+			search_criteria["page_size"] = self.page_size
+
+		if self.current_page != None:
+			search_criteria["current_page"] = self.current_page
+
+		return search_criteria
+
+	def compile(self):
+		return CompiledQuery(self.to_dict(), self.projection)
+
+class CompiledQuery():
+	# Encoded values are memoised per parameter, up to this many each
+	MEMO_SIZE = 256
+
+	def __init__(self, search_criteria = None, fields = None):
+		# List of pre-encoded strings and (Param, encoded key) tuples
+		self.parts  = []
+		self.params = {}
+		self.memo   = {}
+
+		pairs = []
+
+		if search_criteria != None:
+			if search_criteria == 0:
+				pairs.append(("search_criteria", 0))
+			else:
+				pairs.extend(flatten_pairs(search_criteria, "search_criteria"))
+
+		if fields:
+			pairs.append(("fields", encode_fields(fields, validate = True)))
+
+		static = []
+
+		for key, value in pairs:
+			if isinstance(value, Param):
+				if static:
+					self.parts.append(urllib.parse.urlencode(static))
+					static = []
+
+				self.parts.append((value, urllib.parse.quote_plus(key) + "="))
+				self.params[value.name] = value
+				self.memo[value.name]   = {}
+
+			else:
+				static.append((key, value))
+
+		if static:
+			self.parts.append(urllib.parse.urlencode(static))
+
+	def encode(self, **values):
+		for name in values:
+			if name not in self.params:
+				raise ValueError("unknown query parameter: {!r}".format(name))
+
+		encoded = []
+
+		for part in self.parts:
+			if isinstance(part, str):
+				encoded.append(part)
+				continue
+
+			param, key = part
+			value      = values.get(param.name, param.default)
+
+			if value == None:
+				raise ValueError("missing query parameter: {!r}".format(param.name))
+
+			memo     = self.memo[param.name]
+			memo_key = (type(value), value)
+
+			try:
+				encoded_value = memo.get(memo_key)
+
+			# Unhashable values are simply not memoised
+			except TypeError:
+				encoded_value = None
+				memo          = None
+
+			if encoded_value == None:
+				encoded_value = urllib.parse.quote_plus(str(value))
+
+				if memo != None and len(memo) < CompiledQuery.MEMO_SIZE:
+					memo[memo_key] = encoded_value
+
+			encoded.append(key + encoded_value)
+
+		return "&".join(encoded)
+
+	def bind(self, **values):
+		return BoundQuery(self, values)
+
+# A compiled query plus its values, accepted by MagentoAPI.request in place of
+# search_criteria/fields
+class BoundQuery():
+	__slots__ = ("query", "values")
+
+	def __init__(self, query, values):
+		self.query  = query
+		self.values = values
+
+	def encode(self):
+		return self.query.encode(**self.values)
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+from Magento2Stuff.core.environment import ENV as env
+
+# On-disk cache of GET responses, per profile, which survives plugin reloads
+# and restarts.
+#
+# Entries are keyed by the request URL without the cache breaker and stored as
+# zlib-compressed compact JSON, one file per entry. The ETag/Last-Modified
+# validators are kept so requests can be made conditional, and callers that
+# can tolerate stale data get the cached entry straight away while it's
+# refreshed in the background (see MagentoAPI.request). The same entries are
+# served while a profile is offline.
+#
+# File names start with a hash of the URL without its query string, so all the
+# entries for an endpoint can be dropped when a write makes them stale. Orders
+# (customer names, addresses etc.) are only cached with "response_cache_orders".
+class ResponseCache():
+	FOLDER_NAME = "responses"
+
+	EXTENSION = ".z"
+
+	# List endpoints showing each resource type, which a write to one makes stale
+	LIST_ENDPOINTS = {
+		"cmsPage": "cmsPage/search",
+		"cmsBlock": "cmsBlock/search",
+		"categories": "categories/list",
+		"products": "products",
+	}
+
+	CACHES = {}
+
+	CACHES_LOCK = threading.Lock()
+
+	# Size limit is enforced after this many writes
+	PRUNE_EVERY = 50
+
+	def __init__(self, folder):
+		self.folder       = folder
+		self.writes       = 0
+		self.revalidating = set()
+		self.lock         = threading.Lock()
+
+		if not os.path.exists(folder):
+			os.makedirs(folder)
+
+	@staticmethod
+	def for_profile(profile):
+		key = profile["base_url"]
+
+		with ResponseCache.CACHES_LOCK:
+			if key not in ResponseCache.CACHES:
+				ResponseCache.CACHES[key] = ResponseCache(env.get_profile_cache_path(profile, ResponseCache.FOLDER_NAME))
+
+			return ResponseCache.CACHES[key]
+
+	@staticmethod
+	def is_enabled():
+		return bool(env.get_setting("response_cache") or env.get_setting("offline_cache"))
+
+	@staticmethod
+	def is_cacheable(endpoint):
+		return endpoint.split("/")[0].split("?")[0] != "orders" or bool(env.get_setting("response_cache_orders"))
+
+	def get_path(self, key):
+		return os.path.join(self.folder, self.get_prefix(key.split("?")[0]) + hashlib.md5(key.encode()).hexdigest() + ResponseCache.EXTENSION)
+
+	def get_prefix(self, url):
+		return hashlib.md5(url.encode()).hexdigest()[:12] + "-"
+
+	def put(self, key, data, etag = None, last_modified = None):
+		entry = {
+			"key": key,
+			"saved_at": time.time(),
+			"etag": etag,
+			"last_modified": last_modified,
+			"data": data,
+		}
+
+		self.write(self.get_path(key), entry)
+
+		with self.lock:
+			self.writes += 1
+			prune = self.writes % ResponseCache.PRUNE_EVERY == 0
+
+		if prune:
+			self.prune()
+
+	def write(self, file_path, entry):
+		temp_path = "{}.{}.tmp".format(file_path, threading.get_ident())
+
+		try:
+			with open(temp_path, "wb") as f:
+				f.write(zlib.compress(json.dumps(entry, separators = (",", ":")).encode()))
+
+			os.replace(temp_path, file_path)
+
+		except OSError as e:
+			env.log("unable to write to response cache: {}".format(e))
+
+	# Returns the entry (a dict with "data", "saved_at", "etag" and
+	# "last_modified"), or None
+	def get(self, key):
+		entry = self.read(self.get_path(key))
+
+		if entry == None or entry.get("key") != key:
+			return None
+
+		return entry
+
+	def read(self, file_path):
+		try:
+			with open(file_path, "rb") as f:
+				return json.loads(zlib.decompress(f.read()).decode())
+
+		except (OSError, ValueError, zlib.error):
+			return None
+
+	# A 304 Not Modified response confirms the entry is still current
+	def touch(self, key):
+		entry = self.get(key)
+
+		if entry != None:
+			entry["saved_at"] = time.time()
+			self.write(self.get_path(key), entry)
+
+	# Only one background refresh per entry at a time. Returns False if one is
+	# already running.
+	def start_revalidating(self, key):
+		with self.lock:
+			if key in self.revalidating:
+				return False
+
+			self.revalidating.add(key)
+
+			return True
+
+	def done_revalidating(self, key):
+		with self.lock:
+			self.revalidating.discard(key)
+
+	def get_file_paths(self):
+		try:
+			return [os.path.join(self.folder, name) for name in os.listdir(self.folder) if name.endswith(ResponseCache.EXTENSION)]
+
+		except OSError:
+			return []
+
+	# Returns a list of (key, saved_at, size, file_path), newest first
+	def list_entries(self):
+		entries = []
+
+		for file_path in self.get_file_paths():
+			entry = self.read(file_path)
+
+			if entry == None:
+				continue
+
+			entries.append((entry["key"], entry["saved_at"], os.path.getsize(file_path), file_path))
+
+		entries.sort(key = lambda entry: entry[1], reverse = True)
+
+		return entries
+
+	def stats(self):
+		file_paths = self.get_file_paths()
+		size       = 0
+
+		for file_path in file_paths:
+			try:
+				size += os.path.getsize(file_path)
+
+			except OSError:
+				pass
+
+		return {"entries": len(file_paths), "size": size}
+
+	# Delete the entries for a URL (without query string), whatever the query.
+	# Returns the number deleted.
+	def invalidate(self, url):
+		prefix  = self.get_prefix(url)
+		deleted = 0
+
+		for file_path in self.get_file_paths():
+			if not os.path.basename(file_path).startswith(prefix):
+				continue
+
+			try:
+				os.remove(file_path)
+				deleted += 1
+
+			except OSError:
+				pass
+
+		return deleted
+
+	# After a successful write to `endpoint`, drop the cached copies of it and
+	# the lists of its resource type, so they aren't served stale
+	def invalidate_resource(self, api_url, endpoint):
+		resource_type = endpoint.split("/")[0]
+
+		self.invalidate(api_url + endpoint)
+
+		if resource_type in ResponseCache.LIST_ENDPOINTS:
+			self.invalidate(api_url + ResponseCache.LIST_ENDPOINTS[resource_type])
+
+	# Delete all entries, or those saved more than `max_age` seconds ago.
+	# Returns the number deleted.
+	def purge(self, max_age = None):
+		now     = time.time()
+		deleted = 0
+
+		for file_path in self.get_file_paths():
+			try:
+				if max_age != None and now - os.path.getmtime(file_path) <= max_age:
+					continue
+
+				os.remove(file_path)
+				deleted += 1
+
+			except OSError:
+				pass
+
+		return deleted
+
+	# Delete the least recently written entries until under "response_cache_max_size_mb"
+	def prune(self):
+		max_size = (env.get_setting("response_cache_max_size_mb") or 50) * 1024 * 1024
+		files    = []
+		total    = 0
+
+		for file_path in self.get_file_paths():
+			try:
+				stat = os.stat(file_path)
+
+			except OSError:
+				continue
+
+			files.append((stat.st_mtime, stat.st_size, file_path))
+			total += stat.st_size
+
+		files.sort()
+
+		for mtime, size, file_path in files:
+			if total <= max_size:
+				break
+
+			try:
+				os.remove(file_path)
+				total -= size
+
+			except OSError:
+				pass
@@ -0,0 +1,158 @@
+from Magento2Stuff.core.urls import M2_URLS
+
+# Compact row types for list menu data.
+#
+# Only the fields needed to render a menu and act on a selection are kept;
+# URLs are derived on access rather than stored per item, and the full payload
+# is fetched again if "Debug info" is chosen.
+
+# Custom attributes come back as a list, or as an object keyed by index when a
+# "fields" projection is used
+def get_custom_attribute(item, attribute_code):
+	attributes = item.get("custom_attributes") or []
+
+	if isinstance(attributes, dict):
+		attributes = attributes.values()
+
+	for attr in attributes:
+		if attr["attribute_code"] == attribute_code:
+			return attr["value"]
+
+	return None
+
+class CmsPageRow():
+	__slots__ = ("id", "title", "identifier", "active", "update_time")
+
+	RESOURCE_TYPE = "cmsPage"
+
+	def __init__(self, item):
+		self.id          = item["id"]
+		self.title       = item["title"]
+		self.identifier  = item["identifier"]
+		self.active      = item["active"]
+		self.update_time = item["update_time"]
+
+	# Endpoint for the full resource, used by "Debug info" etc.
+	@property
+	def detail_endpoint(self):
+		return "{}/{}".format(self.RESOURCE_TYPE, self.id)
+
+	@property
+	def admin_url(self):
+		return M2_URLS.ADMIN_URL_CMS_PAGE.format(self.id)
+
+	@property
+	def site_url(self):
+		return M2_URLS.BASE_URL + self.identifier
+
+class CmsBlockRow(CmsPageRow):
+	__slots__ = ()
+
+	RESOURCE_TYPE = "cmsBlock"
+
+	@property
+	def admin_url(self):
+		return M2_URLS.ADMIN_URL_CMS_BLOCK.format(self.id)
+
+	# CMS blocks don't have a front-end URL
+	@property
+	def site_url(self):
+		return None
+
+class CategoryRow():
+	__slots__ = ("id", "name", "is_active", "updated_at", "url_path")
+
+	def __init__(self, item):
+		self.id         = item["id"]
+		self.name       = item["name"]
+		self.is_active  = item.get("is_active") # Root catalog does not return this field...
+		self.updated_at = item["updated_at"]
+		self.url_path   = get_custom_attribute(item, "url_path")
+
+	@property
+	def detail_endpoint(self):
+		return "categories/{}".format(self.id)
+
+	@property
+	def admin_url(self):
+		return M2_URLS.ADMIN_URL_CATEGORY.format(self.id)
+
+	@property
+	def site_url(self):
+		if self.url_path != None:
+			return M2_URLS.BASE_URL + self.url_path
+
+		return M2_URLS.CATEGORY_ID_URL.format(self.id)
+
+class ProductRow():
+	__slots__ = ("id", "name", "sku", "status", "type_id", "created_at", "updated_at", "url_key")
+
+	def __init__(self, item):
+		self.id         = item["id"]
+		self.name       = item["name"]
+		self.sku        = item["sku"]
+		self.status     = item["status"]
+		self.type_id    = item["type_id"]
+		self.created_at = item["created_at"]
+		self.updated_at = item["updated_at"]
+		self.url_key    = get_custom_attribute(item, "url_key")
+
+	@property
+	def detail_endpoint(self):
+		return "products/{}".format(self.sku)
+
+	@property
+	def admin_url(self):
+		return M2_URLS.ADMIN_URL_PRODUCT.format(self.id)
+
+	@property
+	def site_url(self):
+		if self.url_key != None:
+			return M2_URLS.BASE_URL + self.url_key
+
+		return None
+
+class OrderRow():
+	__slots__ = (
+		"entity_id",
+		"increment_id",
+		"created_at",
+		"grand_total",
+		"status",
+		"customer_is_guest",
+		"firstname",
+		"lastname",
+		"city",
+		"postcode",
+		"country_id",
+		"payment_method",
+	)
+
+	def __init__(self, item):
+		billing_address = item["billing_address"]
+
+		self.entity_id         = item["entity_id"]
+		self.increment_id      = item["increment_id"]
+		self.created_at        = item["created_at"]
+		self.grand_total       = item["grand_total"]
+		self.status            = item["status"]
+		self.customer_is_guest = item["customer_is_guest"]
+		self.firstname         = billing_address["firstname"]
+		self.lastname          = billing_address["lastname"]
+		self.city              = billing_address["city"]
+		self.postcode          = billing_address["postcode"]
+		self.country_id        = billing_address["country_id"]
+		self.payment_method    = None
+
+		for info in item["extension_attributes"]["payment_additional_info"]:
+			if info["key"] == "method_title":
+				self.payment_method = info["value"]
+				break
+
+	@property
+	def detail_endpoint(self):
+		return "orders/{}".format(self.entity_id)
+
+	@property
+	def admin_url(self):
+		return M2_URLS.ADMIN_URL_ORDER.format(self.entity_id)
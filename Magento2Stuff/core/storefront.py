@@ -0,0 +1,163 @@
+import time
+import urllib.error
+import urllib.parse
+
+from Magento2Stuff.core.lazy import lazy_import
+
+http_client    = lazy_import("http.client")
+socket         = lazy_import("socket")
+ssl            = lazy_import("ssl")
+urllib_request = lazy_import("urllib.request")
+
+# Timed requests to storefront pages (not the API), for cache warming and
+# performance probes.
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; Magento2Stuff)"
+
+# Response headers which say whether the page came from a cache: Magento's own
+# (developer mode only), Varnish/Fastly and Cloudflare
+CACHE_HEADERS = (
+	"X-Magento-Cache-Debug",
+	"X-Cache",
+	"X-Cache-Hits",
+	"CF-Cache-Status",
+	"Age",
+)
+
+# Returns a dict with the status code, ttfb (seconds until the headers had been
+# received), total time, size and cache headers. HTTP errors are results too.
+def fetch_timed(url, user_agent = None, timeout = 30):
+	req = urllib_request.Request(url, headers = {"User-Agent": user_agent or DEFAULT_USER_AGENT})
+
+	start = time.perf_counter()
+
+	try:
+		http_response = urllib_request.urlopen(req, timeout = timeout)
+
+	except urllib.error.HTTPError as e:
+		http_response = e
+
+	ttfb = time.perf_counter() - start
+
+	with http_response:
+		size = len(http_response.read())
+
+	headers = http_response.headers
+
+	return {
+		"url": url,
+		"user_agent": user_agent,
+		"status": http_response.getcode(),
+		"ttfb": ttfb,
+		"total": time.perf_counter() - start,
+		"bytes": size,
+		"headers": {name: headers[name] for name in CACHE_HEADERS if headers.get(name) != None},
+		"cache": get_cache_status(headers),
+	}
+
+# Like fetch_timed, but with each phase of the request timed separately: dns,
+# connect and tls are the durations of those phases, ttfb and total are from
+# the start (as curl reports them). Redirects aren't followed. The response is
+# requested gzipped, as a browser would, so bytes is the size transferred.
+def probe(url, method = "GET", user_agent = None, timeout = 30):
+	parts = urllib.parse.urlsplit(url)
+	https = parts.scheme == "https"
+	port  = parts.port or (443 if https else 80)
+	path  = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+
+	# Set up before the clock starts, so module imports and loading certificates
+	# aren't counted
+	if https:
+		context    = ssl.create_default_context()
+		connection = http_client.HTTPSConnection(parts.hostname, port, timeout = timeout)
+	else:
+		connection = http_client.HTTPConnection(parts.hostname, port, timeout = timeout)
+
+	start = time.perf_counter()
+
+	address = socket.getaddrinfo(parts.hostname, port, 0, socket.SOCK_STREAM)[0][4]
+
+	resolved = time.perf_counter()
+
+	sock = socket.create_connection(address[:2], timeout)
+
+	connected = time.perf_counter()
+
+	if https:
+		sock = context.wrap_socket(sock, server_hostname = parts.hostname)
+
+	secured = time.perf_counter()
+
+	# Already connected, so the connection just uses the socket
+	connection.sock = sock
+
+	try:
+		connection.request(method, path, headers = {"User-Agent": user_agent or DEFAULT_USER_AGENT, "Accept-Encoding": "gzip"})
+
+		http_response = connection.getresponse()
+
+		first_byte = time.perf_counter()
+
+		body = http_response.read()
+
+		end = time.perf_counter()
+
+	finally:
+		connection.close()
+
+	headers = http_response.headers
+
+	return {
+		"url": url,
+		"method": method,
+		"status": http_response.status,
+		"time": time.time(),
+		"dns": resolved - start,
+		"connect": connected - resolved,
+		"tls": secured - connected,
+		"ttfb": first_byte - start,
+		"total": end - start,
+		"bytes": len(body) if method != "HEAD" else int(headers.get("Content-Length") or 0),
+		"cache": get_cache_status(headers),
+	}
+
+# Content-Length from a HEAD request, or None if the server doesn't say (or
+# the file is missing)
+def head_size(url, timeout = 30):
+	req = urllib_request.Request(url, method = "HEAD", headers = {"User-Agent": DEFAULT_USER_AGENT})
+
+	try:
+		with urllib_request.urlopen(req, timeout = timeout) as http_response:
+			length = http_response.headers.get("Content-Length")
+
+	except urllib.error.HTTPError:
+		return None
+
+	return int(length) if length and length.isdigit() else None
+
+# "HIT", "MISS" or None if the headers don't say
+def get_cache_status(headers):
+	for name in ("X-Magento-Cache-Debug", "X-Cache", "CF-Cache-Status"):
+		value = (headers.get(name) or "").upper()
+
+		if "HIT" in value:
+			return "HIT"
+
+		if "MISS" in value or value in ("EXPIRED", "BYPASS", "DYNAMIC"):
+			return "MISS"
+
+	age = headers.get("Age")
+
+	if age != None and age.isdigit():
+		return "HIT" if int(age) > 0 else "MISS"
+
+	return None
+
+# The same path on each store view's base URL
+def get_store_urls(url, base_url, store_urls):
+	if not store_urls or not url.startswith(base_url):
+		return [url]
+
+	path = url[len(base_url):]
+
+	return [store_url.rstrip("/") + "/" + path for store_url in store_urls]
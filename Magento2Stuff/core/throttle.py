@@ -0,0 +1,135 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Lower numbers are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND  = 1
+
+# Raised by RequestGovernor.acquire when the request is given up on while
+# waiting for its turn
+class RequestCancelled(Exception):
+	pass
+
+# Token-bucket rate limiter combined with a concurrency limit.
+#
+# Waiting requests are queued by (priority, arrival order), so interactive
+# requests (menus, hovers) jump ahead of background work (prefetch, sync, bulk)
+# while requests of the same priority are served first come, first served.
+class RequestGovernor():
+	DEFAULTS = {
+		"requests_per_second": 5,
+		"burst": 10,
+		"max_concurrency": 4,
+	}
+
+	GOVERNORS = {}
+
+	GOVERNORS_LOCK = threading.Lock()
+
+	def __init__(self, requests_per_second, burst, max_concurrency):
+		self.rate            = max(float(requests_per_second), 0.001)
+		self.burst           = max(float(burst), 1.0)
+		self.max_concurrency = max(int(max_concurrency), 1)
+
+		self.tokens      = self.burst
+		self.last_refill = time.monotonic()
+		self.active      = 0
+		self.waiting     = []
+		self.counter     = itertools.count()
+		self.condition   = threading.Condition()
+
+	# Settings are read from the profile's "rate_limit" object, falling back to
+	# `default_config` and then DEFAULTS. A new governor replaces the old one if
+	# the settings change.
+	@staticmethod
+	def for_profile(profile, default_config = None):
+		config = dict(RequestGovernor.DEFAULTS)
+		config.update(default_config or {})
+		config.update(profile.get("rate_limit") or {})
+
+		key = profile["base_url"]
+
+		with RequestGovernor.GOVERNORS_LOCK:
+			entry = RequestGovernor.GOVERNORS.get(key)
+
+			if entry == None or entry[0] != config:
+				entry = (config, RequestGovernor(**config))
+				RequestGovernor.GOVERNORS[key] = entry
+
+		return entry[1]
+
+	@staticmethod
+	def all_stats():
+		with RequestGovernor.GOVERNORS_LOCK:
+			governors = list(RequestGovernor.GOVERNORS.items())
+
+		return {key: entry[1].stats() for key, entry in governors}
+
+	# `cancel` is an optional threading.Event; once it's set (followed by wake()),
+	# the request leaves the queue without taking a slot
+	def acquire(self, priority = PRIORITY_INTERACTIVE, cancel = None):
+		ticket = (priority, next(self.counter))
+
+		with self.condition:
+			heapq.heappush(self.waiting, ticket)
+
+			try:
+				while True:
+					if cancel != None and cancel.is_set():
+						raise RequestCancelled()
+
+					self.refill()
+
+					timeout = None
+
+					if self.waiting[0] == ticket and self.active < self.max_concurrency:
+						if self.tokens >= 1:
+							break
+
+						# Sleep until the next token is due
+						timeout = (1 - self.tokens) / self.rate
+
+					self.condition.wait(timeout)
+
+			except BaseException:
+				self.waiting.remove(ticket)
+				heapq.heapify(self.waiting)
+				self.condition.notify_all()
+				raise
+
+			heapq.heappop(self.waiting)
+
+			self.tokens -= 1
+			self.active += 1
+
+			# The next ticket in line may be able to go as well
+			self.condition.notify_all()
+
+	def release(self):
+		with self.condition:
+			self.active -= 1
+			self.condition.notify_all()
+
+	# Lets waiting requests check whether they've been cancelled
+	def wake(self):
+		with self.condition:
+			self.condition.notify_all()
+
+	def refill(self):
+		now = time.monotonic()
+
+		self.tokens      = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+		self.last_refill = now
+
+	def stats(self):
+		with self.condition:
+			interactive = sum(1 for ticket in self.waiting if ticket[0] <= PRIORITY_INTERACTIVE)
+
+			return {
+				"active": self.active,
+				"queued": len(self.waiting),
+				"queued_interactive": interactive,
+				"queued_background": len(self.waiting) - interactive,
+			}
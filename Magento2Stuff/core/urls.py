@@ -1,14 +1,30 @@
-from Magento2Stuff.utils import Magento2Utils as utils
+from Magento2Stuff.core.environment import ENV as env
 
 class Magento2StuffSettings():
+	# URLs are for the current profile unless a specific profile is given
+	def __init__(self, profile = None):
+		self.profile = profile
+
 	@property
 	def BASE_URL(self):
-		return utils.get_current_profile()["base_url"]
+		profile = self.profile if self.profile != None else env.get_current_profile()
+
+		return profile["base_url"]
 
 	@property
 	def API_URL(self):
 		return self.BASE_URL + "index.php/rest/all/V1/"
 
+	# Magento's asynchronous bulk endpoints - https://developer.adobe.com/commerce/webapi/rest/use-rest/bulk-endpoints/
+	@property
+	def ASYNC_BULK_API_URL(self):
+		return self.BASE_URL + "index.php/rest/all/async/bulk/V1/"
+
+	# Storefront GraphQL - https://developer.adobe.com/commerce/webapi/graphql/
+	@property
+	def GRAPHQL_URL(self):
+		return self.BASE_URL + "graphql"
+
 	@property
 	def CATEGORY_ID_URL(self):
 		return self.BASE_URL + "catalog/category/view/id/{}/"
@@ -35,4 +51,7 @@ class Magento2StuffSettings():
 
 	@property
 	def ADMIN_URL_ORDER(self):
-		return self.BASE_URL + "sales/order/view/order_id/{}/"
\ No newline at end of file
+		return self.BASE_URL + "sales/order/view/order_id/{}/"
+
+# Shared instance for the current profile
+M2_URLS = Magento2StuffSettings()
\ No newline at end of file
@@ -0,0 +1,205 @@
+import html
+import re
+
+from Magento2Stuff.core.api import MagentoAPI as api
+from Magento2Stuff.core.graphql import GraphQLAPI
+from Magento2Stuff.core.query import Param, SearchCriteria
+from Magento2Stuff.core.rows import CategoryRow, OrderRow
+from Magento2Stuff.core.throttle import PRIORITY_INTERACTIVE
+from Magento2Stuff.hover import HOVER, HoverResolver
+from Magento2Stuff.prefetch import DETAIL_CACHE
+from Magento2Stuff.utils import Magento2Utils as utils
+
+# Hover resolvers for order numbers and category IDs. Both fetch a batch of
+# keys with one "in" search, projected to the fields the popup shows.
+
+class OrderHover(HoverResolver):
+	NAME = "order"
+
+	SETTING = "order_hover"
+
+	ORDER_QUERY = SearchCriteria().filter("increment_id", Param("increment_ids"), "in").page(HoverResolver.MAX_BATCH).fields({
+		"items": [
+			"entity_id",
+			"increment_id",
+			"created_at",
+			"grand_total",
+			"status",
+			"customer_is_guest",
+			{
+				"billing_address": [
+					"firstname",
+					"lastname",
+					"city",
+					"postcode",
+					"country_id",
+				],
+				"extension_attributes": [
+					"payment_additional_info",
+				],
+			},
+		]
+	}).compile()
+
+	# Order numbers vary between stores, so the pattern is a setting
+	def get_key(self, view, point):
+		word = view.substr(view.word(point))
+
+		return word if re.search(utils.get_setting("order_hover_pattern") or r"^[0-9]{9}$", word) else None
+
+	def fetch(self, increment_ids, profile, timeout, priority = PRIORITY_INTERACTIVE):
+		response = api.request("GET", "orders", search_criteria = OrderHover.ORDER_QUERY.bind(increment_ids = ",".join(increment_ids)), priority = priority, profile = profile, timeout = timeout)
+
+		return {item["increment_id"]: item for item in response["items"] or []}
+
+	def render(self, increment_id, item):
+		if item == None:
+			return "<h3>{}</h3><div>No order with this number.</div>".format(html.escape(increment_id))
+
+		order = OrderRow(item)
+
+		return """
+			<h3>Order {increment_id}</h3>
+			<a class="debug" href="debug:{entity_id}"><em>debug</em></a>
+			<div>
+				Status: {status}
+			</div>
+			<div>
+				Placed: {created_at}
+			</div>
+			<div>
+				Total: £{grand_total:,.2f}
+			</div>
+			<div>
+				Customer: {firstname} {lastname}{guest}, {city} {postcode} {country_id}
+			</div>
+			<div>
+				Payment: {payment_method}
+			</div>
+			<div>
+				Magento URL: <a href="open:{admin_url}">open</a> | <a href="copy:{admin_url}">copy</a>
+			</div>
+		""".format(
+			increment_id   = html.escape(order.increment_id),
+			entity_id      = order.entity_id,
+			status         = html.escape(order.status or ""),
+			created_at     = order.created_at,
+			grand_total    = float(order.grand_total or 0),
+			firstname      = html.escape(order.firstname or ""),
+			lastname       = html.escape(order.lastname or ""),
+			guest          = " (guest)" if order.customer_is_guest else "",
+			city           = html.escape(order.city or ""),
+			postcode       = html.escape(order.postcode or ""),
+			country_id     = order.country_id or "",
+			payment_method = html.escape(order.payment_method or "n/a"),
+			admin_url      = order.admin_url,
+		)
+
+	# Popups only have the projected fields, so the full order is fetched
+	def handle_link(self, view, command, value, item):
+		if command == "debug":
+			utils.dump_as_json(DETAIL_CACHE.get("orders/{}".format(value)), "order_{}".format(value))
+
+		else:
+			HoverResolver.handle_link(self, view, command, value, item)
+
+# Category IDs in CMS content, e.g. id_path="category/12" (category link
+# widgets), category_id="12" or any ID in category_ids="12,13,14"
+class CategoryHover(HoverResolver):
+	NAME = "category"
+
+	SETTING = "category_hover"
+
+	RESOURCE_TYPE = "categories"
+
+	CONTEXT_PATTERN = re.compile(r"""category/([0-9]+)|category_ids?\s*=\s*["']?([0-9]+(?:\s*,\s*[0-9]+)*)""")
+
+	ID_PATTERN = re.compile(r"[0-9]+")
+
+	CATEGORY_QUERY = SearchCriteria().filter("entity_id", Param("ids"), "in").page(HoverResolver.MAX_BATCH).fields({
+		"items": [
+			"id",
+			"name",
+			"is_active",
+			"updated_at",
+			{
+				"custom_attributes": [
+					"url_path",
+				],
+			},
+		]
+	}).compile()
+
+	def get_key(self, view, point):
+		line = view.line(point)
+
+		for match in CategoryHover.CONTEXT_PATTERN.finditer(view.substr(line)):
+			group = 1 if match.group(1) != None else 2
+
+			for id_match in CategoryHover.ID_PATTERN.finditer(match.group(group)):
+				start = line.begin() + match.start(group) + id_match.start()
+
+				if start <= point <= start + len(id_match.group()):
+					return id_match.group()
+
+		return None
+
+	# As SkuHover.fetch, inactive categories GraphQL doesn't return are
+	# searched for over REST
+	def fetch(self, ids, profile, timeout, priority = PRIORITY_INTERACTIVE):
+		categories = {}
+
+		if GraphQLAPI.is_enabled(profile):
+			categories = GraphQLAPI.get_categories_by_id(ids, profile, timeout, priority)
+
+		missing = [category_id for category_id in ids if category_id not in categories]
+
+		if missing:
+			response = api.request("GET", "categories/list", search_criteria = CategoryHover.CATEGORY_QUERY.bind(ids = ",".join(missing)), priority = priority, profile = profile, timeout = timeout)
+
+			categories.update((str(item["id"]), item) for item in response["items"] or [])
+
+		return categories
+
+	def render(self, category_id, item):
+		if item == None:
+			return "<h3>Category {}</h3><div>No category with this ID.</div>".format(html.escape(category_id))
+
+		category = CategoryRow(item)
+
+		return """
+			<h3>{name}</h3>
+			<a class="debug" href="debug:{id}"><em>debug</em></a>
+			<div>
+				ID: <a href="copy:{id}">{id}</a> | {active}
+			</div>
+			<div>
+				Updated: {updated_at}
+			</div>
+			<div>
+				Site URL: <a href="open:{site_url}">open</a> | <a href="copy:{site_url}">copy</a>
+			</div>
+			<div>
+				Magento URL: <a href="open:{admin_url}">open</a> | <a href="copy:{admin_url}">copy</a>
+			</div>
+		""".format(
+			name       = html.escape(category.name),
+			id         = category.id,
+			active     = "n/a" if category.is_active == None else "Enabled" if category.is_active else "DISABLED",
+			updated_at = category.updated_at,
+			site_url   = category.site_url,
+			admin_url  = category.admin_url,
+		)
+
+	def handle_link(self, view, command, value, item):
+		if command == "debug":
+			utils.dump_as_json(DETAIL_CACHE.get("categories/{}".format(value)), "category_{}".format(value))
+
+		else:
+			HoverResolver.handle_link(self, view, command, value, item)
+
+ORDER_RESOLVER    = OrderHover()
+CATEGORY_RESOLVER = CategoryHover()
+
+HOVER.register(ORDER_RESOLVER)
+HOVER.register(CATEGORY_RESOLVER)
@@ -0,0 +1,231 @@
+import json
+import sublime
+import threading
+import urllib.error
+import urllib.parse
+
+from Magento2Stuff.core.api import MagentoAPI as api
+from Magento2Stuff.core.lazy import lazy_import
+from Magento2Stuff.core.query import Param, SearchCriteria
+from Magento2Stuff.utils import Magento2Utils as utils
+
+concurrent_futures = lazy_import("concurrent.futures")
+
+# Looks up the same product/CMS resource on every configured profile at once.
+#
+# Each profile is queried on its own worker with its own timeout, and the quick
+# panel is redrawn as each store answers. "Compare" shows a field-level diff of
+# the payloads that were found.
+class FanOutLookup():
+	LOOKUP_TYPES = (
+		"Product by SKU",
+		"CMS page by identifier",
+		"CMS block by identifier",
+	)
+
+	IDENTIFIER_QUERY = SearchCriteria().filter("identifier", Param("identifier")).page(1).compile()
+
+	WAITING = "waiting..."
+
+	def __init__(self, lookup_type, value):
+		self.lookup_type = lookup_type
+		self.value       = value
+		self.profiles    = utils.get_setting("profiles") or []
+		self.results     = [None] * len(self.profiles) # Payload for each profile, if found
+		self.statuses    = [FanOutLookup.WAITING] * len(self.profiles)
+		self.lock        = threading.Lock()
+		self.window      = sublime.active_window()
+		self.panel_open  = False
+		self.generation  = 0 # Incremented each time the panel is redrawn
+		self.highlighted = 0
+
+	def start(self):
+		if not self.profiles:
+			return utils.log("no profiles detected")
+
+		self.show_panel()
+
+		thread = threading.Thread(target = self.run)
+		thread.start()
+
+	def run(self):
+		timeout = utils.get_setting("fanout_timeout") or 10
+
+		with concurrent_futures.ThreadPoolExecutor(max_workers = len(self.profiles)) as executor:
+			futures = {executor.submit(self.lookup, profile, timeout): i for i, profile in enumerate(self.profiles)}
+
+			for future in concurrent_futures.as_completed(futures):
+				index = futures[future]
+
+				try:
+					result = future.result()
+					status = self.summarise(result) if result != None else "not found"
+
+				except Exception as e:
+					result = None
+					status = "error: {}".format(e)
+
+				with self.lock:
+					self.results[index]  = result
+					self.statuses[index] = status
+
+				sublime.set_timeout(self.refresh_panel, 0)
+
+	def lookup(self, profile, timeout):
+		try:
+			if self.lookup_type == "Product by SKU":
+				endpoint = "products/{}".format(urllib.parse.quote(self.value, safe = ""))
+				return api.request("GET", endpoint, profile = profile, timeout = timeout)
+
+			resource_type = "cmsPage" if self.lookup_type == "CMS page by identifier" else "cmsBlock"
+			query         = FanOutLookup.IDENTIFIER_QUERY.bind(identifier = self.value)
+			response      = api.request("GET", resource_type + "/search", search_criteria = query, profile = profile, timeout = timeout)
+
+			return response["items"][0] if response["items"] else None
+
+		except urllib.error.HTTPError as e:
+			if e.code == 404:
+				return None
+
+			raise
+
+	def summarise(self, result):
+		name    = result.get("name") or result.get("title")
+		updated = result.get("updated_at") or result.get("update_time")
+
+		return "found: {} | ID: {} | Updated: {}".format(name, result.get("id"), updated)
+
+	def get_menu_items(self):
+		with self.lock:
+			found = sum(1 for result in self.results if result != None)
+
+			menu_items = [["Compare: {} of {} stores found".format(found, len(self.profiles)), "{}: {}".format(self.lookup_type, self.value)]]
+
+			for profile, status in zip(self.profiles, self.statuses):
+				menu_items.append([profile["name"], status])
+
+		return menu_items
+
+	def show_panel(self):
+		self.panel_open  = True
+		self.generation += 1
+
+		generation = self.generation
+
+		self.window.show_quick_panel(
+			self.get_menu_items(),
+			lambda index: self.on_done(index, generation),
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			self.highlighted,
+			self.on_highlight,
+		)
+
+	# Redraw the panel with the latest results, keeping the highlighted row
+	def refresh_panel(self):
+		if not self.panel_open:
+			return
+
+		self.panel_open = False
+		self.window.run_command("hide_overlay")
+		self.show_panel()
+
+	def on_highlight(self, index):
+		self.highlighted = index
+
+	def on_done(self, index, generation):
+		# Closing the panel to redraw it calls this for the previous panel
+		if generation != self.generation:
+			return
+
+		self.panel_open = False
+
+		if index == 0:
+			self.show_diff()
+
+		elif index > 0:
+			result = self.results[index - 1]
+
+			if result != None:
+				name = "lookup_{}_{}".format(self.profiles[index - 1]["name"], self.value)
+				utils.dump_as_json(result, urllib.parse.quote_plus(name))
+			else:
+				utils.log("{}: {}".format(self.profiles[index - 1]["name"], self.statuses[index - 1]))
+
+	def show_diff(self):
+		with self.lock:
+			found = [(profile["name"], flatten_payload(result)) for profile, result in zip(self.profiles, self.results) if result != None]
+
+		if len(found) < 2:
+			return utils.log("need results from at least two stores to compare")
+
+		paths = set()
+
+		for name, flat in found:
+			paths.update(flat)
+
+		lines = ["{}: {}".format(self.lookup_type, self.value), ""]
+		same  = 0
+
+		for path in sorted(paths):
+			values = [flat.get(path, MISSING) for name, flat in found]
+
+			if all(value == values[0] for value in values):
+				same += 1
+				continue
+
+			lines.append(path)
+
+			for (name, flat), value in zip(found, values):
+				lines.append("\t{}: {}".format(name, "(missing)" if value is MISSING else json.dumps(value)))
+
+			lines.append("")
+
+		lines.append("{} fields differ, {} identical".format(len(paths) - same, same))
+
+		view = self.window.new_file()
+		view.set_scratch(True)
+		view.set_name("Diff: {}".format(self.value))
+		view.run_command("append", {"characters": "\n".join(lines)})
+
+MISSING = object()
+
+# Flatten a payload to {"a.b.0": value}. Lists of custom attributes are keyed by
+# attribute code, so stores that return them in a different order still line up.
+def flatten_payload(value, prefix = "", flat = None):
+	if flat == None:
+		flat = {}
+
+	if isinstance(value, dict):
+		for key, child in value.items():
+			flatten_payload(child, prefix + "." + key if prefix else key, flat)
+
+	elif isinstance(value, list) and value and all(isinstance(child, dict) and "attribute_code" in child for child in value):
+		for child in value:
+			flatten_payload(child.get("value"), prefix + "." + child["attribute_code"], flat)
+
+	elif isinstance(value, list) and value:
+		for i, child in enumerate(value):
+			flatten_payload(child, prefix + "." + str(i), flat)
+
+	else:
+		flat[prefix] = value
+
+	return flat
+
+def show_fanout_lookup_menu():
+	window = sublime.active_window()
+
+	def on_type(index):
+		if index == -1:
+			return
+
+		lookup_type = FanOutLookup.LOOKUP_TYPES[index]
+		on_done     = lambda value: FanOutLookup(lookup_type, value.strip()).start() if value.strip() != "" else None
+
+		window.show_input_panel(lookup_type + ":", "", on_done, None, None)
+
+	window.show_quick_panel(
+		FanOutLookup.LOOKUP_TYPES,
+		on_type,
+		sublime.KEEP_OPEN_ON_FOCUS_LOST,
+	)
@@ -0,0 +1,324 @@
+import collections
+import html
+import re
+import sublime
+import sublime_plugin
+import threading
+import time
+
+from Magento2Stuff.change_feed import ChangeFeed
+from Magento2Stuff.core.lazy import lazy_import
+from Magento2Stuff.core.throttle import PRIORITY_INTERACTIVE
+from Magento2Stuff.utils import Magento2Utils as utils
+
+concurrent_futures = lazy_import("concurrent.futures")
+
+# Imports this module, so only looked up when needed
+sku_highlight = lazy_import("Magento2Stuff.sku_highlight")
+
+# Hover popups for things in the text that refer to Magento entities (SKUs,
+# order numbers, category IDs, CMS blocks...).
+#
+# Each entity type is a HoverResolver which recognises its keys, fetches items
+# for a batch of keys at once and renders an item as HTML. One listener dispatches to the registered resolvers, and all of them
+# share the scheduler below: one worker pool, one cache, and one batching
+# window, so each new entity type doesn't bring its own threads or requests.
+class HoverResolver():
+	# Used in cache keys and links
+	NAME = None
+
+	# Setting which enables the resolver
+	SETTING = None
+
+	# Matched against the word under the mouse by the default get_key
+	PATTERN = None
+
+	# Change feed resource type whose changes invalidate cached items
+	RESOURCE_TYPE = None
+
+	# Most keys fetched in one request
+	MAX_BATCH = 20
+
+	LOADING = "<em>loading...</em>"
+
+	def is_enabled(self):
+		return self.SETTING == None or utils.get_setting(self.SETTING)
+
+	# Returns the key for the entity at `point`, or None
+	def get_key(self, view, point):
+		if self.PATTERN == None:
+			return None
+
+		word = view.substr(view.word(point))
+
+		return word if re.search(self.PATTERN, word, re.IGNORECASE) else None
+
+	# Returns {key: item} for the keys found, requested at `priority` (see
+	# throttle.py). Runs on a worker thread. Resolvers which don't use the
+	# shared cache (see cms_hover.py) needn't override this.
+	def fetch(self, keys, profile, timeout, priority = PRIORITY_INTERACTIVE):
+		return {}
+
+	# Returns HTML for an item (None if not found), inside the shared popup
+	# template
+	def render(self, key, item):
+		return self.render_error(key, "not found")
+
+	# Links in the popup are "command:value"; resolvers handle their own
+	# commands and fall back to these
+	def handle_link(self, view, command, value, item):
+		if command == "copy":
+			sublime.set_clipboard(value)
+			utils.log('copied value to clipboard: "{}"'.format(value))
+
+		elif command == "open":
+			utils.open_url(value)
+
+		elif command == "debug" and item != None:
+			utils.dump_as_json(item, "{}_{}".format(self.NAME, re.sub(r"\W", "_", value)))
+
+		else:
+			utils.log('unrecognised command: "{}"'.format(command))
+
+	# Shows a popup straight away, filled in when the item arrives. Resolvers
+	# with more to show (see SkuHover) override this.
+	def show(self, view, point, key):
+		state = {"item": None}
+
+		HOVER.show_popup(view, point, self.render_loading(key), lambda href: self.on_navigate(view, href, state["item"]))
+
+		hover_id = HOVER.hover_id
+
+		def on_result(item, error):
+			state["item"] = item
+
+			HOVER.update_popup(view, hover_id, self.render_error(key, error) if error != None else self.render(key, item))
+
+		HOVER.request(self, key, on_result)
+
+	def render_loading(self, key):
+		return "<h3>{}</h3><div>{}</div>".format(html.escape(key), HoverResolver.LOADING)
+
+	def render_error(self, key, error):
+		return "<h3>{}</h3><div>Error: {}</div>".format(html.escape(key), html.escape(error))
+
+	def on_navigate(self, view, href, item):
+		command, _, value = href.partition(":")
+
+		self.handle_link(view, command, value, item)
+
+		if utils.get_setting("close_popup_after_click"):
+			view.hide_popup()
+
+class HoverScheduler():
+	# Keys requested within this long of each other are fetched together
+	BATCH_WINDOW_MS = 30
+
+	POPUP_TEMPLATE = """
+		<body id="hover-output">
+			<style>
+				body {{
+					font-family: Segoe UI, sans-serif;
+					line-height: 1.5;
+				}}
+				h3 {{
+					line-height: 1.2;
+					margin: 0 0 0.5rem 0;
+				}}
+				.debug {{
+					font-size: 0.85rem;
+				}}
+				.section {{
+					margin-top: 0.5rem;
+				}}
+			</style>
+
+			{body}
+		</body>
+	"""
+
+	def __init__(self, max_size = 500):
+		self.resolvers = []
+		self.max_size  = max_size
+		self.cache     = collections.OrderedDict() # (base_url, resolver, key) -> (time, item)
+		self.pending   = {}   # (resolver name, priority) -> {key: [callbacks]}, waiting for the batch window
+		self.in_flight = {}   # (base_url, resolver, key) -> [callbacks]
+		self.lock      = threading.Lock()
+		self.executor  = None
+		self.hover_id  = 0    # Incremented for each popup, so late results for an earlier one are dropped
+
+	# Replaces any resolver with the same name, so plugin reloads don't add
+	# duplicates. Resolvers are tried in the order registered.
+	def register(self, resolver):
+		self.resolvers = [r for r in self.resolvers if r.NAME != resolver.NAME] + [resolver]
+
+	def get_resolver(self, view, point):
+		for resolver in self.resolvers:
+			if resolver.is_enabled():
+				key = resolver.get_key(view, point)
+
+				if key != None:
+					return resolver, key
+
+		return None, None
+
+	# Runs `function` on the shared worker pool
+	def submit(self, function, *args):
+		with self.lock:
+			if self.executor == None:
+				self.executor = concurrent_futures.ThreadPoolExecutor(max_workers = utils.get_setting("hover_workers") or 3)
+
+		return self.executor.submit(function, *args)
+
+	# Calls callback(item, error) with the cached item, or once the batch it's
+	# fetched in has completed (on a worker thread). Keys are batched with
+	# others of the same priority, so background lookups (e.g. SKU
+	# highlighting) don't hold up hovers.
+	def request(self, resolver, key, callback, priority = PRIORITY_INTERACTIVE):
+		profile   = utils.get_current_profile()
+		cache_key = (profile["base_url"], resolver.NAME, key)
+
+		with self.lock:
+			entry = self.get_cached(cache_key)
+
+			if entry != None:
+				item = entry[1]
+
+			elif cache_key in self.in_flight:
+				self.in_flight[cache_key].append(callback)
+				return
+
+			else:
+				keys = self.pending.setdefault((resolver.NAME, priority), {})
+
+				if not keys:
+					sublime.set_timeout_async(lambda: self.flush(resolver, profile, priority), HoverScheduler.BATCH_WINDOW_MS)
+
+				keys.setdefault(key, []).append(callback)
+				return
+
+		callback(item, None)
+
+	# Fetches items for keys ahead of a hover (e.g. those visible in a view),
+	# so the popup can be filled in immediately
+	def prefetch(self, resolver, keys, priority = PRIORITY_INTERACTIVE):
+		for key in keys:
+			self.request(resolver, key, lambda item, error: None, priority)
+
+	def flush(self, resolver, profile, priority):
+		with self.lock:
+			keys = self.pending.pop((resolver.NAME, priority), {})
+
+			for key, callbacks in keys.items():
+				self.in_flight[(profile["base_url"], resolver.NAME, key)] = callbacks
+
+		key_list = list(keys)
+
+		for i in range(0, len(key_list), resolver.MAX_BATCH):
+			self.submit(self.run_batch, resolver, profile, key_list[i:i + resolver.MAX_BATCH], priority)
+
+	def run_batch(self, resolver, profile, keys, priority):
+		timeout = (utils.get_setting("hover_timeout_ms") or 5000) / 1000
+
+		try:
+			items = resolver.fetch(keys, profile, timeout, priority)
+			error = None
+
+		except Exception as e:
+			items = {}
+			error = str(e)
+			utils.log("{} hover: unable to fetch {}: {}".format(resolver.NAME, ", ".join(keys), e))
+
+		for key in keys:
+			cache_key = (profile["base_url"], resolver.NAME, key)
+
+			with self.lock:
+				# Misses are cached too, errors aren't
+				if error == None:
+					self.store(cache_key, items.get(key))
+
+				callbacks = self.in_flight.pop(cache_key, [])
+
+			for callback in callbacks:
+				callback(items.get(key), error)
+
+	def invalidate(self, base_url = None, resource_type = None):
+		names = [resolver.NAME for resolver in self.resolvers if resource_type in (None, resolver.RESOURCE_TYPE)]
+
+		with self.lock:
+			for cache_key in list(self.cache):
+				if base_url in (None, cache_key[0]) and cache_key[1] in names:
+					del self.cache[cache_key]
+
+	# Must be called with the lock held
+	def get_cached(self, cache_key):
+		entry = self.cache.get(cache_key)
+
+		if entry == None:
+			return None
+
+		if time.monotonic() - entry[0] > (utils.get_setting("hover_cache_ttl") or 300):
+			del self.cache[cache_key]
+			return None
+
+		self.cache.move_to_end(cache_key)
+
+		return entry
+
+	# Must be called with the lock held
+	def store(self, cache_key, item):
+		self.cache[cache_key] = (time.monotonic(), item)
+		self.cache.move_to_end(cache_key)
+
+		while len(self.cache) > self.max_size:
+			self.cache.popitem(last = False)
+
+	def show_popup(self, view, point, body, on_navigate):
+		self.hover_id += 1
+
+		# show_popup params:
+		# content, <flags>, <location>, <max_width>, <max_height>, <on_navigate>, <on_hide>
+		view.show_popup(
+			HoverScheduler.POPUP_TEMPLATE.format(body = body),
+			sublime.HIDE_ON_MOUSE_MOVE_AWAY,
+			point,
+			500,
+			500,
+			on_navigate,
+		)
+
+	# May be called from any thread
+	def update_popup(self, view, hover_id, body):
+		if hover_id != self.hover_id:
+			return
+
+		content = HoverScheduler.POPUP_TEMPLATE.format(body = body)
+
+		sublime.set_timeout(lambda: view.update_popup(content) if view.is_popup_visible() and hover_id == self.hover_id else None, 0)
+
+HOVER = HoverScheduler()
+
+class HoverListener(sublime_plugin.EventListener):
+	def on_hover(self, view, point, hover_zone):
+		if hover_zone != sublime.HOVER_TEXT:
+			return
+
+		resolver, key = HOVER.get_resolver(view, point)
+
+		if resolver != None:
+			resolver.show(view, point, key)
+
+# Change feed listener: hovers and SKU highlighting shouldn't show items known
+# to be out of date
+def invalidate_hover_cache(base_url, resource_type, items):
+	HOVER.invalidate(base_url, resource_type)
+
+	if resource_type == "products":
+		sku_highlight.SkuHighlighter.forget_all([item["sku"] for item in items if item.get("sku")])
+
+def plugin_loaded():
+	ChangeFeed.add_listener(invalidate_hover_cache)
+
+def plugin_unloaded():
+	if HOVER.executor != None:
+		HOVER.executor.shutdown(wait = False)
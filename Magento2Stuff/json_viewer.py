@@ -0,0 +1,347 @@
+import json
+import sublime
+import sublime_plugin
+
+from Magento2Stuff.temp_files import TempFileManager
+from Magento2Stuff.utils import Magento2Utils as utils
+
+# Tree view for "Debug info" and other JSON dumps.
+#
+# Only the top-level keys are shown at first. Nodes are rendered when they're
+# expanded, and long arrays a page at a time, so opening a large order or a
+# configurable product with hundreds of children doesn't serialize the lot.
+# Search covers the whole tree, expanding whatever's needed to show a match.
+# The indented JSON file is still available with "Export raw JSON".
+class JsonViewer():
+	SETTING = "magento2stuff_json_viewer"
+
+	HEADER_LINES = 2
+
+	# Children shown per expand (or "more" row) of a long array/object
+	PAGE_SIZE = 100
+
+	MAX_VALUE_CHARS = 300
+
+	MAX_RESULTS = 500
+
+	MENU_ITEMS = (
+		"Expand/collapse",
+		"Search...",
+		"Copy value",
+		"Copy path",
+		"Export raw JSON",
+	)
+
+	# View ID -> viewer
+	VIEWERS = {}
+
+	def __init__(self, view, data, name):
+		self.view     = view
+		self.data     = data
+		self.name     = name
+		self.rows     = [] # {"path", "depth", "more"}, one per line after the header
+		self.expanded = set()
+
+	@staticmethod
+	def open(data, name = None):
+		view = sublime.active_window().new_file()
+		view.set_scratch(True)
+		view.set_name("{} (JSON)".format(name or "Debug info"))
+		view.settings().set(JsonViewer.SETTING, True)
+		view.settings().set("word_wrap", False)
+		view.set_read_only(True)
+
+		JsonViewer.VIEWERS[view.id()] = JsonViewer(view, data, name)
+
+		view.run_command("magento2_stuff_json_viewer", {"action": "render"})
+
+	def render(self, edit):
+		header = "{}    enter: expand/collapse | /: search | m: menu\n\n".format(self.name or "Debug info")
+
+		self.rows = self.get_children((), 0, 0)
+
+		self.replace(edit, sublime.Region(0, self.view.size()), header + "".join(self.format_row(row) + "\n" for row in self.rows))
+
+	# Rows for a node's children, starting at `offset`, with a "more" row if
+	# there are more than a page
+	def get_children(self, path, depth, offset):
+		value = self.get_value(path)
+		keys  = list(value.keys()) if isinstance(value, dict) else range(len(value))
+		rows  = [{"path": path + (key,), "depth": depth, "more": None} for key in keys[offset:offset + JsonViewer.PAGE_SIZE]]
+
+		if len(keys) > offset + JsonViewer.PAGE_SIZE:
+			rows.append({"path": path, "depth": depth, "more": offset + JsonViewer.PAGE_SIZE})
+
+		return rows
+
+	def get_value(self, path):
+		value = self.data
+
+		for key in path:
+			value = value[key]
+
+		return value
+
+	def format_row(self, row):
+		indent = "    " * row["depth"]
+
+		if row["more"] != None:
+			return "{}  ... {} more".format(indent, len(self.get_value(row["path"])) - row["more"])
+
+		key   = row["path"][-1]
+		label = "[{}]".format(key) if isinstance(key, int) else key
+		value = self.get_value(row["path"])
+
+		if isinstance(value, (dict, list)) and value:
+			marker  = "-" if row["path"] in self.expanded else "+"
+			summary = "{{{} keys}}".format(len(value)) if isinstance(value, dict) else "[{} items]".format(len(value))
+
+			return "{}{} {}: {}".format(indent, marker, label, summary)
+
+		text = json.dumps(value, ensure_ascii = False)
+
+		if len(text) > JsonViewer.MAX_VALUE_CHARS:
+			text = "{}... ({:,} chars)".format(text[:JsonViewer.MAX_VALUE_CHARS], len(text))
+
+		return "{}  {}: {}".format(indent, label, text)
+
+	def get_row_index(self, point):
+		index = self.view.rowcol(point)[0] - JsonViewer.HEADER_LINES
+
+		return index if 0 <= index < len(self.rows) else None
+
+	def toggle(self, edit, index):
+		row = self.rows[index]
+
+		if row["more"] != None:
+			return self.show_more(edit, index)
+
+		value = self.get_value(row["path"])
+
+		if not isinstance(value, (dict, list)) or not value:
+			return
+
+		if row["path"] in self.expanded:
+			self.collapse(edit, index)
+		else:
+			self.expand(edit, index)
+
+	def expand(self, edit, index):
+		row      = self.rows[index]
+		children = self.get_children(row["path"], row["depth"] + 1, 0)
+
+		self.expanded.add(row["path"])
+
+		self.insert_rows(edit, index + 1, children)
+		self.update_row(edit, index)
+
+	# Nested nodes are collapsed too, so they start collapsed when shown again
+	def collapse(self, edit, index):
+		row = self.rows[index]
+		end = index + 1
+
+		while end < len(self.rows) and self.rows[end]["depth"] > row["depth"]:
+			end += 1
+
+		self.expanded = {path for path in self.expanded if path[:len(row["path"])] != row["path"]}
+
+		self.remove_rows(edit, index + 1, end)
+		self.update_row(edit, index)
+
+	def show_more(self, edit, index):
+		row = self.rows[index]
+
+		self.remove_rows(edit, index, index + 1)
+		self.insert_rows(edit, index, self.get_children(row["path"], row["depth"], row["more"]))
+
+	def insert_rows(self, edit, index, rows):
+		self.rows[index:index] = rows
+
+		self.replace(edit, sublime.Region(self.get_line_point(index)), "".join(self.format_row(row) + "\n" for row in rows))
+
+	def remove_rows(self, edit, start, end):
+		region = sublime.Region(self.get_line_point(start), self.get_line_point(end))
+
+		del self.rows[start:end]
+
+		self.replace(edit, region, "")
+
+	def update_row(self, edit, index):
+		self.replace(edit, self.view.line(self.get_line_point(index)), self.format_row(self.rows[index]))
+
+	def get_line_point(self, index):
+		return self.view.text_point(JsonViewer.HEADER_LINES + index, 0)
+
+	def replace(self, edit, region, text):
+		self.view.set_read_only(False)
+		self.view.replace(edit, region, text)
+		self.view.set_read_only(True)
+
+	# Expands the path's ancestors (and "more" rows) until it has a row, then
+	# moves the cursor to it
+	def reveal(self, edit, path):
+		for length in range(1, len(path) + 1):
+			index = self.find_row(path[:length], edit)
+
+			if index == None:
+				return
+
+			if length < len(path) and path[:length] not in self.expanded:
+				self.expand(edit, index)
+
+		point = self.get_line_point(index)
+
+		self.view.sel().clear()
+		self.view.sel().add(sublime.Region(point))
+		self.view.show_at_center(point)
+
+	def find_row(self, path, edit):
+		while True:
+			more = None
+
+			for index, row in enumerate(self.rows):
+				if row["more"] == None and row["path"] == path:
+					return index
+
+				if row["more"] != None and row["path"] == path[:-1]:
+					more = index
+
+			if more == None:
+				return None
+
+			self.show_more(edit, more)
+
+	# Paths of keys and scalar values containing the text (case-insensitive), in
+	# document order
+	def search(self, text):
+		needle  = text.lower()
+		results = []
+
+		for path, value in walk((), self.data):
+			key = path[-1]
+
+			if isinstance(key, str) and needle in key.lower():
+				results.append((path, value))
+
+			elif not isinstance(value, (dict, list)) and value != None and needle in str(value).lower():
+				results.append((path, value))
+
+			if len(results) >= JsonViewer.MAX_RESULTS:
+				break
+
+		return results
+
+	def show_search(self):
+		sublime.active_window().show_input_panel("Search JSON:", "", lambda text: self.show_results(text) if text else None, None, None)
+
+	def show_results(self, text):
+		results = self.search(text)
+
+		if not results:
+			return utils.log('nothing in the JSON matches "{}"'.format(text))
+
+		menu_items = []
+
+		for path, value in results:
+			menu_items.append([format_path(path), json.dumps(value, ensure_ascii = False)[:200] if not isinstance(value, (dict, list)) else "{} entries".format(len(value))])
+
+		sublime.active_window().show_quick_panel(
+			menu_items,
+			lambda x: self.view.run_command("magento2_stuff_json_viewer", {"action": "reveal", "path": list(results[x][0])}) if x != -1 else None,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			0,
+			None,
+			'{} matching "{}"'.format(len(results), text),
+		)
+
+	def show_menu(self):
+		sublime.active_window().show_quick_panel(
+			JsonViewer.MENU_ITEMS,
+			lambda x: self.process_menu(JsonViewer.MENU_ITEMS[x]) if x != -1 else None,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+		)
+
+	def process_menu(self, action):
+		if action == "Expand/collapse":
+			self.view.run_command("magento2_stuff_json_viewer", {"action": "toggle"})
+
+		elif action == "Search...":
+			self.show_search()
+
+		elif action in ("Copy value", "Copy path"):
+			index = self.get_row_index(self.view.sel()[0].begin())
+
+			if index == None or self.rows[index]["more"] != None:
+				return utils.log("no JSON value at the cursor")
+
+			path = self.rows[index]["path"]
+
+			if action == "Copy value":
+				sublime.set_clipboard(json.dumps(self.get_value(path), indent = "\t", ensure_ascii = False))
+			else:
+				sublime.set_clipboard(format_path(path))
+
+			utils.log("copied {} to clipboard".format("value" if action == "Copy value" else "path"))
+
+		elif action == "Export raw JSON":
+			export_raw_json(self.data, self.name)
+
+# (path, value) for every node below `value`, depth first
+def walk(path, value):
+	items = value.items() if isinstance(value, dict) else enumerate(value) if isinstance(value, list) else ()
+
+	for key, child in items:
+		yield path + (key,), child
+
+		yield from walk(path + (key,), child)
+
+# e.g. items[0].extension_attributes.stock_item
+def format_path(path):
+	text = ""
+
+	for key in path:
+		text += "[{}]".format(key) if isinstance(key, int) else ("." if text else "") + key
+
+	return text
+
+# The whole thing as an indented JSON file, as "Debug info" used to open
+def export_raw_json(data, name = None):
+	sublime.active_window().open_file(TempFileManager.write_json(data, name))
+
+class Magento2StuffJsonViewerCommand(sublime_plugin.TextCommand):
+	def run(self, edit, action, path = None, event = None):
+		viewer = JsonViewer.VIEWERS.get(self.view.id())
+
+		if viewer == None:
+			return
+
+		if action == "render":
+			viewer.render(edit)
+
+		elif action == "toggle":
+			point = self.view.window_to_text((event["x"], event["y"])) if event else self.view.sel()[0].begin()
+			index = viewer.get_row_index(point)
+
+			if index != None:
+				viewer.toggle(edit, index)
+
+		elif action == "reveal":
+			# Keys come back from JSON arguments as lists
+			viewer.reveal(edit, tuple(path))
+
+		elif action == "search":
+			viewer.show_search()
+
+		elif action == "menu":
+			viewer.show_menu()
+
+class JsonViewerListener(sublime_plugin.EventListener):
+	# Double-clicking a node expands or collapses it
+	def on_text_command(self, view, command_name, args):
+		if command_name == "drag_select" and args and args.get("by") == "words" and view.id() in JsonViewer.VIEWERS:
+			return ("magento2_stuff_json_viewer", {"action": "toggle", "event": args.get("event")})
+
+		return None
+
+	def on_close(self, view):
+		JsonViewer.VIEWERS.pop(view.id(), None)
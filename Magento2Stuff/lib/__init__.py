@@ -0,0 +1,3 @@
+# Modules here are not loaded by Sublime Text at startup (only the package's
+# top-level modules are), so rarely used code lives here and is imported
+# lazily - see core/lazy.py.
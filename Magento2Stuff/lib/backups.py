@@ -0,0 +1,109 @@
+import os
+import sublime
+import subprocess
+import threading
+import time
+import urllib.parse
+
+from datetime import datetime
+
+from Magento2Stuff.core.dates import RelativeTimeFormatter
+from Magento2Stuff.utils import Magento2Utils as utils
+
+# Backup and diff machinery for CMS sheets
+
+def backup_current_sheet(sheet_info, sheet_content):
+	backup_dir = create_backup_folder_name(sheet_info["identifier"])
+
+	if backup_dir:
+		if not os.path.exists(backup_dir):
+			utils.log("creating folder: " + backup_dir)
+			os.makedirs(backup_dir)
+
+		file_name = time.strftime("%Y-%m-%d %H.%M.%S") + ".html"
+		file_path = os.path.join(backup_dir, file_name)
+
+		with open(file_path, "w", encoding = "utf-8", newline = "\n") as f:
+			utils.log("creating file: " + file_path)
+			f.write(sheet_content)
+
+		if utils.get_setting("open_folder_after_backup"):
+			sublime.active_window().run_command("open_dir", {
+				"dir": backup_dir
+			})
+
+def show_backup_files_list_menu(sheet_info, this_file):
+	backup_dir = create_backup_folder_name(sheet_info["identifier"])
+
+	if not backup_dir:
+		return
+
+	if not os.path.exists(backup_dir):
+		return utils.log("backup folder not found: " + backup_dir)
+
+	backup_list_menu_items = []
+	file_paths = []
+
+	formatter = RelativeTimeFormatter()
+
+	for file_name in os.listdir(backup_dir):
+		file_path = os.path.join(backup_dir, file_name)
+
+		# Backup dir may contain directories
+		if os.path.isfile(file_path):
+			mtime = os.path.getmtime(file_path)
+			mtime_str = datetime.utcfromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S")
+
+			backup_list_menu_items.append([file_name, formatter.format(mtime_str)])
+			file_paths.append(file_path)
+
+	if not file_paths:
+		return utils.log("backup directory is empty for current file")
+
+	backup_list_menu_items.sort(key = lambda item: item[0], reverse = True)
+	file_paths.sort(reverse = True)
+
+	sublime.active_window().show_quick_panel(
+		backup_list_menu_items,
+		lambda index: diff_file(index, file_paths, this_file),
+		sublime.KEEP_OPEN_ON_FOCUS_LOST,
+	)
+
+def diff_file(index, file_paths, this_file):
+	if index == -1:
+		return False
+
+	# Ensure WinMerge binary exists before continuing
+	winmerge_path = utils.get_setting("winmerge_path")
+
+	if not winmerge_path:
+		return utils.log('settings value "winmerge_path" required')
+
+	if not os.path.isfile(winmerge_path):
+		return utils.log("WinMerge path not found: " + winmerge_path)
+
+	if this_file == None:
+		return utils.log("current sheet is not a saved file")
+
+	target = lambda: subprocess.check_output([
+		winmerge_path,
+		this_file,
+		file_paths[index],
+	])
+
+	thread = threading.Thread(target = target)
+	thread.start()
+
+def create_backup_folder_name(identifier):
+	base_backup_dir = utils.get_setting("backup_folder_path")
+
+	if not base_backup_dir:
+		utils.log('settings value "backup_folder_path" required')
+		return False
+
+	# CMS resource identifier is used as folder name
+	subfolder_name = urllib.parse.quote_plus(identifier)
+
+	backup_dir = os.path.join(base_backup_dir, subfolder_name)
+
+	return backup_dir
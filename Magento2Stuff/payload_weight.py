@@ -0,0 +1,305 @@
+import sublime
+import threading
+import time
+
+from Magento2Stuff.core.cms_mirror import CmsMirror
+from Magento2Stuff.core.cms_weight import CATEGORIES, analyze
+from Magento2Stuff.core.lazy import lazy_import
+from Magento2Stuff.core.storefront import head_size
+from Magento2Stuff.utils import Magento2Utils as utils
+
+concurrent_futures = lazy_import("concurrent.futures")
+
+# Sizes of media files referenced from CMS content, from HEAD requests, kept
+# for "cms_weight_media_cache_ttl" seconds so repeated analyses (and the same
+# image used on many pages) only cost one request each
+class MediaSizes():
+	WORKERS = 4
+
+	# URL -> (size or None, time)
+	SIZES = {}
+
+	LOCK = threading.Lock()
+
+	@staticmethod
+	def get_sizes(urls):
+		ttl = utils.get_setting("cms_weight_media_cache_ttl") or 3600
+		now = time.time()
+
+		with MediaSizes.LOCK:
+			missing = [url for url in dict.fromkeys(urls) if url not in MediaSizes.SIZES or now - MediaSizes.SIZES[url][1] > ttl]
+
+		if missing:
+			with concurrent_futures.ThreadPoolExecutor(max_workers = MediaSizes.WORKERS) as executor:
+				sizes = list(executor.map(MediaSizes.fetch, missing))
+
+			with MediaSizes.LOCK:
+				for url, size in zip(missing, sizes):
+					MediaSizes.SIZES[url] = (size, now)
+
+		with MediaSizes.LOCK:
+			return {url: MediaSizes.SIZES[url][0] for url in urls}
+
+	@staticmethod
+	def fetch(url):
+		try:
+			return head_size(url, utils.get_setting("cms_weight_timeout") or 10)
+
+		except Exception as e:
+			utils.log("unable to get size of {}: {}".format(url, e))
+
+		return None
+
+# Reports how heavy CMS content is (see cms_weight.py), for the current sheet
+# or every page and block in the profile, and flags the worst offenders: large
+# base64 images, large or unminified inline CSS/JS, too many widgets and large
+# media files.
+#
+# Blocks used by the content are followed (through the CMS mirror), as their
+# weight ends up on the page too. Everything runs on a worker thread.
+class PayloadWeightAnalyzer():
+	# How deep nested blocks are followed, in case of cycles
+	MAX_DEPTH = 5
+
+	def __init__(self):
+		self.profile  = utils.get_current_profile()
+		self.base_url = self.profile["base_url"]
+		self.mirror   = CmsMirror.for_profile(self.profile)
+		self.blocks   = {} # Block ID or identifier -> resource
+		self.reports  = {} # (type, ID) -> analysis
+
+	def analyze_sheet(self, sheet_info, content):
+		threading.Thread(target = self.run_sheet, args = (sheet_info, content)).start()
+
+	def analyze_all(self):
+		threading.Thread(target = self.run_all).start()
+
+	def run_sheet(self, sheet_info, content):
+		utils.set_status("magento2stuff_weight", "M2: analyzing payload weight...")
+
+		try:
+			self.load_blocks()
+
+			resource = {"type": sheet_info["type"], "id": sheet_info["id"], "identifier": sheet_info["identifier"], "title": sheet_info["identifier"]}
+			result   = self.measure(resource, analyze(content, self.base_url))
+
+			text = self.format_resource(resource, result)
+
+		except Exception as e:
+			return utils.log("unable to analyze payload weight: {}".format(e))
+
+		finally:
+			utils.set_status("magento2stuff_weight", None)
+
+		sublime.set_timeout(lambda: self.show_report("Payload weight: " + sheet_info["identifier"], text), 0)
+
+	def run_all(self):
+		utils.set_status("magento2stuff_weight", "M2: analyzing payload weight...")
+
+		try:
+			resources = self.load_blocks(include_pages = True)
+			results   = []
+
+			for i, resource in enumerate(resources):
+				results.append((resource, self.measure(resource, self.get_report(resource))))
+
+				utils.set_status("magento2stuff_weight", "M2: analyzed {}/{} pages and blocks".format(i + 1, len(resources)))
+
+			text = self.format_all(results)
+
+		except Exception as e:
+			return utils.log("unable to analyze payload weight: {}".format(e))
+
+		finally:
+			utils.set_status("magento2stuff_weight", None)
+
+		sublime.set_timeout(lambda: self.show_report("Payload weight: all pages and blocks", text), 0)
+
+	# Blocks are indexed by ID and identifier for following references
+	def load_blocks(self, include_pages = False):
+		if not self.mirror.is_complete():
+			utils.log("downloading CMS content for analysis, this may take a while...")
+
+		self.mirror.sync_if_incomplete()
+		self.mirror.sync()
+
+		resources   = self.mirror.get_resources(None if include_pages else "cmsBlock")
+		self.blocks = {}
+
+		for resource in resources:
+			if resource["type"] == "cmsBlock":
+				self.blocks.setdefault(str(resource["id"]), resource)
+				self.blocks.setdefault(resource["identifier"], resource)
+
+		return resources
+
+	def get_report(self, resource):
+		key = (resource["type"], resource["id"])
+
+		if key not in self.reports:
+			self.reports[key] = analyze(resource["content"], self.base_url)
+
+		return self.reports[key]
+
+	# The content's own weight plus that of the blocks it uses (each counted
+	# once) and the media files referenced by either, with the offenders found
+	def measure(self, resource, report):
+		nested  = []
+		seen    = set()
+		pending = [(reference, 1) for reference in report["blocks"]]
+
+		while pending:
+			reference, depth = pending.pop(0)
+			block = self.blocks.get(reference)
+
+			if block == None or block["id"] in seen or block["id"] == (resource["id"] if resource["type"] == "cmsBlock" else None):
+				continue
+
+			seen.add(block["id"])
+
+			block_report = self.get_report(block)
+
+			nested.append((block, block_report))
+
+			if depth < PayloadWeightAnalyzer.MAX_DEPTH:
+				pending.extend((child, depth + 1) for child in block_report["blocks"])
+
+		media = list(dict.fromkeys(report["media"] + [url for block, block_report in nested for url in block_report["media"]]))
+		sizes = MediaSizes.get_sizes(media)
+
+		nested_bytes = sum(block_report["bytes"] for block, block_report in nested)
+		media_bytes  = sum(size for size in sizes.values() if size != None)
+
+		return {
+			"report": report,
+			"nested": nested,
+			"nested_bytes": nested_bytes,
+			"widgets": report["widgets"] + sum(block_report["widgets"] for block, block_report in nested),
+			"media": sizes,
+			"media_bytes": media_bytes,
+			"total": report["bytes"] + nested_bytes + media_bytes,
+			"offenders": self.get_offenders(resource, report, nested, sizes),
+		}
+
+	# Each a dict with bytes, source, line and problem, heaviest first
+	def get_offenders(self, resource, report, nested, sizes):
+		image_limit  = (utils.get_setting("cms_weight_inline_image_kb") or 10) * 1024
+		code_limit   = (utils.get_setting("cms_weight_inline_code_kb") or 5) * 1024
+		media_limit  = (utils.get_setting("cms_weight_media_kb") or 250) * 1024
+		widget_limit = utils.get_setting("cms_weight_max_widgets") or 20
+
+		offenders = []
+
+		for source, source_report in [(resource, report)] + nested:
+			name = "{} {}".format("page" if source["type"] == "cmsPage" else "block", source["identifier"])
+
+			for item in source_report["items"]:
+				if item["category"] == "inline images":
+					if item["bytes"] > image_limit:
+						offenders.append({"bytes": item["bytes"], "source": name, "line": item["line"], "problem": "inline image ({})".format(item["detail"])})
+
+				elif item["bytes"] > code_limit:
+					offenders.append({"bytes": item["bytes"], "source": name, "line": item["line"], "problem": "large inline {} ({})".format(item["category"][7:], item["detail"])})
+
+				# Mostly whitespace and comments, and big enough to matter
+				elif item["savings"] > 1024 and item["savings"] > item["bytes"] / 4:
+					offenders.append({"bytes": item["bytes"], "source": name, "line": item["line"], "problem": "unminified inline {} ({}, ~{} saved by minifying)".format(item["category"][7:], item["detail"], format_size(item["savings"]))})
+
+		for url, size in sizes.items():
+			if size != None and size > media_limit:
+				offenders.append({"bytes": size, "source": "media", "line": None, "problem": url})
+
+		widgets = report["widgets"] + sum(block_report["widgets"] for block, block_report in nested)
+
+		if widgets > widget_limit:
+			offenders.append({"bytes": 0, "source": "{} {}".format("page" if resource["type"] == "cmsPage" else "block", resource["identifier"]), "line": None, "problem": "{} widgets, including {} nested blocks".format(widgets, len(nested))})
+
+		return sorted(offenders, key = lambda offender: offender["bytes"], reverse = True)
+
+	def format_resource(self, resource, result):
+		report = result["report"]
+		lines  = ["{} {} (ID {})".format("Page" if resource["type"] == "cmsPage" else "Block", resource["identifier"], resource["id"]), ""]
+
+		lines.append("Content: {}".format(format_size(report["bytes"])))
+
+		for category in CATEGORIES:
+			size = report["categories"][category]
+
+			if size:
+				lines.append("  {:<15}{:>10}  {:>3.0f}%".format(category, format_size(size), size * 100 / report["bytes"]))
+
+		unknown = sum(1 for size in result["media"].values() if size == None)
+
+		lines.append("Nested blocks: {} ({})".format(len(result["nested"]), format_size(result["nested_bytes"])))
+
+		for block, block_report in result["nested"]:
+			lines.append("  {:<40}{:>10}".format(block["identifier"], format_size(block_report["bytes"])))
+
+		lines.append("Widgets: {}".format(result["widgets"]))
+		lines.append("Media: {} files, {}{}".format(len(result["media"]), format_size(result["media_bytes"]), " ({} sizes unknown)".format(unknown) if unknown else ""))
+		lines.append("Estimated total: {}".format(format_size(result["total"])))
+		lines.append("")
+
+		lines.extend(self.format_offenders(result["offenders"]))
+
+		return "\n".join(lines)
+
+	def format_all(self, results):
+		results = sorted(results, key = lambda result: result[1]["total"], reverse = True)
+		lines   = ["{} pages and blocks, heaviest first (estimated total = content + nested blocks + media)".format(len(results)), ""]
+
+		lines.append("{:>10}  {:>10}  {:>10}  {:>10}  {:>7}  {:>9}  {}".format("Total", "Content", "Nested", "Media", "Widgets", "Offenders", "Page/block"))
+
+		for resource, result in results:
+			lines.append("{:>10}  {:>10}  {:>10}  {:>10}  {:>7}  {:>9}  {} {} (ID {}){}".format(
+				format_size(result["total"]),
+				format_size(result["report"]["bytes"]),
+				format_size(result["nested_bytes"]),
+				format_size(result["media_bytes"]),
+				result["widgets"],
+				len(result["offenders"]),
+				"Page" if resource["type"] == "cmsPage" else "Block",
+				resource["identifier"],
+				resource["id"],
+				"" if resource["active"] else " (DISABLED)",
+			))
+
+		# Offenders in blocks show up once per page using them, so each is listed
+		# once, under the first (heaviest) page or block it was found for
+		offenders = {}
+
+		for resource, result in results:
+			for offender in result["offenders"]:
+				offenders.setdefault((offender["source"], offender["line"], offender["problem"]), offender)
+
+		lines.append("")
+		lines.extend(self.format_offenders(sorted(offenders.values(), key = lambda offender: offender["bytes"], reverse = True)[:utils.get_setting("cms_weight_max_offenders") or 50]))
+
+		return "\n".join(lines)
+
+	def format_offenders(self, offenders):
+		if not offenders:
+			return ["No offenders found."]
+
+		lines = ["Heaviest offenders:"]
+
+		for offender in offenders:
+			location = offender["source"] + (" line {}".format(offender["line"]) if offender["line"] else "")
+
+			lines.append("  {:>10}  {:<40}  {}".format(format_size(offender["bytes"]) if offender["bytes"] else "", location, offender["problem"]))
+
+		return lines
+
+	def show_report(self, name, text):
+		view = sublime.active_window().new_file()
+		view.set_scratch(True)
+		view.set_name(name)
+		view.settings().set("word_wrap", False)
+		view.run_command("append", {"characters": text})
+		view.set_read_only(True)
+
+def format_size(size):
+	if size >= 1024 * 1024:
+		return "{:.1f} MB".format(size / 1024 / 1024)
+
+	return "{:.1f} KB".format(size / 1024)
@@ -0,0 +1,149 @@
+import collections
+import threading
+import time
+
+from Magento2Stuff.core.api import MagentoAPI as api
+from Magento2Stuff.core.throttle import PRIORITY_BACKGROUND, RequestCancelled, RequestGovernor
+from Magento2Stuff.utils import Magento2Utils as utils
+
+# Background prefetch of detail payloads (e.g. "cmsPage/12") for the list item
+# currently highlighted in a quick panel, so the following "Debug info" or
+# "Insert page contents" action doesn't have to wait for the request.
+#
+# Prefetches are started after a short delay, and a pending prefetch is
+# cancelled when the highlight moves on, whether it's still waiting to start or
+# queued behind the rate limiter. Results are kept in a small LRU cache
+# for a limited time.
+class DetailPrefetcher():
+	def __init__(self, max_size = 16, max_age = 60, delay = 0.15, wait_timeout = 10):
+		self.max_size     = max_size
+		self.max_age      = max_age
+		self.delay        = delay
+		self.wait_timeout = wait_timeout
+		self.cache        = collections.OrderedDict()
+		self.pending      = {} # Key -> event set when the prefetch finishes
+		self.cancels      = {} # Key -> event set to cancel the prefetch
+		self.timer        = None
+		self.lock         = threading.Lock()
+
+	def highlight(self, endpoint):
+		if not utils.get_setting("prefetch_on_highlight"):
+			return
+
+		key = self.get_key(endpoint)
+
+		with self.lock:
+			if self.timer != None:
+				self.timer.cancel()
+				self.timer = None
+
+			self.cancel_others(key)
+
+			if key in self.pending or self.get_cached(key) != None:
+				return
+
+			self.timer = threading.Timer(self.delay, self.prefetch, args = (key, endpoint))
+			self.timer.daemon = True
+			self.timer.start()
+
+	def prefetch(self, key, endpoint):
+		with self.lock:
+			if key in self.pending:
+				return
+
+			done   = threading.Event()
+			cancel = threading.Event()
+
+			self.pending[key] = done
+			self.cancels[key] = cancel
+
+		try:
+			response = api.request("GET", endpoint, priority = PRIORITY_BACKGROUND, cancel = cancel)
+
+		except RequestCancelled:
+			response = None
+
+		except Exception as e:
+			response = None
+			utils.log("prefetch failed for {}: {}".format(endpoint, e))
+
+		with self.lock:
+			if response != None:
+				self.store(key, response)
+
+			if self.pending.get(key) == done:
+				del self.pending[key]
+				del self.cancels[key]
+
+		done.set()
+
+	# Returns the cached payload, waits (up to wait_timeout seconds) for an
+	# in-flight prefetch, or falls back to a normal request. Payloads may be up
+	# to max_age old, so content that's going to be edited and saved back should
+	# be requested directly instead.
+	def get(self, endpoint):
+		key = self.get_key(endpoint)
+
+		with self.lock:
+			response = self.get_cached(key)
+			pending  = self.pending.get(key)
+
+		if response != None:
+			return response
+
+		if pending != None:
+			pending.wait(self.wait_timeout)
+
+			with self.lock:
+				response = self.get_cached(key)
+
+			if response != None:
+				return response
+
+		return api.request("GET", endpoint)
+
+	# Cancels prefetches other than the one for `key`, which are no longer
+	# highlighted, and drops them from pending so nothing waits on them. Must be
+	# called with the lock held.
+	def cancel_others(self, key):
+		stale = [other for other in self.cancels if other != key]
+
+		for other in stale:
+			self.cancels.pop(other).set()
+			self.pending.pop(other).set()
+
+		# So cancelled requests give up their place in the queue straight away
+		if stale:
+			RequestGovernor.for_profile(utils.get_current_profile(), utils.get_setting("rate_limit")).wake()
+
+	def invalidate(self, endpoint):
+		with self.lock:
+			self.cache.pop(self.get_key(endpoint), None)
+
+	def get_key(self, endpoint):
+		return (utils.get_current_profile()["base_url"], endpoint)
+
+	# Must be called with the lock held
+	def get_cached(self, key):
+		entry = self.cache.get(key)
+
+		if entry == None:
+			return None
+
+		if time.monotonic() - entry[0] > self.max_age:
+			del self.cache[key]
+			return None
+
+		self.cache.move_to_end(key)
+
+		return entry[1]
+
+	# Must be called with the lock held
+	def store(self, key, response):
+		self.cache[key] = (time.monotonic(), response)
+		self.cache.move_to_end(key)
+
+		while len(self.cache) > self.max_size:
+			self.cache.popitem(last = False)
+
+DETAIL_CACHE = DetailPrefetcher()
@@ -0,0 +1,240 @@
+import json
+import os
+import sublime
+import statistics
+import threading
+import time
+
+from Magento2Stuff.cache_warmer import CacheWarmer
+from Magento2Stuff.core.lazy import lazy_import
+from Magento2Stuff.core.rows import CategoryRow, CmsPageRow, ProductRow
+from Magento2Stuff.core.storefront import probe
+from Magento2Stuff.utils import Magento2Utils as utils
+
+concurrent_futures = lazy_import("concurrent.futures")
+
+# Measures how fast storefront pages serve: DNS, connect, TLS, TTFB, total time
+# and size for each URL, probed concurrently (see storefront.probe).
+#
+# Results are kept per URL in the profile's cache folder, and the report shows
+# each TTFB against the median of earlier probes, so a page which got slower
+# after a content edit stands out.
+class ProbeHistory():
+	FILE_NAME = "probe_history.json"
+
+	LOCK = threading.Lock()
+
+	def __init__(self, profile = None):
+		self.file_path = utils.get_profile_cache_path(profile or utils.get_current_profile(), ProbeHistory.FILE_NAME)
+		self.history   = self.load()
+
+	def load(self):
+		if not os.path.isfile(self.file_path):
+			return {}
+
+		try:
+			with open(self.file_path, "r", encoding = "utf-8") as f:
+				return json.load(f)
+
+		except ValueError:
+			utils.log("unreadable probe history, starting again")
+
+		return {}
+
+	def get(self, url):
+		return self.history.get(url, [])
+
+	# Median TTFB of earlier successful probes, or None if there aren't any
+	def get_baseline(self, url):
+		ttfbs = [result["ttfb"] for result in self.get(url) if result.get("status") == 200]
+
+		return statistics.median(ttfbs) if ttfbs else None
+
+	def add(self, results):
+		size = utils.get_setting("probe_history_size") or 20
+
+		with ProbeHistory.LOCK:
+			# Merged into the file as it is now, in case another probe has saved
+			# results since this one loaded it
+			self.history = self.load()
+
+			for result in results:
+				if "error" in result:
+					continue
+
+				entries = self.history.setdefault(result["url"], [])
+				entries.append({key: result[key] for key in ("time", "status", "dns", "connect", "tls", "ttfb", "total", "bytes", "cache")})
+
+				del entries[:-size]
+
+			with open(self.file_path + ".tmp", "w", encoding = "utf-8") as f:
+				json.dump(self.history, f)
+
+			os.replace(self.file_path + ".tmp", self.file_path)
+
+class StorefrontProbe():
+	SORT_KEYS = (
+		("TTFB", "ttfb"),
+		("Total", "total"),
+		("DNS", "dns"),
+		("Connect", "connect"),
+		("TLS", "tls"),
+		("Size", "bytes"),
+		("Change vs history", "change"),
+		("URL", "url"),
+	)
+
+	COLUMNS = ("Status", "DNS", "Connect", "TLS", "TTFB", "Total", "Size", "Cache", "vs median", "URL")
+
+	def __init__(self, urls, label):
+		self.urls    = list(dict.fromkeys(url for url in urls if url))
+		self.label   = label
+		self.profile = utils.get_current_profile()
+		self.results = []
+		self.view    = None
+
+	# The same URLs as cache warming uses. List menu rows only have some of the
+	# fields the API returns, so they're passed on as items with just those.
+	@staticmethod
+	def for_rows(rows, label):
+		profile = utils.get_current_profile()
+		urls    = []
+
+		for row in rows:
+			if isinstance(row, CmsPageRow):
+				urls.extend(CacheWarmer.get_urls(row.RESOURCE_TYPE, {"id": row.id, "identifier": row.identifier, "active": row.active}, profile))
+
+			elif isinstance(row, CategoryRow):
+				urls.extend(CacheWarmer.get_urls("categories", {"id": row.id, "custom_attributes": [{"attribute_code": "url_path", "value": row.url_path}]}, profile))
+
+			elif isinstance(row, ProductRow):
+				urls.extend(CacheWarmer.get_urls("products", {"id": row.id, "custom_attributes": [{"attribute_code": "url_key", "value": row.url_key}]}, profile))
+
+		return StorefrontProbe(urls, label)
+
+	def start(self):
+		if not self.urls:
+			return utils.log("nothing to probe: no storefront URLs")
+
+		thread = threading.Thread(target = self.run)
+		thread.start()
+
+	def run(self):
+		method      = utils.get_setting("probe_method") or "GET"
+		timeout     = utils.get_setting("probe_timeout") or 30
+		concurrency = utils.get_setting("probe_concurrency") or 4
+
+		history = ProbeHistory(self.profile)
+		done    = 0
+
+		with concurrent_futures.ThreadPoolExecutor(max_workers = concurrency) as executor:
+			futures = {executor.submit(probe, url, method, None, timeout): url for url in self.urls}
+
+			for future in concurrent_futures.as_completed(futures):
+				url = futures[future]
+
+				try:
+					result = future.result()
+
+				except Exception as e:
+					result = {"url": url, "error": str(e)}
+
+				# Compared with the history before this run
+				baseline = history.get_baseline(url)
+
+				result["baseline"] = baseline
+				result["change"]   = (result["ttfb"] - baseline) / baseline if baseline and "ttfb" in result else None
+
+				self.results.append(result)
+
+				done += 1
+				utils.set_status("magento2stuff_probe", "M2: probed {}/{} URLs".format(done, len(self.urls)))
+
+		utils.set_status("magento2stuff_probe", None)
+
+		history.add(self.results)
+
+		sublime.set_timeout(lambda: self.show_report("ttfb"), 0)
+
+	def show_report(self, sort_key):
+		results = sorted(self.results, key = lambda result: self.get_sort_value(result, sort_key), reverse = sort_key != "url")
+
+		if self.view == None or not self.view.is_valid():
+			self.view = sublime.active_window().new_file()
+			self.view.set_scratch(True)
+			self.view.set_name("Storefront probe: {}".format(self.label))
+			self.view.settings().set("word_wrap", False)
+
+		self.view.set_read_only(False)
+		self.view.run_command("select_all")
+		self.view.run_command("right_delete")
+		self.view.run_command("append", {"characters": self.format_table(results, sort_key)})
+		self.view.set_read_only(True)
+
+		self.show_sort_menu()
+
+	def get_sort_value(self, result, sort_key):
+		value = result.get(sort_key)
+
+		if sort_key == "url":
+			return value
+
+		# Errors and missing values sort last
+		return value if value != None else float("-inf")
+
+	def format_table(self, results, sort_key):
+		threshold = utils.get_setting("probe_regression_threshold") or 0.5
+		rows      = [StorefrontProbe.COLUMNS]
+
+		for result in results:
+			if "error" in result:
+				rows.append(("error", "", "", "", "", "", "", "", "", "{} ({})".format(result["url"], result["error"])))
+				continue
+
+			change = result["change"]
+
+			if change == None:
+				change_text = "new"
+			else:
+				change_text = "{:+.0f}%{}".format(change * 100, " !!" if change > threshold else "")
+
+			rows.append((
+				str(result["status"]),
+				format_ms(result["dns"]),
+				format_ms(result["connect"]),
+				format_ms(result["tls"]),
+				format_ms(result["ttfb"]),
+				format_ms(result["total"]),
+				"{:.1f} KB".format(result["bytes"] / 1024),
+				result["cache"] or "",
+				change_text,
+				result["url"],
+			))
+
+		widths = [max(len(row[i]) for row in rows) for i in range(len(StorefrontProbe.COLUMNS) - 1)]
+
+		lines = [
+			"{} ({} URLs, {}), sorted by {}".format(self.label, len(results), time.strftime("%Y-%m-%d %H:%M:%S"), dict((key, name) for name, key in StorefrontProbe.SORT_KEYS)[sort_key]),
+			"",
+		]
+
+		for row in rows:
+			lines.append("  ".join(value.rjust(width) for value, width in zip(row, widths)) + "  " + row[-1])
+
+		lines.append("")
+		lines.append('"vs median" compares TTFB with the median of earlier probes; "!!" marks a slowdown of over {:.0f}%.'.format(threshold * 100))
+
+		return "\n".join(lines)
+
+	def show_sort_menu(self):
+		sublime.active_window().show_quick_panel(
+			[name for name, key in StorefrontProbe.SORT_KEYS],
+			lambda x: self.show_report(StorefrontProbe.SORT_KEYS[x][1]) if x != -1 else None,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+			0,
+			None,
+			"Sort by",
+		)
+
+def format_ms(seconds):
+	return "{:.0f} ms".format(seconds * 1000)
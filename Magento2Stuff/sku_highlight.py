@@ -0,0 +1,323 @@
+import os
+import sublime
+import sublime_plugin
+import threading
+
+from Magento2Stuff.core.throttle import PRIORITY_BACKGROUND
+from Magento2Stuff.hover import HOVER
+from Magento2Stuff.sku_hover import SKU_RESOLVER, SkuHover
+from Magento2Stuff.utils import Magento2Utils as utils
+
+# Underlines SKUs (see SkuHover.SKU_PATTERNS) in files such as product feeds
+# and order exports, and flags those which are missing, disabled or out of
+# stock.
+#
+# Only the visible area plus a margin is scanned, growing as the view is
+# scrolled, and edits only rescan the lines they touch, so multi-MB files stay
+# responsive. Which parts have been scanned is tracked as hidden regions, which
+# Sublime keeps in place as the text changes. Statuses are resolved with the
+# hover scheduler's batched, cached product searches.
+class SkuHighlighter():
+	FOUND_KEY = "magento2stuff_sku"
+
+	SCANNED_KEY = "magento2stuff_sku_scanned"
+
+	# Region key, scope and annotation for each flagged status
+	FLAGS = {
+		"missing": ("magento2stuff_sku_missing", "region.redish", "not found"),
+		"disabled": ("magento2stuff_sku_disabled", "region.yellowish", "disabled"),
+		"out_of_stock": ("magento2stuff_sku_out_of_stock", "region.orangish", "out of stock"),
+	}
+
+	POLL_INTERVAL_MS = 300
+
+	PATTERN = None
+
+	# View ID -> highlighter
+	HIGHLIGHTERS = {}
+
+	def __init__(self, view):
+		self.view           = view
+		self.lock           = threading.Lock()
+		self.statuses       = {} # Lowercase SKU -> status, or None if not flagged
+		self.requested      = set()
+		self.redraw_pending = False
+		self.visible        = None
+		self.polling        = False
+
+	@staticmethod
+	def for_view(view):
+		if view.id() not in SkuHighlighter.HIGHLIGHTERS:
+			SkuHighlighter.HIGHLIGHTERS[view.id()] = SkuHighlighter(view)
+
+		return SkuHighlighter.HIGHLIGHTERS[view.id()]
+
+	@staticmethod
+	def is_enabled(view):
+		if not utils.get_setting("sku_highlighting"):
+			return False
+
+		file_name = view.file_name()
+
+		if not file_name:
+			return False
+
+		extensions = utils.get_setting("sku_highlight_extensions") or [".csv", ".tsv", ".txt"]
+
+		return os.path.splitext(file_name)[1].lower() in extensions
+
+	@staticmethod
+	def get_pattern():
+		if SkuHighlighter.PATTERN == None:
+			SkuHighlighter.PATTERN = SkuHover.get_search_pattern()
+
+		return SkuHighlighter.PATTERN
+
+	# The visible region plus "sku_highlight_margin_lines" either side
+	def get_window(self):
+		visible = self.view.visible_region()
+		margin  = utils.get_setting("sku_highlight_margin_lines") or 200
+
+		first_row = max(self.view.rowcol(visible.begin())[0] - margin, 0)
+		last_row  = self.view.rowcol(visible.end())[0] + margin
+
+		return sublime.Region(self.view.text_point(first_row, 0), self.view.line(self.view.text_point(last_row, 0)).end())
+
+	# Scans whatever part of the window hasn't been scanned yet
+	def update(self):
+		window  = self.get_window()
+		scanned = self.view.get_regions(SkuHighlighter.SCANNED_KEY)
+		gaps    = subtract_regions(window, scanned)
+
+		if not gaps:
+			return
+
+		found = []
+
+		for gap in gaps:
+			gap = self.view.full_line(gap)
+
+			found.extend(self.scan(gap))
+			scanned.append(gap)
+
+		self.view.add_regions(SkuHighlighter.SCANNED_KEY, merge_regions(scanned), "", "", sublime.HIDDEN)
+
+		if found:
+			self.add_found(found)
+
+	def scan(self, region):
+		text   = self.view.substr(region)
+		offset = region.begin()
+
+		return [sublime.Region(offset + match.start(), offset + match.end()) for match in SkuHighlighter.get_pattern().finditer(text)]
+
+	def draw_found(self, regions):
+		self.view.add_regions(SkuHighlighter.FOUND_KEY, regions, "markup.underline", "", sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE | sublime.DRAW_SOLID_UNDERLINE)
+
+	def add_found(self, regions):
+		self.draw_found(self.view.get_regions(SkuHighlighter.FOUND_KEY) + regions)
+
+		self.resolve(set(self.view.substr(region) for region in regions))
+
+		self.redraw()
+
+	# Statuses come back on the hover workers, and are drawn in one go. Lookups
+	# are background work, so hovers and menus go first.
+	def resolve(self, skus):
+		with self.lock:
+			skus = [sku for sku in skus if sku.lower() not in self.requested]
+
+			self.requested.update(sku.lower() for sku in skus)
+
+		for sku in skus:
+			HOVER.request(SKU_RESOLVER, sku, lambda product, error, sku = sku: self.set_status(sku, product, error), PRIORITY_BACKGROUND)
+
+	# Drops the statuses of changed products, and looks them up again if
+	# they're in the text scanned so far
+	@staticmethod
+	def forget_all(skus):
+		for highlighter in list(SkuHighlighter.HIGHLIGHTERS.values()):
+			if highlighter.view.is_valid():
+				highlighter.forget(skus)
+
+	def forget(self, skus):
+		lowered = {sku.lower() for sku in skus}
+
+		with self.lock:
+			lowered &= self.requested | set(self.statuses)
+
+			self.requested -= lowered
+
+			for sku in lowered:
+				self.statuses.pop(sku, None)
+
+		if not lowered:
+			return
+
+		found = {self.view.substr(region) for region in self.view.get_regions(SkuHighlighter.FOUND_KEY)}
+
+		self.redraw()
+		self.resolve([sku for sku in found if sku.lower() in lowered])
+
+	def set_status(self, sku, product, error):
+		if error != None:
+			status = None
+
+			# Tried again when next seen
+			with self.lock:
+				self.requested.discard(sku.lower())
+
+		elif product == None:
+			status = "missing"
+
+		elif product.get("status") == 2:
+			status = "disabled"
+
+		elif ((product.get("extension_attributes") or {}).get("stock_item") or {}).get("is_in_stock") == False:
+			status = "out_of_stock"
+
+		else:
+			status = None
+
+		with self.lock:
+			self.statuses[sku.lower()] = status
+
+			if self.redraw_pending:
+				return
+
+			self.redraw_pending = True
+
+		sublime.set_timeout_async(self.redraw, 100)
+
+	def redraw(self):
+		with self.lock:
+			self.redraw_pending = False
+			statuses = dict(self.statuses)
+
+		if not self.view.is_valid():
+			return
+
+		flagged = {status: [] for status in SkuHighlighter.FLAGS}
+
+		for region in self.view.get_regions(SkuHighlighter.FOUND_KEY):
+			status = statuses.get(self.view.substr(region).lower())
+
+			if status != None:
+				flagged[status].append(region)
+
+		for status, (key, scope, annotation) in SkuHighlighter.FLAGS.items():
+			regions = flagged[status]
+
+			self.view.add_regions(key, regions, scope, "", sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE | sublime.DRAW_SQUIGGLY_UNDERLINE, [annotation] * len(regions))
+
+	# Forgets the SKUs found in (and the scanning of) the lines edited, which
+	# are then rescanned if they're in the window
+	def invalidate(self, dirty):
+		dirty = self.view.full_line(dirty)
+		found = self.view.get_regions(SkuHighlighter.FOUND_KEY)
+		kept  = [region for region in found if not region.empty() and not region.intersects(dirty) and not dirty.contains(region)]
+
+		self.draw_found(kept)
+
+		scanned = []
+
+		for region in self.view.get_regions(SkuHighlighter.SCANNED_KEY):
+			scanned.extend(subtract_regions(region, [dirty]))
+
+		self.view.add_regions(SkuHighlighter.SCANNED_KEY, scanned, "", "", sublime.HIDDEN)
+
+		self.update()
+
+		if len(kept) != len(found):
+			self.redraw()
+
+	# There's no scroll event, so the active view's visible region is polled
+	def start_polling(self):
+		if self.polling:
+			return
+
+		self.polling = True
+
+		sublime.set_timeout_async(self.poll, SkuHighlighter.POLL_INTERVAL_MS)
+
+	def poll(self):
+		window = self.view.window() if self.view.is_valid() else None
+
+		if window == None or window.active_view() != self.view:
+			self.polling = False
+			return
+
+		visible = self.view.visible_region()
+
+		if visible != self.visible:
+			self.visible = visible
+			self.update()
+
+		sublime.set_timeout_async(self.poll, SkuHighlighter.POLL_INTERVAL_MS)
+
+	def clear(self):
+		for key in [SkuHighlighter.FOUND_KEY, SkuHighlighter.SCANNED_KEY] + [flag[0] for flag in SkuHighlighter.FLAGS.values()]:
+			self.view.erase_regions(key)
+
+# Parts of `region` not covered by any of `regions`
+def subtract_regions(region, regions):
+	gaps  = []
+	start = region.begin()
+
+	for other in sorted(regions, key = lambda r: r.begin()):
+		if other.end() <= start or other.begin() >= region.end():
+			continue
+
+		if other.begin() > start:
+			gaps.append(sublime.Region(start, other.begin()))
+
+		start = max(start, other.end())
+
+	if start < region.end():
+		gaps.append(sublime.Region(start, region.end()))
+
+	return gaps
+
+def merge_regions(regions):
+	merged = []
+
+	for region in sorted(regions, key = lambda r: r.begin()):
+		if merged and region.begin() <= merged[-1].end():
+			merged[-1] = sublime.Region(merged[-1].begin(), max(merged[-1].end(), region.end()))
+		else:
+			merged.append(region)
+
+	return merged
+
+class SkuHighlightListener(sublime_plugin.EventListener):
+	def on_activated_async(self, view):
+		if SkuHighlighter.is_enabled(view):
+			highlighter = SkuHighlighter.for_view(view)
+			highlighter.update()
+			highlighter.start_polling()
+
+	def on_close(self, view):
+		SkuHighlighter.HIGHLIGHTERS.pop(view.id(), None)
+
+# Edits are passed with their positions, so only the lines changed are
+# rescanned (on_modified_async doesn't say what changed)
+class SkuHighlightChangeListener(sublime_plugin.TextChangeListener):
+	def on_text_changed_async(self, changes):
+		views = [view for view in self.buffer.views() if view.id() in SkuHighlighter.HIGHLIGHTERS]
+
+		if not views or not changes:
+			return
+
+		# Later changes may move earlier ones, so a span covering them all is
+		# rescanned
+		begin = min(change.a.pt for change in changes)
+		end   = max(change.a.pt + len(change.str) for change in changes)
+		end  += sum(max(len(change.str) - (change.b.pt - change.a.pt), 0) for change in changes)
+
+		for view in views:
+			SkuHighlighter.for_view(view).invalidate(sublime.Region(begin, min(end, view.size())))
+
+def plugin_unloaded():
+	for highlighter in SkuHighlighter.HIGHLIGHTERS.values():
+		if highlighter.view.is_valid():
+			highlighter.clear()
@@ -1,35 +1,118 @@
 import base64
+import html
 import re
 import sublime
-import sublime_plugin
-import threading
-import urllib
-
-from Magento2Stuff.api import MagentoAPI
-from Magento2Stuff.urls import Magento2StuffSettings
+import time
+import urllib.error
+import urllib.parse
+
+from Magento2Stuff.core.api import MagentoAPI
+from Magento2Stuff.core.graphql import GraphQLAPI
+from Magento2Stuff.core.query import Param, SearchCriteria
+from Magento2Stuff.core.rows import get_custom_attribute
+from Magento2Stuff.core.throttle import PRIORITY_INTERACTIVE
+from Magento2Stuff.core.urls import M2_URLS
+from Magento2Stuff.hover import HOVER, HoverResolver
+from Magento2Stuff.prefetch import DETAIL_CACHE
 from Magento2Stuff.utils import Magento2Utils as utils
 
-M2_URLS = Magento2StuffSettings()
+# Hover resolver for SKUs.
+#
+# The popup is rendered progressively: a skeleton is shown straight away, text
+# fields are filled in when the product arrives, then the thumbnail and stock
+# figures (fetched in parallel on the shared hover workers) are added as they
+# come in. Anything arriving after the hover's latency budget is dropped.
+class SkuHover(HoverResolver):
+	NAME = "product"
+
+	SETTING = "sku_lookup_on_hover"
 
-class SkuHover(sublime_plugin.EventListener):
-	CURRENT_VIEW = None
+	RESOURCE_TYPE = "products"
 
 	SKU_PATTERNS = (
 		r"^[0-9]{5}[a-z]{4}([a-z0-9]{2})?$",
 		r"^D[0-9]{5}(SZ[0-9]+)?$",
 	)
 
-	def on_hover(self, view, point, hover_zone):
-		if utils.get_setting("sku_lookup_on_hover"):
-			if hover_zone == sublime.HOVER_TEXT:
-				region = view.word(point)
-				substr = view.substr(region)
-
-				if self.is_sku(substr):
-					self.CURRENT_VIEW = view
-
-					thread = threading.Thread(target = self.get_sku_info, args = (substr, view, point, self.show_sku_hover))
-					thread.start()
+	# Only the fields shown in the popup and used by SKU highlighting ("debug"
+	# fetches the full product)
+	SKU_QUERY = SearchCriteria().filter("sku", Param("skus"), "in").page(HoverResolver.MAX_BATCH).fields({
+		"items": [
+			"id",
+			"sku",
+			"name",
+			"type_id",
+			"status",
+			"price",
+			"updated_at",
+			{
+				"custom_attributes": [
+					"url_key",
+					"image",
+				],
+				"extension_attributes": [
+					{
+						"stock_item": [
+							"is_in_stock",
+						],
+					},
+				],
+			},
+		]
+	}).compile()
+
+	UNAVAILABLE = "<em>n/a</em>"
+
+	def get_key(self, view, point):
+		word = view.substr(view.word(point))
+
+		return word if self.is_sku(word) else None
+
+	def show(self, view, point, sku):
+		budget = (utils.get_setting("sku_hover_budget_ms") or 2000) / 1000
+
+		state = {
+			"sku": sku,
+			"deadline": time.monotonic() + budget,
+			"product": None,
+			"error": None,
+			"parts": {part: None for part in self.get_extra_parts()},
+			"expired": False,
+		}
+
+		HOVER.show_popup(view, point, self.get_sku_html_summary(state), lambda href: self.on_navigate(view, href, state["product"]))
+
+		state["id"] = HOVER.hover_id
+
+		HOVER.request(self, sku, lambda product, error: self.on_product(view, state, product, error))
+
+		# Whatever hasn't arrived by the deadline is shown as unavailable
+		sublime.set_timeout_async(lambda: self.expire(view, state), int(budget * 1000))
+
+	# Products for a batch of SKUs in one search (or GraphQL query, see
+	# "graphql_lookups"). SKUs are case-insensitive. GraphQL doesn't return
+	# disabled products or those not visible individually, so any SKUs it
+	# didn't find are searched for over REST, to tell them apart from missing
+	# ones.
+	def fetch(self, skus, profile, timeout, priority = PRIORITY_INTERACTIVE):
+		products = {}
+
+		if GraphQLAPI.is_enabled(profile):
+			products = {sku.lower(): product for sku, product in GraphQLAPI.get_products_by_sku(skus, profile, timeout, priority).items()}
+
+		missing = [sku for sku in skus if sku.lower() not in products]
+
+		if missing:
+			response = MagentoAPI.request("GET", "products", search_criteria = SkuHover.SKU_QUERY.bind(skus = ",".join(missing)), priority = priority, profile = profile, timeout = timeout)
+
+			products.update((product["sku"].lower(), product) for product in response["items"] or [])
+
+		return {sku: products[sku.lower()] for sku in skus if sku.lower() in products}
+
+	# The SKU patterns as one regex for finding SKUs in text
+	@staticmethod
+	def get_search_pattern():
+		return re.compile(r"\b(?:" + "|".join(p.lstrip("^").rstrip("$") for p in SkuHover.SKU_PATTERNS) + r")\b", re.IGNORECASE)
 
 	def is_sku(self, text):
 		for p in self.SKU_PATTERNS:
@@ -40,93 +123,171 @@ class SkuHover(sublime_plugin.EventListener):
 
 		return False
 
-	def get_sku_info(self, sku, view, point, callback):
-		response = MagentoAPI.request("GET", "products/{}".format(sku))
-		callback(view, point, response)
-
-	def show_sku_hover(self, view, point, response):
-		product_html = self.get_sku_html_summary(response)
-
-		# show_popup params:
-		# content, <flags>, <location>, <max_width>, <max_height>, <on_navigate>, <on_hide>
-		view.show_popup(
-			product_html,
-			sublime.HIDE_ON_MOUSE_MOVE_AWAY,
-			point,
-			500,
-			500,
-			lambda href: self.handle_sku_popup_link(href, response)
-		)
+	# Popups only have the fields shown, so the full product is fetched
+	def handle_link(self, view, command, value, item):
+		if command == "debug":
+			utils.dump_as_json(DETAIL_CACHE.get("products/{}".format(value)), "product_{}".format(urllib.parse.quote_plus(value)))
+
+		else:
+			HoverResolver.handle_link(self, view, command, value, item)
+
+	def get_extra_parts(self):
+		parts = utils.get_setting("sku_hover_extras")
+
+		if parts == None:
+			parts = ["image", "stock", "salable_qty"]
+
+		return parts
+
+	def on_product(self, view, state, product, error):
+		if product == None and error == None:
+			error = "not found"
+
+		state["product"] = product
+		state["error"]   = error
+
+		self.update_sku_hover(view, state)
+
+		if product == None:
+			return
+
+		fetchers = {
+			"image": self.get_product_image,
+			"stock": self.get_stock,
+			"salable_qty": self.get_salable_qty,
+		}
+
+		for part in state["parts"]:
+			HOVER.submit(self.get_part, view, state, part, fetchers[part])
+
+	def get_part(self, view, state, part, fetcher):
+		timeout = max(state["deadline"] - time.monotonic(), 0.1)
+
+		try:
+			value = fetcher(state["product"], timeout)
 
-	def get_sku_html_summary(self, response):
-		image_data = None
-		site_url   = None
-		admin_url  = M2_URLS.ADMIN_URL_PRODUCT.format(response["id"])
+		except Exception as e:
+			value = None
+			utils.log("SKU hover: unable to fetch {} for {}: {}".format(part, state["sku"], e))
 
-		for attr in response["custom_attributes"]:
-			if attr["attribute_code"] == "image":
-				image_data = self.get_image(M2_URLS.CATALOG_URL + attr["value"])
+		if state["expired"]:
+			return
 
-			elif attr["attribute_code"] == "url_key":
-				site_url = M2_URLS.BASE_URL + attr["value"]
+		state["parts"][part] = value if value != None else SkuHover.UNAVAILABLE
+
+		self.update_sku_hover(view, state)
+
+	def expire(self, view, state):
+		state["expired"] = True
+
+		for part, value in state["parts"].items():
+			if value == None:
+				state["parts"][part] = SkuHover.UNAVAILABLE
+
+		if state["product"] == None and state["error"] == None:
+			state["error"] = "timed out"
+
+		self.update_sku_hover(view, state)
+
+	def get_product_image(self, product, timeout):
+		image = get_custom_attribute(product, "image")
+
+		if image == None:
+			return None
+
+		return '<img src="data:image/jpg;base64,{}" width="150" height="150" />'.format(self.get_image(M2_URLS.CATALOG_URL + image, timeout))
+
+	def get_stock(self, product, timeout):
+		response = MagentoAPI.request("GET", "stockItems/{}".format(urllib.parse.quote(product["sku"], safe = "")), timeout = timeout)
+
+		return "{:g} ({})".format(float(response["qty"] or 0), "in stock" if response["is_in_stock"] else "out of stock")
+
+	# Requires Magento's inventory (MSI) modules
+	def get_salable_qty(self, product, timeout):
+		stock_id = utils.get_setting("salable_qty_stock_id") or 1
+
+		try:
+			response = MagentoAPI.request("GET", "inventory/get-product-salable-quantity/{}/{}".format(urllib.parse.quote(product["sku"], safe = ""), stock_id), timeout = timeout)
+
+		except urllib.error.HTTPError as e:
+			if e.code == 404:
+				return None
+
+			raise
+
+		return "{:g}".format(float(response))
+
+	def update_sku_hover(self, view, state):
+		HOVER.update_popup(view, state["id"], self.get_sku_html_summary(state))
+
+	def get_sku_html_summary(self, state):
+		response = state["product"]
+
+		if response == None:
+			return """
+				<h3>{sku}</h3>
+				<div>
+					{status}
+				</div>
+			""".format(
+				sku    = html.escape(state["sku"]),
+				status = "Error: " + html.escape(state["error"]) if state["error"] != None else HoverResolver.LOADING,
+			)
+
+		site_url  = None
+		admin_url = M2_URLS.ADMIN_URL_PRODUCT.format(response["id"])
+
+		url_key = get_custom_attribute(response, "url_key")
+
+		if url_key != None:
+			site_url = M2_URLS.BASE_URL + url_key
 
 		response["admin_url"] = admin_url
 
 		if site_url != None:
 			response["site_url"] = site_url
 
-		return """
-			<body id="sku-output">
-				<style>
-					body {{
-						font-family: Segoe UI, sans-serif;
-						line-height: 1.5;
-					}}
-					h3 {{
-						line-height: 1.2;
-						margin: 0;
-					}}
-					.debug {{
-						font-size: 0.85rem;
-					}}
-					.gallery {{
-						margin-top: 0.5rem;
-					}}
-					.product-name {{
-						margin-bottom: 0.5rem;
-					}}
-				</style>
-
-				<div class="product-name">
-					<h3>{name}</h3>
-					<a class="debug" href="debug:{sku}"><em>debug</em></a>
-				</div>
-				<div>
-					ID: <a href="copy:{entity_id}">{entity_id}</a>
-				</div>
-				<div>
-					SKU: <a href="copy:{sku}">{sku}</a>
-				</div>
-				<div>
-					Site URL: <a href="open:{site_url}">open</a> | <a href="copy:{site_url}">copy</a>
-				</div>
-				<div>
-					Magento URL: <a href="open:{admin_url}">open</a> | <a href="copy:{admin_url}">copy</a>
-				</div>
-				<div>
-					Type: {type_id}
-				</div>
-				<div>
-					Price: £{price:,.2f}
-				</div>
-				<div>
-					Updated: {updated_at}
-				</div>
+		parts = {part: value if value != None else HoverResolver.LOADING for part, value in state["parts"].items()}
 
-				<div class="gallery">
-					<img src="data:image/jpg;base64,{image_data}" width="150" height="150" />
-				</div>
-			</body>
+		extras = ""
+
+		if "stock" in parts:
+			extras += "<div>Stock: {}</div>".format(parts["stock"])
+
+		if "salable_qty" in parts:
+			extras += "<div>Salable qty: {}</div>".format(parts["salable_qty"])
+
+		return """
+			<div>
+				<h3>{name}</h3>
+				<a class="debug" href="debug:{sku}"><em>debug</em></a>
+			</div>
+			<div>
+				ID: <a href="copy:{entity_id}">{entity_id}</a>
+			</div>
+			<div>
+				SKU: <a href="copy:{sku}">{sku}</a>
+			</div>
+			<div>
+				Site URL: <a href="open:{site_url}">open</a> | <a href="copy:{site_url}">copy</a>
+			</div>
+			<div>
+				Magento URL: <a href="open:{admin_url}">open</a> | <a href="copy:{admin_url}">copy</a>
+			</div>
+			<div>
+				Type: {type_id}
+			</div>
+			<div>
+				Price: £{price:,.2f}
+			</div>
+			<div>
+				Updated: {updated_at}
+			</div>
+			{extras}
+
+			<div class="section">
+				{image}
+			</div>
 		""".format(
 			name       = response["name"],
 			entity_id  = response["id"],
@@ -134,40 +295,16 @@ class SkuHover(sublime_plugin.EventListener):
 			site_url   = site_url if site_url != None else "",
 			admin_url  = admin_url,
 			type_id    = response["type_id"],
-			price      = float(response["price"]),
+			price      = float(response.get("price") or 0),
 			updated_at = response["updated_at"],
-			image_data = image_data if image_data != None else "",
+			extras     = extras,
+			image      = parts.get("image", ""),
 		)
 
-	def get_image(self, url):
-		req = urllib.request.Request(url = url, method = "GET")
-
-		response = urllib.request.urlopen(req).read()
-
-		return base64.b64encode(response).decode()
-
-	def handle_sku_popup_link(self, href, response):
-		command, value = self.parse_href_action(href)
-
-		if command == "copy":
-			sublime.set_clipboard(value)
-			utils.log('copied value to clipboard: "{}"'.format(value))
-
-		elif command == "open":
-			utils.open_url(value)
-
-		elif command == "debug":
-			utils.dump_as_json(response)
-
-		else:
-			utils.log('unrecognised command: "{}"'.format(command))
-
-		if utils.get_setting("close_popup_after_click") and self.CURRENT_VIEW != None:
-			self.CURRENT_VIEW.hide_popup()
+	def get_image(self, url, timeout = None):
+		return base64.b64encode(MagentoAPI.request_media(url, timeout)).decode()
 
-	def parse_href_action(self, href, delim = ":"):
-		delim_pos = href.find(delim)
-		command   = href[:delim_pos]
-		value     = href[delim_pos + len(delim):]
+SKU_RESOLVER = SkuHover()
 
-		return (command, value,)
\ No newline at end of file
+# The popup is built by show(), so there's no render function
+HOVER.register(SKU_RESOLVER)
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import sublime
+import threading
+import time
+import urllib.parse
+import uuid
+
+from Magento2Stuff.utils import Magento2Utils as utils
+
+# Manages files written to the temp folder.
+#
+# CMS content and JSON dumps are written to one file per (profile, resource
+# type, ID) which is overwritten rather than duplicated, files are deleted when
+# their sheet is closed, and a background clean-up enforces a maximum age and
+# total size for the folder.
+class TempFileManager():
+	GC_INTERVAL = 600
+
+	GC_LOCK = threading.Lock()
+
+	LAST_GC = 0
+
+	@staticmethod
+	def get_folder(profile = None):
+		if profile == None:
+			profile = utils.get_current_profile()
+
+		profile_key = hashlib.md5(profile["base_url"].encode()).hexdigest()[:8]
+		folder      = os.path.join(utils.get_temp_folder(), profile_key)
+
+		if not os.path.exists(folder):
+			os.makedirs(folder)
+
+		return folder
+
+	# e.g. "cmsPage_12_about-us.html". Any other file for the same resource (i.e.
+	# from before the identifier was changed) is removed.
+	@staticmethod
+	def get_resource_path(resource_type, resource_id, identifier = None, extension = ".html"):
+		folder = TempFileManager.get_folder()
+		prefix = "{}_{}".format(resource_type, resource_id)
+
+		file_name = prefix
+
+		if identifier:
+			file_name += "_" + urllib.parse.quote_plus(identifier)
+
+		file_path = os.path.join(folder, file_name + extension)
+
+		for existing in os.listdir(folder):
+			existing_path = os.path.join(folder, existing)
+
+			if existing_path != file_path and (existing.startswith(prefix + "_") or existing == prefix + extension):
+				if not TempFileManager.is_open(existing_path):
+					TempFileManager.delete(existing_path)
+
+		return file_path
+
+	# Returns False if the file is open with unsaved changes, which are kept
+	@staticmethod
+	def write_text(file_path, text):
+		view = TempFileManager.find_view(file_path)
+
+		if view != None and view.is_dirty():
+			utils.log("not overwriting unsaved changes in " + file_path)
+			return False
+
+		with open(file_path, "w", encoding = "utf-8", newline = "\n") as f:
+			f.write(text)
+
+		TempFileManager.schedule_gc()
+
+		return True
+
+	# json.dump writes the encoded chunks as it goes, rather than building the
+	# whole string in memory first
+	@staticmethod
+	def write_json(dictionary, name = None):
+		if name == None:
+			name = "{}_{}".format(str(time.time()).replace(".", ""), uuid.uuid4())
+
+		file_path = os.path.join(TempFileManager.get_folder(), name + ".json")
+
+		with open(file_path, "w", encoding = "utf-8", newline = "\n") as f:
+			json.dump(dictionary, f, indent = "\t", separators = (",", ": "))
+
+		TempFileManager.schedule_gc()
+
+		return file_path
+
+	@staticmethod
+	def is_temp_file(file_path):
+		if not file_path:
+			return False
+
+		temp_folder = os.path.normcase(os.path.abspath(utils.get_temp_folder()))
+
+		return os.path.normcase(os.path.abspath(file_path)).startswith(temp_folder + os.sep)
+
+	@staticmethod
+	def find_view(file_path):
+		for window in sublime.windows():
+			view = window.find_open_file(file_path)
+
+			if view != None:
+				return view
+
+		return None
+
+	@staticmethod
+	def is_open(file_path):
+		return TempFileManager.find_view(file_path) != None
+
+	@staticmethod
+	def delete(file_path):
+		try:
+			os.remove(file_path)
+
+		except OSError as e:
+			utils.log("unable to delete temp file {}: {}".format(file_path, e))
+
+	@staticmethod
+	def schedule_gc(force = False):
+		now = time.time()
+
+		if not force and now - TempFileManager.LAST_GC < TempFileManager.GC_INTERVAL:
+			return
+
+		TempFileManager.LAST_GC = now
+
+		thread = threading.Thread(target = TempFileManager.collect_garbage)
+		thread.daemon = True
+		thread.start()
+
+	# Delete files older than "temp_max_age_days", then the oldest files until the
+	# folder is under "temp_max_size_mb". Files open in a view are never deleted.
+	@staticmethod
+	def collect_garbage():
+		if not TempFileManager.GC_LOCK.acquire(False):
+			return
+
+		try:
+			temp_folder = utils.get_temp_folder()
+
+			if not os.path.isdir(temp_folder):
+				return
+
+			max_age  = (utils.get_setting("temp_max_age_days") or 7) * 86400
+			max_size = (utils.get_setting("temp_max_size_mb") or 100) * 1024 * 1024
+			now      = time.time()
+
+			files      = []
+			total_size = 0
+			deleted    = 0
+
+			for root, dirs, file_names in os.walk(temp_folder):
+				for file_name in file_names:
+					file_path = os.path.join(root, file_name)
+
+					try:
+						stat = os.stat(file_path)
+
+					except OSError:
+						continue
+
+					if TempFileManager.is_open(file_path):
+						continue
+
+					if now - stat.st_mtime > max_age:
+						TempFileManager.delete(file_path)
+						deleted += 1
+						continue
+
+					files.append((stat.st_mtime, stat.st_size, file_path))
+					total_size += stat.st_size
+
+			files.sort()
+
+			for mtime, size, file_path in files:
+				if total_size <= max_size:
+					break
+
+				TempFileManager.delete(file_path)
+				total_size -= size
+				deleted += 1
+
+			if deleted:
+				utils.log("deleted {} old temp files".format(deleted))
+
+		finally:
+			TempFileManager.GC_LOCK.release()
+
+def plugin_loaded():
+	TempFileManager.schedule_gc(True)
@@ -0,0 +1,318 @@
+import html
+import sublime
+import threading
+
+from Magento2Stuff.core.api import MagentoAPI as api
+from Magento2Stuff.core.query import Param, SearchCriteria, escape_like
+from Magento2Stuff.core.rows import CategoryRow, CmsBlockRow, CmsPageRow, ProductRow
+from Magento2Stuff.core.throttle import RequestCancelled, RequestGovernor
+from Magento2Stuff.utils import Magento2Utils as utils
+
+# Search-as-you-type against the store, for catalogs too large for the list menus.
+#
+# Keystrokes in the input panel are debounced, then sent as "like" filters on
+# the entity's searchable fields. Searches for superseded terms are cancelled
+# if they're still waiting for the rate limiter, and their responses discarded
+# otherwise.
+# Complete result sets are cached per term, so refining a term (typing more
+# characters) is filtered locally without another request. Live results are
+# shown in a popup while typing; pressing enter opens them in a quick panel.
+class TypeAheadSearch():
+	ENTITIES = {
+		"Products": {
+			"endpoint": "products",
+			"search_fields": ("name", "sku"),
+			"row_type": ProductRow,
+			"fields": [
+				{
+					"items": [
+						"id",
+						"name",
+						"sku",
+						"status",
+						"type_id",
+						"created_at",
+						"updated_at",
+						{
+							"custom_attributes": [
+								"url_key",
+							],
+						},
+					]
+				},
+				"total_count",
+			],
+		},
+		"CMS pages": {
+			"endpoint": "cmsPage/search",
+			"search_fields": ("title", "identifier"),
+			"row_type": CmsPageRow,
+			"fields": [{"items": ["id", "title", "identifier", "active", "update_time"]}, "total_count"],
+		},
+		"CMS blocks": {
+			"endpoint": "cmsBlock/search",
+			"search_fields": ("title", "identifier"),
+			"row_type": CmsBlockRow,
+			"fields": [{"items": ["id", "title", "identifier", "active", "update_time"]}, "total_count"],
+		},
+		"Categories": {
+			"endpoint": "categories/list",
+			"search_fields": ("name",),
+			"row_type": CategoryRow,
+			"fields": [
+				{
+					"items": [
+						"id",
+						"name",
+						"is_active",
+						"updated_at",
+						{
+							"custom_attributes": [
+								"url_path",
+							],
+						},
+					]
+				},
+				"total_count",
+			],
+		},
+	}
+
+	ENTITY_NAMES = ("Products", "CMS pages", "CMS blocks", "Categories")
+
+	MIN_LENGTH = 2
+
+	# Compiled per entity and page size
+	QUERIES = {}
+
+	def __init__(self, entity_name, on_select):
+		self.entity_name = entity_name
+		self.entity      = TypeAheadSearch.ENTITIES[entity_name]
+		self.on_select   = on_select # Called with (rows, index)
+		self.page_size   = utils.get_setting("type_ahead_page_size") or 50
+		self.debounce    = (utils.get_setting("type_ahead_debounce_ms") or 250) / 1000
+		self.profile     = utils.get_current_profile()
+		self.window      = sublime.active_window()
+		self.view        = self.window.active_view()
+		self.cache       = {} # Term -> (rows, complete)
+		self.generation  = 0
+		self.timer       = None
+		self.cancel      = None # Event for the search in progress
+		self.rows        = []
+		self.term        = ""
+		self.lock        = threading.Lock()
+
+	def start(self):
+		self.window.show_input_panel("Search {}:".format(self.entity_name.lower()), "", self.on_done, self.on_change, self.on_cancel)
+
+	def get_query(self):
+		key = (self.entity_name, self.page_size)
+
+		if key not in TypeAheadSearch.QUERIES:
+			criteria = SearchCriteria()
+
+			# One filter group, so the fields are OR'd together
+			for field in self.entity["search_fields"]:
+				criteria.filter(field, Param("term"), "like", group = 0 if criteria.filter_groups else None)
+
+			TypeAheadSearch.QUERIES[key] = criteria.page(self.page_size).fields(self.entity["fields"]).compile()
+
+		return TypeAheadSearch.QUERIES[key]
+
+	def on_change(self, term):
+		term = term.strip()
+
+		with self.lock:
+			self.supersede()
+			generation = self.generation
+
+			if len(term) < TypeAheadSearch.MIN_LENGTH:
+				self.rows = []
+				self.term = term
+				return
+
+			local = self.search_cache(term)
+
+			if local != None:
+				self.rows = local
+				self.term = term
+				sublime.set_timeout(self.show_live_results, 0)
+				return
+
+			self.timer = threading.Timer(self.debounce, self.search, args = (term, generation))
+			self.timer.daemon = True
+			self.timer.start()
+
+	# Results for a term can be derived from any cached prefix of it that
+	# returned a complete (not truncated) result set
+	def search_cache(self, term):
+		lowered = term.lower()
+
+		for length in range(len(term), TypeAheadSearch.MIN_LENGTH - 1, -1):
+			cached = self.cache.get(lowered[:length])
+
+			if cached == None:
+				continue
+
+			rows, complete = cached
+
+			if length == len(term):
+				return rows
+
+			if complete:
+				return [row for row in rows if self.matches(row, lowered)]
+
+			return None
+
+		return None
+
+	def matches(self, row, lowered):
+		for field in self.entity["search_fields"]:
+			value = getattr(row, field, None)
+
+			if value != None and lowered in str(value).lower():
+				return True
+
+		return False
+
+	# Must be called with the lock held
+	def supersede(self):
+		self.generation += 1
+
+		if self.timer != None:
+			self.timer.cancel()
+
+		if self.cancel != None:
+			self.cancel.set()
+			self.cancel = None
+
+			# So the request gives up its place in the queue straight away
+			RequestGovernor.for_profile(self.profile, utils.get_setting("rate_limit")).wake()
+
+	# Runs on the debounce timer, or a worker when enter is pressed (`on_results`
+	# is then called on the main thread with the rows)
+	def search(self, term, generation, on_results = None):
+		cancel = threading.Event()
+
+		with self.lock:
+			if generation != self.generation:
+				return
+
+			self.cancel = cancel
+
+		try:
+			query    = self.get_query().bind(term = "%{}%".format(escape_like(term)))
+			response = api.request("GET", self.entity["endpoint"], search_criteria = query, profile = self.profile, cancel = cancel)
+
+		except RequestCancelled:
+			return
+
+		except Exception as e:
+			return utils.log("search failed: {}".format(e))
+
+		rows     = [self.entity["row_type"](item) for item in response["items"] or []]
+		complete = response["total_count"] <= len(rows)
+
+		with self.lock:
+			self.cache[term.lower()] = (rows, complete)
+
+			if self.cancel == cancel:
+				self.cancel = None
+
+			# A later keystroke has superseded this search
+			if generation != self.generation:
+				return
+
+			self.rows = rows
+			self.term = term
+
+		if on_results != None:
+			sublime.set_timeout(lambda: on_results(rows), 0)
+		else:
+			sublime.set_timeout(self.show_live_results, 0)
+
+	def show_live_results(self):
+		if self.view == None:
+			return
+
+		with self.lock:
+			rows = self.rows[:15]
+			term = self.term
+			more = len(self.rows) - len(rows)
+
+		lines = []
+
+		for row in rows:
+			lines.append("<div>{}</div>".format(html.escape(self.describe(row)[0])))
+
+		if not rows:
+			lines.append("<div><em>no results</em></div>")
+
+		if more > 0:
+			lines.append("<div><em>...and {} more</em></div>".format(more))
+
+		content = """
+			<body id="type-ahead">
+				<div><strong>{} matching "{}"</strong> (enter to open)</div>
+				{}
+			</body>
+		""".format(html.escape(self.entity_name), html.escape(term), "".join(lines))
+
+		if self.view.is_popup_visible():
+			self.view.update_popup(content)
+		else:
+			self.view.show_popup(content, 0, self.view.visible_region().begin(), 700, 500)
+
+	def describe(self, row):
+		if isinstance(row, ProductRow):
+			return ["{} | {} | ID: {}".format(row.name, row.sku, row.id), "Type: {} | {}".format(row.type_id, "Enabled" if row.status == 1 else "DISABLED")]
+
+		if isinstance(row, CategoryRow):
+			return ["{} | ID: {}".format(row.name, row.id), row.url_path or ""]
+
+		return ["{} [{}] | ID: {}".format(row.title, row.identifier, row.id), "Enabled" if row.active else "DISABLED"]
+
+	def on_cancel(self):
+		with self.lock:
+			self.supersede()
+
+		if self.view != None:
+			self.view.hide_popup()
+
+	def on_done(self, term):
+		term = term.strip()
+
+		with self.lock:
+			rows    = self.rows if term == self.term else None
+			pending = self.timer != None and term != self.term
+
+		if self.view != None:
+			self.view.hide_popup()
+
+		# Enter pressed before the debounced search ran
+		if rows == None and len(term) >= TypeAheadSearch.MIN_LENGTH:
+			rows = self.search_cache(term)
+
+			# Searched on a worker, so the UI isn't blocked on the request
+			if rows == None and pending:
+				with self.lock:
+					self.supersede()
+					generation = self.generation
+
+				thread = threading.Thread(target = self.search, args = (term, generation, lambda rows: self.show_results(term, rows)))
+				thread.daemon = True
+				thread.start()
+
+				return
+
+		self.show_results(term, rows)
+
+	def show_results(self, term, rows):
+		if not rows:
+			return utils.log('no {} matching "{}"'.format(self.entity_name.lower(), term))
+
+		self.window.show_quick_panel(
+			[self.describe(row) for row in rows],
+			lambda x: self.on_select(rows, x) if x != -1 else None,
+			sublime.KEEP_OPEN_ON_FOCUS_LOST,
+		)
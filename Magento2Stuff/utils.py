@@ -1,33 +1,34 @@
-import json
 import os
 import sublime
 import tempfile
 import threading
 import time
-import uuid
-import webbrowser
+
+from Magento2Stuff.core.environment import ENV
+from Magento2Stuff.core.lazy import lazy_import
+
+webbrowser = lazy_import("webbrowser")
 
 class Magento2Utils():
 	SETTINGS_NAME = "Magento2Stuff.sublime-settings"
 
 	@staticmethod
 	def get_current_profile():
-		profiles = Magento2Utils.get_setting("profiles")
-
-		if not profiles:
-			raise Exception("No profiles found")
-
-		index = Magento2Utils.get_setting("current_profile")
-
-		if index == None:
-			index = 0
-
-		return profiles[index]
+		return ENV.get_current_profile()
 
 	@staticmethod
 	def get_temp_folder():
 		return os.path.join(tempfile.gettempdir(), Magento2Utils.get_setting("temp_folder_name"))
 
+	# Unlike the temp folder, this is for data that should survive restarts
+	@staticmethod
+	def get_cache_folder():
+		return os.path.join(sublime.cache_path(), "Magento2Stuff")
+
+	@staticmethod
+	def get_profile_cache_path(profile, name):
+		return ENV.get_profile_cache_path(profile, name)
+
 	@staticmethod
 	def get_setting(name):
 		return sublime.load_settings(Magento2Utils.SETTINGS_NAME).get(name)
@@ -59,16 +60,34 @@ class Magento2Utils():
 		print(message)
 
 	@staticmethod
-	def dump_as_json(dictionary):
-		temp_folder = Magento2Utils.get_temp_folder()
+	def set_status(key, value):
+		window = sublime.active_window()
+		view   = window.active_view() if window else None
 
-		if not os.path.exists(temp_folder):
-			os.makedirs(temp_folder)
+		if view == None:
+			return
 
-		file_name = "{}_{}".format(str(time.time()).replace(".", ""), uuid.uuid4())
-		temp_file_path = os.path.join(temp_folder, file_name + ".json")
-
-		with open(temp_file_path, "w", encoding = "utf-8", newline = "\n") as f:
-			f.write(json.dumps(dictionary, indent = "\t", separators = (",", ": ")))
+		if value:
+			view.set_status(key, value)
+		else:
+			view.erase_status(key)
 
-		sublime.active_window().open_file(temp_file_path)
\ No newline at end of file
+	# Opens the JSON viewer, or with "json_viewer" off writes a temp file (reused
+	# per `name` if given, e.g. "order_123", see TempFileManager)
+	@staticmethod
+	def dump_as_json(dictionary, name = None):
+		from Magento2Stuff.json_viewer import JsonViewer, export_raw_json
+
+		if Magento2Utils.get_setting("json_viewer") == False:
+			return export_raw_json(dictionary, name)
+
+		JsonViewer.open(dictionary, name)
+
+# The core package (API client, caches etc.) gets settings, logging and paths
+# from Sublime Text when running as a plugin
+ENV.configure(
+	settings     = Magento2Utils.get_setting,
+	logger       = Magento2Utils.log,
+	status       = Magento2Utils.set_status,
+	cache_folder = Magento2Utils.get_cache_folder,
+)
@@ -0,0 +1,245 @@
+import json
+import os
+import sublime
+import threading
+import time
+
+from Magento2Stuff.core.api import MagentoAPI as api
+from Magento2Stuff.core.offline import OfflineState
+from Magento2Stuff.core.throttle import PRIORITY_BACKGROUND
+from Magento2Stuff.utils import Magento2Utils as utils
+
+# Durable queue of PUTs that couldn't be sent because the profile was offline.
+#
+# The queue is saved to the profile's cache folder on every change, so queued
+# edits survive a restart. Entries are sent in order once the profile is
+# reachable. Before each PUT the resource is fetched, and if it was changed in
+# Magento after the version the edit was based on, flushing stops at that entry
+# until it's resolved from the "Queued changes" menu.
+class WriteQueue():
+	FILE_NAME = "write_queue.json"
+
+	QUEUES = {}
+
+	QUEUES_LOCK = threading.Lock()
+
+	# Called on the main thread with (profile, entry, response) after a queued
+	# write has been sent
+	LISTENERS = []
+
+	def __init__(self, profile, file_path):
+		self.profile   = profile
+		self.file_path = file_path
+		self.entries   = []
+		self.lock      = threading.RLock()
+		self.wake      = threading.Event()
+		self.thread    = None
+
+	@staticmethod
+	def for_profile(profile = None):
+		if profile == None:
+			profile = utils.get_current_profile()
+
+		key = profile["base_url"]
+
+		with WriteQueue.QUEUES_LOCK:
+			if key not in WriteQueue.QUEUES:
+				queue = WriteQueue(profile, utils.get_profile_cache_path(profile, WriteQueue.FILE_NAME))
+				queue.load()
+
+				WriteQueue.QUEUES[key] = queue
+
+			return WriteQueue.QUEUES[key]
+
+	@staticmethod
+	def add_listener(listener):
+		if listener not in WriteQueue.LISTENERS:
+			WriteQueue.LISTENERS.append(listener)
+
+	# Resume sending anything left over from a previous session
+	@staticmethod
+	def start_all():
+		for profile in utils.get_setting("profiles") or []:
+			queue = WriteQueue.for_profile(profile)
+
+			if queue.entries:
+				queue.start()
+
+	def load(self):
+		if not os.path.isfile(self.file_path):
+			return
+
+		try:
+			with open(self.file_path, "r", encoding = "utf-8") as f:
+				self.entries = json.load(f)
+
+		except ValueError:
+			utils.log("unreadable write queue, keeping it as {}.bad".format(self.file_path))
+			os.replace(self.file_path, self.file_path + ".bad")
+
+	def save(self):
+		with self.lock:
+			temp_path = self.file_path + ".tmp"
+
+			with open(temp_path, "w", encoding = "utf-8") as f:
+				json.dump(self.entries, f, indent = "\t")
+
+			os.replace(temp_path, self.file_path)
+
+		self.show_status()
+
+	def show_status(self):
+		with self.lock:
+			count = len(self.entries)
+
+		utils.set_status("magento2stuff_write_queue", "M2: {} change{} queued".format(count, "" if count == 1 else "s") if count else None)
+
+	# Successive edits to the same resource are merged into one entry, keeping
+	# the version the first edit was based on
+	def enqueue(self, endpoint, request_body, base_update_time = None):
+		with self.lock:
+			for entry in self.entries:
+				if entry["endpoint"] == endpoint and entry["conflict"] == None:
+					for key, properties in request_body.items():
+						entry["request_body"].setdefault(key, {}).update(properties)
+
+					entry["queued_at"] = time.time()
+					break
+
+			else:
+				self.entries.append({
+					"endpoint": endpoint,
+					"request_body": request_body,
+					"base_update_time": base_update_time,
+					"queued_at": time.time(),
+					"conflict": None,
+				})
+
+			self.save()
+
+		utils.log("{} is offline, queued update to {}".format(self.profile["base_url"], endpoint))
+
+		self.start()
+
+	def remove(self, entry):
+		with self.lock:
+			if entry in self.entries:
+				self.entries.remove(entry)
+				self.save()
+
+	def start(self):
+		self.wake.set()
+
+		if self.thread != None and self.thread.is_alive():
+			return
+
+		self.thread = threading.Thread(target = self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def run(self):
+		while True:
+			self.wake.clear()
+
+			if self.flush():
+				return
+
+			# Wait until the profile may be reachable, or the queue changes
+			self.wake.wait(utils.get_setting("offline_retry_interval") or 30)
+
+	# Returns True when there is nothing more to do for now
+	def flush(self):
+		while True:
+			with self.lock:
+				if not self.entries:
+					return True
+
+				entry = self.entries[0]
+
+			# Stopped until resolved
+			if entry["conflict"] != None:
+				return True
+
+			try:
+				self.send(entry)
+
+			except Exception as e:
+				if OfflineState.is_network_error(e):
+					return False
+
+				entry["conflict"] = str(e)
+				self.save()
+
+				message = "Queued update to {} could not be sent:\n\n{}\n\nSee \"Queued changes\" in the Magento menu.".format(entry["endpoint"], e)
+
+				sublime.set_timeout(lambda: sublime.message_dialog(message), 0)
+
+				return True
+
+	def send(self, entry, force = False):
+		if entry["base_update_time"] != None and not force:
+			current = api.request("GET", entry["endpoint"], priority = PRIORITY_BACKGROUND, profile = self.profile, cache = False)
+
+			if (current.get("update_time") or "") > entry["base_update_time"]:
+				raise ValueError("changed in Magento at {} after this edit was made".format(current["update_time"]))
+
+		response = api.request("PUT", entry["endpoint"], request_body = entry["request_body"], priority = PRIORITY_BACKGROUND, profile = self.profile)
+
+		self.remove(entry)
+
+		utils.log("sent queued update to {}".format(entry["endpoint"]))
+
+		for listener in WriteQueue.LISTENERS:
+			sublime.set_timeout(lambda listener = listener: listener(self.profile, entry, response), 0)
+
+		return response
+
+	# Resolution of an entry which couldn't be sent
+	def force_send(self, entry):
+		try:
+			self.send(entry, True)
+
+		except Exception as e:
+			return utils.log("unable to send {}: {}".format(entry["endpoint"], e))
+
+		self.start()
+
+	def discard(self, entry):
+		self.remove(entry)
+
+		utils.log("discarded queued update to {}".format(entry["endpoint"]))
+
+		self.start()
+
+# Saves or updates CMS resources, queueing the PUT if the profile is offline.
+# Returns the response, or None if queued.
+def put_or_queue(endpoint, request_body, base_update_time = None):
+	queue = WriteQueue.for_profile()
+
+	# Keep writes to the same resource in order
+	if OfflineState.is_offline(queue.profile) or any(entry["endpoint"] == endpoint for entry in queue.entries):
+		queue.enqueue(endpoint, request_body, base_update_time)
+		return None
+
+	try:
+		return api.request("PUT", endpoint, request_body = request_body)
+
+	except Exception as e:
+		if not OfflineState.is_network_error(e):
+			raise
+
+		queue.enqueue(endpoint, request_body, base_update_time)
+
+		return None
+
+def on_offline_changed(profile, offline):
+	if not offline:
+		queue = WriteQueue.for_profile(profile)
+
+		if queue.entries:
+			queue.start()
+
+def plugin_loaded():
+	OfflineState.add_listener(on_offline_changed)
+
+	WriteQueue.start_all()
@@ -0,0 +1,60 @@
+# Relative-time formatting of list menu timestamps: the original
+# strptime-per-item approach vs RelativeTimeFormatter.
+#
+# Usage: python benchmarks/bench_dates.py [count]
+import os
+import random
+import sys
+import timeit
+
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Magento2Stuff.core.dates import PARSE_CACHE, RelativeTimeFormatter, format_delta
+
+def legacy_format(datetime_str, now = None):
+	now     = now or datetime.now(timezone.utc)
+	updated = datetime.strptime("{ts}+0000".format(ts = datetime_str), "%Y-%m-%d %H:%M:%S%z")
+	delta   = now - updated
+
+	return format_delta(delta.days * 86400 + delta.seconds)
+
+def make_timestamps(count, unique):
+	random.seed(1)
+
+	now  = datetime.utcnow()
+	pool = [(now - timedelta(seconds = random.randint(0, 3 * 365 * 86400))).strftime("%Y-%m-%d %H:%M:%S") for _ in range(unique)]
+
+	return [random.choice(pool) for _ in range(count)]
+
+def run(count):
+	cases = (
+		("all unique", make_timestamps(count, count)),
+		("10% unique", make_timestamps(count, max(count // 10, 1))),
+	)
+
+	for label, timestamps in cases:
+		# Sanity check that both implementations agree
+		now       = datetime.now(timezone.utc)
+		formatter = RelativeTimeFormatter(now.timestamp())
+
+		for ts in timestamps[:1000]:
+			assert legacy_format(ts, now) == formatter.format(ts), ts
+
+		legacy = min(timeit.repeat(lambda: [legacy_format(ts) for ts in timestamps], number = 1, repeat = 5))
+
+		def cold():
+			PARSE_CACHE.clear()
+			RelativeTimeFormatter().format_many(timestamps)
+
+		fast_cold = min(timeit.repeat(cold, number = 1, repeat = 5))
+		fast_warm = min(timeit.repeat(lambda: RelativeTimeFormatter().format_many(timestamps), number = 1, repeat = 5))
+
+		print("{:>6} timestamps, {}:".format(count, label))
+		print("  strptime per item:        {:8.2f} ms".format(legacy * 1000))
+		print("  formatter (cold cache):   {:8.2f} ms  ({:.1f}x)".format(fast_cold * 1000, legacy / fast_cold))
+		print("  formatter (warm parse):   {:8.2f} ms  ({:.1f}x)".format(fast_warm * 1000, legacy / fast_warm))
+
+if __name__ == "__main__":
+	run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
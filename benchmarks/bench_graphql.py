@@ -0,0 +1,147 @@
+# Response size and latency of a batched SKU lookup (as the SKU hover makes)
+# over REST without a fields projection, REST with one, and GraphQL; likewise
+# for category IDs if given. Needs a store to talk to, using the same settings
+# and profiles as the command line tool.
+#
+# Usage: python benchmarks/bench_graphql.py [--settings FILE] [--profile NAME]
+#        [--rounds N] [--categories ID,ID...] SKU [SKU...]
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Magento2Stuff.core.cli import load_settings, select_profile
+from Magento2Stuff.core.environment import ENV as env
+from Magento2Stuff.core.graphql import CATEGORIES_BY_ID_QUERY, PRODUCTS_BY_SKU_QUERY, encode_request
+from Magento2Stuff.core.query import SearchCriteria
+from Magento2Stuff.core.urls import M2_URLS
+
+# As SkuHover.SKU_QUERY and CategoryHover.CATEGORY_QUERY
+PRODUCT_FIELDS = {
+	"items": [
+		"id",
+		"sku",
+		"name",
+		"type_id",
+		"status",
+		"price",
+		"updated_at",
+		{
+			"custom_attributes": [
+				"url_key",
+				"image",
+			],
+			"extension_attributes": [
+				{
+					"stock_item": [
+						"is_in_stock",
+					],
+				},
+			],
+		},
+	]
+}
+
+CATEGORY_FIELDS = {
+	"items": [
+		"id",
+		"name",
+		"is_active",
+		"updated_at",
+		{
+			"custom_attributes": [
+				"url_path",
+			],
+		},
+	]
+}
+
+def rest_request(endpoint, query):
+	req = urllib.request.Request(M2_URLS.API_URL + endpoint + "?" + query.bind().encode())
+	req.add_header("Authorization", "Bearer " + (env.get_current_profile().get("api_key") or env.get_setting("api_key")))
+
+	return send(req)
+
+def graphql_request(query, variables):
+	req = urllib.request.Request(M2_URLS.GRAPHQL_URL, data = encode_request(query, variables), method = "POST")
+	req.add_header("Content-Type", "application/json")
+
+	return send(req)
+
+# Returns (seconds, bytes, parsed body). Responses aren't compressed, so the
+# sizes compare the JSON itself. GraphQL requests are anonymous, as the
+# plugin sends them.
+def send(req):
+	req.add_header("Accept", "application/json")
+
+	start = time.perf_counter()
+
+	with urllib.request.urlopen(req, timeout = 60) as http_response:
+		body = http_response.read()
+
+	return time.perf_counter() - start, len(body), json.loads(body.decode())
+
+def compare(title, requests, count, rounds):
+	print("{} ({} rounds):".format(title, rounds))
+
+	baseline = None
+
+	for name, request, get_items in requests:
+		times = []
+
+		# First request warms up connections and Magento's caches
+		request()
+
+		for i in range(rounds):
+			seconds, size, data = request()
+			times.append(seconds)
+
+		found    = len(get_items(data) or [])
+		baseline = baseline or size
+
+		print("  {:<22} {:>9,} bytes ({:>5.1f}%)  median {:>7.1f} ms  {}/{} found".format(name, size, size * 100 / baseline, statistics.median(times) * 1000, found, count))
+
+def main():
+	parser = argparse.ArgumentParser(description = "Compare REST and GraphQL lookups")
+	parser.add_argument("--settings", help = "settings file")
+	parser.add_argument("--profile", help = "profile name")
+	parser.add_argument("--rounds", type = int, default = 10)
+	parser.add_argument("--categories", help = "comma-separated category IDs")
+	parser.add_argument("skus", nargs = "+")
+
+	args = parser.parse_args()
+
+	settings = load_settings(args.settings)
+
+	if args.profile:
+		select_profile(settings, args.profile)
+
+	if "M2_API_KEY" in os.environ:
+		settings["api_key"] = os.environ["M2_API_KEY"]
+
+	env.configure(settings = settings)
+
+	skus = ",".join(args.skus)
+
+	compare("{} SKUs".format(len(args.skus)), [
+		("REST", lambda: rest_request("products", SearchCriteria().filter("sku", skus, "in").page(len(args.skus)).compile()), lambda data: data["items"]),
+		("REST with fields", lambda: rest_request("products", SearchCriteria().filter("sku", skus, "in").page(len(args.skus)).fields(PRODUCT_FIELDS).compile()), lambda data: data["items"]),
+		("GraphQL", lambda: graphql_request(PRODUCTS_BY_SKU_QUERY, {"skus": args.skus, "page_size": len(args.skus)}), lambda data: data["data"]["products"]["items"]),
+	], len(args.skus), args.rounds)
+
+	if args.categories:
+		ids = args.categories.split(",")
+
+		compare("{} categories".format(len(ids)), [
+			("REST", lambda: rest_request("categories/list", SearchCriteria().filter("entity_id", args.categories, "in").page(len(ids)).compile()), lambda data: data["items"]),
+			("REST with fields", lambda: rest_request("categories/list", SearchCriteria().filter("entity_id", args.categories, "in").page(len(ids)).fields(CATEGORY_FIELDS).compile()), lambda data: data["items"]),
+			("GraphQL", lambda: graphql_request(CATEGORIES_BY_ID_QUERY, {"ids": ids, "page_size": len(ids)}), lambda data: data["data"]["categories"]["items"]),
+		], len(ids), args.rounds)
+
+if __name__ == "__main__":
+	main()
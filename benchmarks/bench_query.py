@@ -0,0 +1,119 @@
+# Query string construction for search criteria: the original recursive
+# flatten + urlencode per request vs a query compiled once with CompiledQuery.
+#
+# Usage: python benchmarks/bench_query.py [iterations]
+import os
+import sys
+import timeit
+import urllib.parse
+
+from collections.abc import MutableMapping
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Magento2Stuff.core.query import Param, SearchCriteria
+
+# MagentoAPI.flatten/flatten_fields as originally implemented
+def legacy_flatten(dictionary, parent_key = False, separator = "[", separator_suffix = "]"):
+	items = []
+
+	for key, value in dictionary.items():
+		new_key = str(parent_key) + separator + key + separator_suffix if parent_key else key
+		if isinstance(value, MutableMapping):
+			items.extend(legacy_flatten(value, new_key, separator, separator_suffix).items())
+		elif isinstance(value, list) or isinstance(value, tuple):
+			for k, v in enumerate(value):
+				items.extend(legacy_flatten({str(k): v}, new_key, separator, separator_suffix).items())
+		else:
+			items.append((new_key, value))
+
+	return dict(items)
+
+def legacy_flatten_fields(fields):
+	items = []
+
+	if isinstance(fields, dict):
+		fields = [fields]
+
+	for field in fields:
+		if isinstance(field, dict):
+			for key in field:
+				flat = key + "[" + legacy_flatten_fields(field[key]) + "]"
+				items.append(flat)
+		else:
+			items.append(field)
+
+	return ",".join(items)
+
+def legacy_query(search_criteria, fields):
+	params = legacy_flatten({"search_criteria": search_criteria})
+	params["fields"] = legacy_flatten_fields(fields)
+
+	return urllib.parse.urlencode(params)
+
+FIELDS = {
+	"items": [
+		"id",
+		"name",
+		"sku",
+		"status",
+		"type_id",
+		"created_at",
+		"updated_at",
+		{
+			"custom_attributes": [
+				"url_key",
+				"image",
+			],
+			"extension_attributes": [
+				{
+					"stock_item": [
+						"qty",
+						"is_in_stock",
+					],
+				},
+			],
+		},
+	]
+}
+
+# Eight filter groups of three filters each, plus two sort orders
+def make_criteria(current_page, values):
+	builder = SearchCriteria()
+
+	for group in range(8):
+		builder.filter("field_{}".format(group), values[group], "like")
+		builder.filter("other_{}".format(group), "x{}".format(group), "neq", group = group)
+		builder.filter("third_{}".format(group), group, "gteq", group = group)
+
+	return builder.sort("updated_at", "DESC").sort("sku").page(100, current_page).fields(FIELDS)
+
+def run(iterations):
+	values = ["%value {}%".format(i) for i in range(8)]
+
+	template = make_criteria(Param("current_page"), [Param("value_{}".format(i)) for i in range(8)])
+	compiled = template.compile()
+	bound    = {"value_{}".format(i): values[i] for i in range(8)}
+
+	# Both must produce the same query string
+	for page in (1, 2, 3):
+		expected = legacy_query(make_criteria(page, values).to_dict(), FIELDS)
+		assert compiled.encode(current_page = page, **bound) == expected
+
+	pages = [1 + i % 20 for i in range(iterations)]
+
+	legacy = min(timeit.repeat(lambda: [legacy_query(make_criteria(p, values).to_dict(), FIELDS) for p in pages], number = 1, repeat = 5))
+	criteria = make_criteria(1, values).to_dict()
+
+	legacy_dict = min(timeit.repeat(lambda: [legacy_query(criteria, FIELDS) for p in pages], number = 1, repeat = 5))
+	compile_once = min(timeit.repeat(lambda: make_criteria(Param("current_page"), [Param("value_{}".format(i)) for i in range(8)]).compile(), number = 1, repeat = 5))
+	fast = min(timeit.repeat(lambda: [compiled.encode(current_page = p, **bound) for p in pages], number = 1, repeat = 5))
+
+	print("{} queries, 24 filters in 8 groups, 2 sort orders, nested fields:".format(iterations))
+	print("  build + flatten per request: {:8.2f} ms".format(legacy * 1000))
+	print("  flatten per request:         {:8.2f} ms".format(legacy_dict * 1000))
+	print("  compiled encode:             {:8.2f} ms  ({:.1f}x vs flatten)".format(fast * 1000, legacy_dict / fast))
+	print("  one-off compile:             {:8.3f} ms".format(compile_once * 1000))
+
+if __name__ == "__main__":
+	run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,101 @@
+# Import cost of the Magento2Stuff package, measured the way Sublime Text loads
+# it: every top-level module is imported as a plugin. Each run is a fresh
+# interpreter. Outside Sublime, minimal stand-ins for the sublime and
+# sublime_plugin modules are installed so the plugin modules can be imported.
+#
+# Usage: python benchmarks/bench_startup.py [runs]
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, {root!r})
+
+if "sublime" not in sys.modules:
+	class Anything():
+		def __init__(self, *args, **kwargs):
+			pass
+
+		def __call__(self, *args, **kwargs):
+			return Anything()
+
+		def __getattr__(self, name):
+			return Anything()
+
+	sublime = types.ModuleType("sublime")
+	sublime.__getattr__ = lambda name: Anything()
+
+	sublime_plugin = types.ModuleType("sublime_plugin")
+
+	for name in ("ApplicationCommand", "EventListener", "TextChangeListener", "TextCommand", "ViewEventListener", "WindowCommand"):
+		setattr(sublime_plugin, name, type(name, (), {{}}))
+
+	sys.modules["sublime"]        = sublime
+	sys.modules["sublime_plugin"] = sublime_plugin
+
+package_dir = os.path.join({root!r}, "Magento2Stuff")
+modules     = sorted(name[:-3] for name in os.listdir(package_dir) if name.endswith(".py"))
+eager       = {eager!r}
+timings     = {{}}
+
+baseline = set(sys.modules)
+start    = time.perf_counter()
+
+for name in modules:
+	module_start = time.perf_counter()
+	__import__("Magento2Stuff." + name)
+	timings[name] = time.perf_counter() - module_start
+
+# What importing everything up front would add
+for name in eager:
+	__import__(name)
+
+total = time.perf_counter() - start
+
+heavy = [name for name in ("concurrent.futures", "http.client", "sqlite3", "ssl", "subprocess", "urllib.request", "webbrowser") if name in sys.modules]
+
+print(json.dumps({{"total": total, "timings": timings, "modules": len(set(sys.modules) - baseline), "heavy": heavy}}))
+"""
+
+# Modules the plugin defers until first use
+DEFERRED = [
+	"Magento2Stuff.lib.backups",
+	"Magento2Stuff.lib.country_codes",
+	"concurrent.futures",
+	"urllib.request",
+	"webbrowser",
+]
+
+def run_child(eager):
+	code   = CHILD.format(root = ROOT, eager = eager)
+	output = subprocess.check_output([sys.executable, "-c", code])
+
+	return json.loads(output.decode())
+
+def run(runs):
+	for label, eager in (("lazy (as shipped)", []), ("everything imported up front", DEFERRED)):
+		results = [run_child(eager) for _ in range(runs)]
+		totals  = [result["total"] * 1000 for result in results]
+
+		print("{}: median {:.2f} ms, min {:.2f} ms over {} runs, {} modules imported".format(label, statistics.median(totals), min(totals), runs, results[0]["modules"]))
+		print("  heavy stdlib modules loaded: {}".format(", ".join(results[0]["heavy"]) or "none"))
+
+		# Cumulative: the first module to import a shared dependency pays for it
+		if not eager:
+			timings = results[-1]["timings"]
+
+			for name in sorted(timings, key = timings.get, reverse = True)[:8]:
+				print("  {:8.2f} ms  {}".format(timings[name] * 1000, name))
+
+if __name__ == "__main__":
+	run(int(sys.argv[1]) if len(sys.argv) > 1 else 10)